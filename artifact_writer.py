@@ -0,0 +1,144 @@
+"""
+Background artifact writer - exports (parquet/csv/xlsx) are written while the pipeline continues.
+
+    with background_writes(recorder) as writer:      # ETL run / bid log analysis
+        write_artifact(df_fact, 'df_fact', ...)      # sinks.py - snapshot queued, returns immediately
+        ...
+        writer.flush()                               # wait for all writes, first write error is raised
+
+Inside background_writes every submit_write() takes an immutable snapshot (deep copy) of the frame,
+so caller can modify or drop its frame right away. Writes run in a thread pool (openpyxl/pyarrow/csv
+writers spend most time in I/O and C code). Writes of the same artifact keep their order (chunk appends).
+Backpressure: submit blocks while snapshots waiting to be written take more than max_pending_mb.
+Every write is timed (queued, write seconds, rows, snapshot MB) into recorder.artifacts (metrics.py).
+Outside background_writes submit_write() writes inline, like before.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('metrics')
+
+DEFAULT_WRITE_WORKERS = 2
+DEFAULT_MAX_PENDING_MB = 512
+
+# writer of the running pipeline - submit_write() called deep in sinks/ETL functions lands there
+_active_writer = contextvars.ContextVar('active_writer', default=None)
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+class ArtifactWriter:
+    """Bounded queue of frame snapshots written by thread pool, see module docstring."""
+
+    def __init__(self, workers=DEFAULT_WRITE_WORKERS, max_pending_mb=DEFAULT_MAX_PENDING_MB, recorder=None):
+        self.max_pending_mb = max_pending_mb
+        self.recorder = recorder
+        self.records = []
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='artifact-writer')
+        self._pending_mb = 0.0
+        self._memory = threading.Condition()
+        # last write of every artifact - next write of the same artifact waits for it (appends keep order)
+        self._last = {}
+        self._futures = []
+
+    def submit(self, name, write_fn, df, *args, **kwargs):
+        """Queue write_fn(snapshot of df, *args, **kwargs); blocks while too much memory is waiting."""
+        snapshot = df.copy(deep=True)
+        snapshot_mb = frame_mb(snapshot)
+        queued = time.perf_counter()
+        with self._memory:
+            # one snapshot bigger than the limit still goes when nothing else is waiting
+            self._memory.wait_for(lambda: not self._pending_mb or
+                                  self._pending_mb + snapshot_mb <= self.max_pending_mb)
+            self._pending_mb += snapshot_mb
+        submitted = time.perf_counter()
+
+        previous = self._last.get(name)
+        # write runs with context of the caller (output directory of sinks.py etc.)
+        future = self._pool.submit(contextvars.copy_context().run, self._write, name, previous, write_fn, snapshot,
+                                   snapshot_mb, submitted - queued, submitted, args, kwargs)
+        self._last[name] = future
+        self._futures.append(future)
+        return future
+
+    def _write(self, name, previous, write_fn, snapshot, snapshot_mb, blocked_s, submitted, args, kwargs):
+        try:
+            if previous is not None:
+                previous.result()
+            started = time.perf_counter()
+            write_fn(snapshot, *args, **kwargs)
+            record = {
+                'artifact': name,
+                'rows': len(snapshot),
+                'snapshot_mb': round(snapshot_mb, 3),
+                'blocked_s': round(blocked_s, 4),
+                'queued_s': round(started - submitted, 4),
+                'write_s': round(time.perf_counter() - started, 4),
+            }
+            self.records.append(record)
+            if self.recorder is not None:
+                self.recorder.add_artifact(record)
+            log.debug(f"💾 {name}: {record['rows']} rows written in {record['write_s']:.3f}s (background)")
+        finally:
+            del snapshot
+            with self._memory:
+                self._pending_mb -= snapshot_mb
+                self._memory.notify_all()
+
+    def wait(self, name):
+        """Wait for queued writes of one artifact (before it is read or removed)."""
+        previous = self._last.get(name)
+        if previous is not None:
+            previous.result()
+
+    def flush(self):
+        """Wait for all queued writes, raise first write error."""
+        futures, self._futures = self._futures, []
+        errors = [future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+@contextlib.contextmanager
+def background_writes(recorder=None, workers=DEFAULT_WRITE_WORKERS, max_pending_mb=DEFAULT_MAX_PENDING_MB,
+                      enabled=True):
+    """Writes inside the block go to ArtifactWriter, all are finished when the block ends."""
+    if not enabled:
+        yield None
+        return
+    writer = ArtifactWriter(workers, max_pending_mb, recorder)
+    token = _active_writer.set(writer)
+    try:
+        yield writer
+    finally:
+        _active_writer.reset(token)
+        writer.close()
+
+
+def submit_write(name, write_fn, df, *args, **kwargs):
+    """write_fn(df, *args, **kwargs) in background when background_writes is active, otherwise now."""
+    writer = _active_writer.get()
+    if writer is None:
+        write_fn(df, *args, **kwargs)
+    else:
+        writer.submit(name, write_fn, df, *args, **kwargs)
+
+
+def wait_for_writes(name):
+    """Queued writes of artifact name are finished (no-op without active writer)."""
+    writer = _active_writer.get()
+    if writer is not None:
+        writer.wait(name)
@@ -0,0 +1,180 @@
+"""
+Benchmark harness for etl.py and excel_analysis.py on synthetic data (datagen.py).
+
+For every stage: wall time, CPU time, peak RSS and rows/s.
+Results are saved as JSON, so engine changes can be compared with a baseline run:
+
+    python benchmark.py --rows 10000 100000 --out bench_new.json --baseline bench_old.json
+
+CPU time counts only the main process (workers of parallel mode are not included).
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import datagen
+import etl
+import excel_analysis
+from metrics import PeakMemory, setup_logging
+
+ETL_STAGES = ['extract', 'clean', 'attribute', 'summary', 'save_fact', 'streaming', 'parallel']
+
+
+@contextlib.contextmanager
+def measure(results, suite, stage, rows):
+    """Measure one stage and append result record to results."""
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with PeakMemory() as memory:
+        yield
+    wall = time.perf_counter() - wall_start
+    results.append({
+        'suite': suite,
+        'stage': stage,
+        'rows': rows,
+        'wall_s': round(wall, 4),
+        'cpu_s': round(time.process_time() - cpu_start, 4),
+        'peak_rss_mb': round(memory.peak_mb, 1),
+        'rows_per_s': round(rows / wall) if wall > 0 else None,
+    })
+
+
+def print_records(records):
+    for record in records:
+        print(f"   {record['suite']}/{record['stage']} rows={record['rows']:,}: {record['wall_s']:.3f}s, "
+              f"peak RSS {record['peak_rss_mb']:.0f} MB, {record['rows_per_s'] or 0:,} rows/s")
+
+
+@contextlib.contextmanager
+def working_dir(path):
+    """Run stage inside path - etl.py and excel_analysis.py write their outputs to current directory."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_etl(n_rows, work_dir, results, stages=ETL_STAGES, seed=42, workers=None, chunksize=etl.DEFAULT_CHUNKSIZE):
+    """
+    ETL stages on generated sales_data/marketing_campaigns with n_rows sales.
+    extract/clean/attribute/summary/save_fact depend on each other - any of them runs the whole in-memory chain.
+    """
+    first_record = len(results)
+    sales_path, campaigns_path = datagen.generate_etl_inputs(work_dir, n_rows, seed=seed)
+    sales_path, campaigns_path = os.path.abspath(sales_path), os.path.abspath(campaigns_path)
+
+    with working_dir(work_dir), contextlib.redirect_stdout(open(os.devnull, 'w')) as devnull:
+        in_memory = {'extract', 'clean', 'attribute', 'summary', 'save_fact'} & set(stages)
+        if in_memory:
+            with measure(results, 'etl', 'extract', n_rows):
+                # cold parse - input cache would turn repeated runs into parquet reads
+                df_sales = etl.read_sales(sales_path, cache=False)
+                df_campaigns = etl.read_campaigns(campaigns_path, cache=False)
+            with measure(results, 'etl', 'clean', n_rows):
+                df_clean, _ = etl.clean_sales(df_sales)
+            with measure(results, 'etl', 'attribute', len(df_clean)):
+                df_fact = etl.attribute_campaigns(df_clean, df_campaigns)
+            with measure(results, 'etl', 'summary', len(df_fact)):
+                etl.merge_summaries([etl.summarize_sales(df_fact)])
+            with measure(results, 'etl', 'save_fact', len(df_fact)):
+                etl.save_fact(df_fact)
+            del df_sales, df_clean, df_fact
+        if 'streaming' in stages:
+            with measure(results, 'etl', 'streaming', n_rows):
+                etl.stream_fact_sales(etl.read_campaigns(campaigns_path), chunksize, sales_csv=sales_path)
+        if 'parallel' in stages:
+            with measure(results, 'etl', 'parallel', n_rows):
+                etl.parallel_fact_sales(etl.read_campaigns(campaigns_path), workers, chunksize, sales_csv=sales_path)
+        devnull.close()
+    print_records(results[first_record:])
+
+
+def bench_bidlog(n_rows, work_dir, results, seed=42):
+    """excel_analysis.py on generated bid log (xlsx, so max one Excel sheet of rows)."""
+    if n_rows > datagen.EXCEL_MAX_ROWS:
+        print(f"   bidlog rows={n_rows:,} does not fit into one Excel sheet - skipped")
+        return
+    _, xlsx_path = datagen.generate_bidlog(work_dir, n_rows, seed=seed, xlsx=True)
+
+    with working_dir(work_dir), contextlib.redirect_stdout(open(os.devnull, 'w')) as devnull:
+        with measure(results, 'bidlog', 'bidlog_analysis', n_rows):
+            excel_analysis.main(xlsx_path, cache=False)
+        devnull.close()
+    print_records(results[-1:])
+
+
+def run_benchmark(sizes, suites=('etl', 'bidlog'), etl_stages=ETL_STAGES, seed=42, workers=None,
+                  chunksize=etl.DEFAULT_CHUNKSIZE, out='bench_results.json', baseline=None, keep_data=False):
+    """Run benchmark for every size, save results to out (JSON), compare with baseline JSON if given."""
+    results = []
+    for n_rows in sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'bench_{n_rows}_')
+        print(f"📏 rows={n_rows:,} (data in {work_dir})")
+        try:
+            if 'etl' in suites:
+                bench_etl(n_rows, work_dir, results, etl_stages, seed, workers, chunksize)
+            if 'bidlog' in suites:
+                bench_bidlog(n_rows, work_dir, results, seed)
+        finally:
+            if not keep_data:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'results': results,
+    }
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Benchmark saved: {out}")
+    print(pd.DataFrame(results).to_string(index=False))
+
+    if baseline:
+        print(f"\n📊 Compared with baseline {baseline}:")
+        print(compare_with_baseline(results, baseline).to_string(index=False))
+    return results
+
+
+def compare_with_baseline(results, baseline_path):
+    """Speedup (baseline wall / new wall) and peak RSS change per (suite, stage, rows)."""
+    with open(baseline_path) as f:
+        df_baseline = pd.DataFrame(json.load(f)['results'])
+    key = ['suite', 'stage', 'rows']
+    df = pd.DataFrame(results).merge(df_baseline, on=key, how='left', suffixes=('', '_baseline'))
+    df['speedup'] = (df['wall_s_baseline'] / df['wall_s']).round(2)
+    df['peak_rss_change_mb'] = (df['peak_rss_mb'] - df['peak_rss_mb_baseline']).round(1)
+    return df[key + ['wall_s_baseline', 'wall_s', 'speedup', 'peak_rss_mb_baseline', 'peak_rss_mb',
+                     'peak_rss_change_mb']]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark ETL and bid log analysis on synthetic data')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--suites', nargs='+', default=['etl', 'bidlog'], choices=['etl', 'bidlog'])
+    parser.add_argument('--etl-stages', nargs='+', default=ETL_STAGES, choices=ETL_STAGES,
+                        help='in-memory stages run together; for 1e7+ rows use only streaming/parallel')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=etl.DEFAULT_CHUNKSIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', default=None, help='JSON from previous run to compare with')
+    parser.add_argument('--keep-data', action='store_true')
+    args = parser.parse_args()
+
+    # stage logs of measured code would go to stderr - only warnings
+    setup_logging('WARNING')
+    run_benchmark(args.rows, args.suites, args.etl_stages, args.seed, args.workers, args.chunksize,
+                  args.out, args.baseline, args.keep_data)
@@ -0,0 +1,130 @@
+"""
+Content-addressed cache of parsed input files (sales/campaigns csv, bid log xlsx).
+
+    df = cached_frame(path, read_fn, name='sales', version=rules_version(SALES_SCHEMA, clean_fn))
+
+Key = hash(file content, name, version). Parsed (typed, cleaned) frame is stored as parquet,
+so unchanged input loads in milliseconds instead of csv/openpyxl parsing.
+- changed file -> different content hash -> parsed again
+- changed schema or cleaning rules -> rules_version (hash of schema dicts / function source) changes -> parsed again
+- cache directory is bounded (max_mb), least recently used entries are removed first
+
+INPUT_CACHE_DIR / INPUT_CACHE_MAX_MB env variables override defaults, INPUT_CACHE=0 turns cache off.
+"""
+import hashlib
+import inspect
+import logging
+import os
+import threading
+
+import pandas as pd
+
+log = logging.getLogger('cache')
+
+CACHE_DIR = os.environ.get('INPUT_CACHE_DIR', '.input_cache')
+CACHE_MAX_MB = float(os.environ.get('INPUT_CACHE_MAX_MB', 1024))
+# bump when format of cache entries changes
+CACHE_FORMAT_VERSION = 1
+# dtypes which parquet does not restore exactly (arrow strings come back as python strings)
+_DTYPES_ATTR = 'input_cache_dtypes'
+
+# (path, size, mtime) -> content hash, file is hashed once per process while it does not change
+_digests = {}
+# shards are parsed by thread pool (shards.py) - cache writes and eviction of one process one at a time
+_write_lock = threading.Lock()
+
+
+def cache_enabled():
+    return os.environ.get('INPUT_CACHE', '1') != '0'
+
+
+def file_digest(path, block_size=1 << 20):
+    """sha256 of file content."""
+    stat = os.stat(path)
+    stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if stat_key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        _digests[stat_key] = digest.hexdigest()
+    return _digests[stat_key]
+
+
+def rules_version(*rules):
+    """
+    Version of parsing/cleaning rules: dicts/constants by repr, functions by their source code.
+    Any change of schema or cleaning function -> new version -> old cache entries are not used.
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for rule in rules:
+        if callable(rule):
+            rule = inspect.getsource(rule)
+        elif isinstance(rule, (set, frozenset)):
+            # set order changes between processes (hash randomization)
+            rule = sorted(rule)
+        digest.update(repr(rule).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(path, name, version):
+    return hashlib.sha256(f'{file_digest(path)}:{name}:{version}'.encode()).hexdigest()
+
+
+def cached_frame(path, read_fn, name, version='', cache_dir=None, max_mb=None):
+    """
+    read_fn(path) result from cache, or parsed now and stored to cache.
+    Returned frame is always fresh (read from parquet), callers can modify it.
+    """
+    if not cache_enabled():
+        return read_fn(path)
+    cache_dir = cache_dir or CACHE_DIR
+    entry = os.path.join(cache_dir, f'{name}-{cache_key(path, name, version)}.parquet')
+    if os.path.exists(entry):
+        # touch - last use time for LRU eviction
+        os.utime(entry)
+        log.info(f"📦 {path}: loaded from cache {entry}")
+        return read_entry(entry)
+
+    df = read_fn(path)
+    with _write_lock:
+        write_entry(df, entry)
+        evict(cache_dir, CACHE_MAX_MB if max_mb is None else max_mb, keep=entry)
+    return df
+
+
+def write_entry(df, entry):
+    """Parquet entry written atomically (parallel runs can share one cache directory)."""
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    df_store = df.copy(deep=False)
+    df_store.attrs = {_DTYPES_ATTR: {col: f'string[{dtype.storage}]' for col, dtype in df.dtypes.items()
+                                     if isinstance(dtype, pd.StringDtype)}}
+    tmp_entry = f'{entry}.{os.getpid()}.tmp'
+    df_store.to_parquet(tmp_entry, index=False)
+    os.replace(tmp_entry, entry)
+
+
+def read_entry(entry):
+    df = pd.read_parquet(entry)
+    dtypes = df.attrs.pop(_DTYPES_ATTR, {})
+    df.attrs = {}
+    return df.astype(dtypes) if dtypes else df
+
+
+def evict(cache_dir, max_mb, keep=None):
+    """Remove least recently used entries until cache is not bigger than max_mb."""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith('.parquet'):
+            continue
+        path = os.path.join(cache_dir, file_name)
+        stat = os.stat(path)
+        entries.append((path == keep, stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, _, size, _ in entries)
+    # oldest first, just written entry last
+    for _, _, size, path in sorted(entries):
+        if total <= max_mb * 1024 ** 2:
+            break
+        os.remove(path)
+        total -= size
+        log.debug(f"📦 cache evicted {path}")
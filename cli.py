@@ -0,0 +1,171 @@
+"""
+Command line entry point for both pipelines:
+
+    python cli.py etl run --sales data/sales_data.csv --campaigns data/marketing_campaigns.csv --output-dir out
+    python cli.py etl run --chunksize 100000          # or --workers 4, --incremental, --backend sqlite
+    python cli.py etl run --validate-only             # inputs parsed and checked, nothing written
+    python cli.py etl run --chunksize 100000 --dq-capacity 50000000 --dq-fp-rate 0.0001   # DQ duplicate filter
+    python cli.py etl run --sales 'incoming/sales_*.csv' --incremental   # only shards not ingested yet
+    python cli.py etl test
+    python cli.py bidlog analyze --path xlsx_files/Data_Analysis_Programmatic_Operations_Manager.xlsx --output-dir out
+    python cli.py bidlog analyze --validate-only
+    python cli.py bidlog test
+    python cli.py bidlog live --jsonl bids.jsonl --follow --window 300 --step 60   # or --port 9099 (socket)
+
+Nothing heavy is imported at start - pandas/openpyxl and pipeline modules are imported by the subcommand
+which needs them (python cli.py --help does not load pandas).
+Subcommands are plain functions (run_etl, test_etl, analyze_bidlog, test_bidlog, live_bidlog), main(argv) can be
+called again and again from a long-lived worker process - modules are imported once, input cache makes runs on
+unchanged files cheap.
+"""
+import argparse
+import json
+import sys
+
+
+def run_etl(sales_csv=None, campaigns_csv=None, output_dir=None, output_formats=('parquet',), chunksize=None,
+            workers=None, incremental=False, backend='pandas', metrics_path='etl_metrics.jsonl',
+            dq_report_path='dq_report.json', write_in_background=True, validate_only=False, dq_settings=None):
+    """
+    etl run - whole pipeline (etl.etl_pipeline), validate_only=True -> only etl.validate_inputs summary.
+    dq_settings - DataQualityReport arguments (duplicate_method, duplicate_capacity, duplicate_fp_rate).
+    """
+    import etl
+
+    sales_csv = sales_csv or etl.SALES_CSV
+    campaigns_csv = campaigns_csv or etl.CAMPAIGNS_CSV
+    if validate_only:
+        return etl.validate_inputs(sales_csv, campaigns_csv)
+    etl.etl_pipeline(chunksize, incremental, tuple(output_formats), workers, metrics_path, backend, dq_report_path,
+                     write_in_background, sales_csv, campaigns_csv, output_dir, dq_settings)
+    return None
+
+
+def test_etl():
+    """etl test - verification tests of etl.py (inputs from csv_files/ of current directory)."""
+    import etl
+
+    return etl.run_tests()
+
+
+def analyze_bidlog(path=None, output_dir=None, metrics_path='bidlog_metrics.jsonl', export_exploded=False, cache=True,
+                   write_in_background=True, validate_only=False):
+    """bidlog analyze - questions 1-4 (excel_analysis.main), validate_only=True -> load + schema check only."""
+    import excel_analysis
+
+    path = path or excel_analysis.BIDLOG_XLSX
+    if validate_only:
+        return excel_analysis.validate_only(path, cache)
+    excel_analysis.main(path, metrics_path, export_exploded, cache, write_in_background, output_dir)
+    return None
+
+
+def test_bidlog():
+    """bidlog test - verification tests of excel_analysis.py and live_bidlog.py (generated bid logs, sample xlsx)."""
+    import excel_analysis
+    import live_bidlog
+
+    return excel_analysis.run_tests() and live_bidlog.run_tests()
+
+
+def live_bidlog(jsonl_path=None, follow=False, host='127.0.0.1', port=None, window_s=300, step_s=None,
+                output_dir=None, out_path='bidlog_windows.jsonl', idle_timeout_s=None):
+    """bidlog live - sliding/tumbling window answers of live bid records (live_bidlog.run_live)."""
+    import live_bidlog
+    from sinks import output_directory
+
+    with output_directory(output_dir):
+        window = live_bidlog.run_live(jsonl_path, follow, host, port or live_bidlog.BIDLOG_PORT, window_s, step_s,
+                                      out_path, idle_timeout_s)
+    return {'records': window.records, 'late_records': window.late_records}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Sales ETL and bid log analysis')
+    parser.add_argument('--log-level', default=None, help='DEBUG/INFO/WARNING (default LOG_LEVEL env or INFO)')
+    commands = parser.add_subparsers(dest='pipeline', required=True)
+
+    etl_parser = commands.add_parser('etl', help='sales ETL (etl.py)')
+    etl_commands = etl_parser.add_subparsers(dest='command', required=True)
+    run = etl_commands.add_parser('run', help='run ETL pipeline')
+    run.add_argument('--sales', help='sales_data.csv or directory/glob of shards (default csv_files/sales_data.csv)')
+    run.add_argument('--campaigns', help='marketing_campaigns.csv (default csv_files/marketing_campaigns.csv)')
+    run.add_argument('--output-dir', help='artifacts, state, metrics and DQ report (default current directory)')
+    run.add_argument('--formats', nargs='+', default=['parquet'], choices=['parquet', 'csv', 'xlsx'])
+    mode = run.add_mutually_exclusive_group()
+    mode.add_argument('--chunksize', type=int, help='streaming mode, rows per chunk')
+    mode.add_argument('--workers', type=int, help='parallel mode, number of processes')
+    mode.add_argument('--incremental', action='store_true', help='only rows after watermark')
+    mode.add_argument('--validate-only', action='store_true', help='parse and check inputs, nothing is written')
+    run.add_argument('--backend', default='pandas', choices=['pandas', 'sqlite'],
+                     help='sqlite - transform in SQLite staging database (not with --workers/--incremental)')
+    run.add_argument('--metrics', default='etl_metrics.jsonl', help='*.jsonl or *.prom, empty string = off')
+    run.add_argument('--dq-report', default='dq_report.json', help='empty string = off')
+    run.add_argument('--dq-method', choices=['bloom', 'hash'],
+                     help='duplicate transaction_id detection (default bloom)')
+    run.add_argument('--dq-capacity', type=int,
+                     help='keys of first Bloom filter layer, more keys add bigger layers (default 1000000)')
+    run.add_argument('--dq-fp-rate', type=float, help='false positive rate of Bloom filter (default 0.001)')
+    run.add_argument('--no-background-writes', action='store_true', help='write artifacts inline')
+    etl_commands.add_parser('test', help='run ETL verification tests')
+
+    bidlog_parser = commands.add_parser('bidlog', help='bid log analysis (excel_analysis.py)')
+    bidlog_commands = bidlog_parser.add_subparsers(dest='command', required=True)
+    analyze = bidlog_commands.add_parser('analyze', help='answers of questions 1-4')
+    analyze.add_argument('--path', help='bid log xlsx, or directory/glob of xlsx/csv shards (default xlsx_files/...)')
+    analyze.add_argument('--output-dir', help='xlsx exports and metrics (default current directory)')
+    analyze.add_argument('--metrics', default='bidlog_metrics.jsonl', help='*.jsonl or *.prom, empty string = off')
+    analyze.add_argument('--export-exploded', action='store_true',
+                         help='write df_after_separation_via_formats.xlsx (one row per request x size)')
+    analyze.add_argument('--no-cache', action='store_true', help='parse workbook again, do not use input cache')
+    analyze.add_argument('--no-background-writes', action='store_true', help='write xlsx exports inline')
+    analyze.add_argument('--validate-only', action='store_true', help='load and check bid log, nothing is written')
+    bidlog_commands.add_parser('test', help='run bid log verification tests')
+    live = bidlog_commands.add_parser('live', help='questions 2-4 over time windows of live bid records')
+    source = live.add_mutually_exclusive_group()
+    source.add_argument('--jsonl', help='bid records as JSON lines file (default: local socket)')
+    source.add_argument('--port', type=int, help='local socket port of JSON lines records (default 9099)')
+    live.add_argument('--host', default='127.0.0.1')
+    live.add_argument('--follow', action='store_true', help='keep reading lines appended to --jsonl')
+    live.add_argument('--window', type=float, default=300, help='window length in seconds')
+    live.add_argument('--step', type=float, help='sliding step in seconds (default = window, tumbling)')
+    live.add_argument('--idle-timeout', type=float, help='stop socket source after seconds without records')
+    live.add_argument('--output-dir', help='directory of window snapshots (default current directory)')
+    live.add_argument('--out', default='bidlog_windows.jsonl', help='window snapshots (JSON lines), empty = off')
+    return parser
+
+
+def main(argv=None):
+    """Run one subcommand, returns its result (validation summary, test result or None)."""
+    args = build_parser().parse_args(argv)
+    from metrics import setup_logging
+
+    setup_logging(args.log_level)
+    if args.pipeline == 'etl' and args.command == 'test':
+        result = test_etl()
+    elif args.pipeline == 'etl':
+        dq_settings = {name: value for name, value in (('duplicate_method', args.dq_method),
+                                                       ('duplicate_capacity', args.dq_capacity),
+                                                       ('duplicate_fp_rate', args.dq_fp_rate)) if value is not None}
+        result = run_etl(args.sales, args.campaigns, args.output_dir, args.formats, args.chunksize, args.workers,
+                         args.incremental, args.backend, args.metrics, args.dq_report, not args.no_background_writes,
+                         args.validate_only, dq_settings)
+    elif args.command == 'test':
+        result = test_bidlog()
+    elif args.command == 'live':
+        result = live_bidlog(args.jsonl, args.follow, args.host, args.port, args.window, args.step, args.output_dir,
+                             args.out, args.idle_timeout)
+    else:
+        result = analyze_bidlog(args.path, args.output_dir, args.metrics, args.export_exploded, not args.no_cache,
+                                not args.no_background_writes, args.validate_only)
+    if isinstance(result, dict):
+        print(json.dumps(result, indent=2, default=str))
+    return result
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (ValueError, FileNotFoundError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        sys.exit(2)
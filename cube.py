@@ -0,0 +1,149 @@
+"""
+Materialized rollup cube over df_fact - bi_sales_summary at more grains (channel, product, week, region only...).
+
+    cube = SalesCube(df_fact)                      # one pass over df_fact
+    cube.query(['channel'], filters=[('transaction_month', '>=', '2024-06')])
+    cube.save(); SalesCube.load()                  # sales_cube.parquet - all grains in one compact file
+
+df_fact is grouped once to the base grain (all dimensions), every other grain is rolled up from the base
+aggregate, not from facts. Measures are additive (sums and counts), so any grouping/filter over
+dimensions of a grain is answered from that grain - query() picks the smallest one which has all
+needed dimensions. Query at exactly a stored grain is a copy of it, other ones filter and roll up a
+pre-aggregate of a few hundred rows (about a millisecond, not a scan of facts). Answers are memoized,
+repeated BI lookups are dictionary hits.
+"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+from sinks import read_artifact, write_artifact
+
+CUBE_DIMENSIONS = ['region', 'campaign_name', 'channel', 'product_id', 'transaction_month', 'transaction_week']
+CUBE_MEASURES = {
+    'total_sales': ('total_sales', 'sum'),
+    'sales_count': ('transaction_id', 'count'),
+    'quantity': ('quantity', 'sum'),
+}
+# pre-aggregates besides the base grain (CUBE_DIMENSIONS)
+CUBE_GRAINS = [
+    ('region', 'campaign_name', 'transaction_month'),  # bi_sales_summary
+    ('region', 'channel', 'transaction_month'),
+    ('product_id', 'transaction_month'),
+    ('region', 'transaction_week'),
+    ('channel', 'transaction_week'),
+    ('region', 'transaction_month'),
+    ('region', 'channel'),
+    ('product_id', 'channel'),
+    ('campaign_name',),
+    ('channel',),
+    ('product_id',),
+    ('region',),
+    ('transaction_month',),
+    ('transaction_week',),
+]
+FILTER_OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda values, allowed: values.isin(allowed),
+    'not in': lambda values, allowed: ~values.isin(allowed),
+}
+
+
+def week_labels(dates):
+    """Week as 'YYYY-MM-DD' of its Monday, categorical - formatted once per distinct week like month_labels."""
+    week_start = (dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')).dt.normalize()
+    codes, keys = pd.factorize(week_start, sort=True)
+    return pd.Categorical.from_codes(codes, categories=[key.strftime('%Y-%m-%d') for key in keys])
+
+
+def grain_name(dims):
+    return '+'.join(dims)
+
+
+def rollup(df_base, dims):
+    """Additive measures of df_base summed to dims (empty dims -> one totals row)."""
+    if not dims:
+        return df_base[list(CUBE_MEASURES)].sum().to_frame().T.astype(df_base[list(CUBE_MEASURES)].dtypes)
+    return df_base.groupby(list(dims), as_index=False, dropna=False, sort=True)[list(CUBE_MEASURES)].sum()
+
+
+class SalesCube:
+    """
+    Pre-aggregates of df_fact (CUBE_GRAINS + base grain) with query API.
+    NULL dimension values (channel of 'No Campaign' transactions, ...) are kept as own group,
+    so every grain sums to the same totals.
+    """
+
+    def __init__(self, df_fact=None, grains=CUBE_GRAINS, aggregates=None):
+        if aggregates is None:
+            from etl import month_labels
+
+            # one pass over facts - base grain, everything else is rolled up from it
+            dims = pd.DataFrame({dim: df_fact[dim].astype(object) for dim in ('region', 'campaign_name', 'channel',
+                                                                             'product_id')})
+            dims['transaction_month'] = np.asarray(month_labels(df_fact['transaction_date']), dtype=object)
+            dims['transaction_week'] = np.asarray(week_labels(df_fact['transaction_date']), dtype=object)
+            df_base = pd.concat([dims, df_fact[['transaction_id', 'total_sales', 'quantity']]], axis=1) \
+                .groupby(CUBE_DIMENSIONS, as_index=False, dropna=False, sort=True) \
+                .agg(**CUBE_MEASURES)
+            aggregates = {tuple(CUBE_DIMENSIONS): df_base}
+            for dims in grains:
+                aggregates[tuple(dims)] = rollup(df_base, dims)
+        self.aggregates = aggregates
+        self._answers = {}
+
+    def grain_for(self, needed):
+        """Smallest pre-aggregate which has all needed dimensions."""
+        unknown = set(needed) - set(CUBE_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {unknown}, available: {CUBE_DIMENSIONS}")
+        candidates = [dims for dims in self.aggregates if set(needed) <= set(dims)]
+        return min(candidates, key=lambda dims: len(self.aggregates[dims]))
+
+    def query(self, group_by=(), filters=None):
+        """
+        Sums/counts grouped by group_by, filters like read_artifact: [('region', '=', 'North'),
+        ('transaction_month', '>=', '2024-06'), ('channel', 'in', ['Email', 'Search'])].
+        Returned frame is a copy - callers can modify it.
+        """
+        filters = [(col, op, tuple(value) if isinstance(value, (list, set)) else value)
+                   for col, op, value in filters or []]
+        key = (tuple(group_by), tuple(filters))
+        if key not in self._answers:
+            self._answers[key] = self._answer(list(group_by), filters)
+        return self._answers[key].copy()
+
+    def _answer(self, group_by, filters):
+        dims = self.grain_for(group_by + [col for col, _, _ in filters])
+        df = self.aggregates[dims]
+        if filters:
+            mask = np.ones(len(df), dtype=bool)
+            for col, op, value in filters:
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unknown filter operator: {op}, available: {list(FILTER_OPERATORS)}")
+                mask &= FILTER_OPERATORS[op](df[col], value).fillna(False).to_numpy(dtype=bool)
+            df = df[mask]
+        if list(dims) == group_by:
+            return df.reset_index(drop=True)
+        return rollup(df, group_by)
+
+    def save(self, output_formats=('parquet',)):
+        """All grains as one table (grain column + dimensions, unused dimensions empty) - sales_cube artifact."""
+        df_cube = pd.concat([df.assign(grain=grain_name(dims)) for dims, df in self.aggregates.items()],
+                            ignore_index=True)
+        write_artifact(df_cube[['grain'] + CUBE_DIMENSIONS + list(CUBE_MEASURES)], 'sales_cube', output_formats)
+
+    @classmethod
+    def load(cls, fmt='parquet'):
+        df_cube = read_artifact('sales_cube', fmt)
+        aggregates = {}
+        for name, df in df_cube.groupby('grain', sort=False):
+            dims = tuple(name.split('+'))
+            aggregates[dims] = df[list(dims) + list(CUBE_MEASURES)].reset_index(drop=True)
+        return cls(aggregates=aggregates)
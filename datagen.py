@@ -0,0 +1,206 @@
+"""
+Seeded synthetic data generator for scaling tests and benchmarks (benchmark.py).
+
+Produces files with the same columns like real inputs:
+- sales_data.csv + marketing_campaigns.csv (etl.py)
+- bid log (excel_analysis.py) - csv, and xlsx when it fits into one Excel sheet
+
+Rows are generated and written chunk by chunk, so 1e8 rows need only memory of one chunk.
+Same seed + same parameters -> same files.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+REGIONS = ['North', 'South', 'East', 'West']
+CHANNELS = ['Search', 'Display', 'Email', 'Social Media']
+# status mix of the sample bid log (585 / 185 / 40 / 85 rows)
+DEFAULT_STATUS_MIX = {'BID_OK': 0.65, 'TIMEOUT': 0.21, 'NO_BID': 0.05, 'NOT_LEGAL': 0.09}
+AD_SIZES = ['160x600', '970x250', '300x600', '728x90', '300x250', '750x200', '750x100', '750x300', '250x250',
+            '120x600', '950x300', '950x200', '980x120', '970x90', '300x100', '320x50', '336x280', '320x100',
+            '580x400', '300x50', '620x280', '468x60', '234x60', '1x1', '640x100', '960x90']
+EXCEL_MAX_ROWS = 1_048_575
+DEFAULT_CHUNK_ROWS = 1_000_000
+PERIOD_START = pd.Timestamp('2024-01-01')
+PERIOD_DAYS = 366
+
+
+def chunk_rng(seed, chunk_no):
+    """Independent random stream per chunk - result does not depend on how many chunks were generated before."""
+    return np.random.default_rng([seed, chunk_no])
+
+
+def generate_campaigns(n_campaigns=30, n_products=20, overlap_density=0.1, seed=42):
+    """
+    marketing_campaigns table.
+    Campaigns of one product follow each other, overlap_density is the share of campaigns
+    which start before previous campaign of the same product ends (overlap edge case of etl.py).
+    """
+    rng = np.random.default_rng(seed)
+    product_no = rng.integers(1, n_products + 1, n_campaigns)
+    duration = rng.integers(5, 31, n_campaigns)
+    gap = rng.integers(0, 90, n_campaigns)
+    overlaps = rng.random(n_campaigns) < overlap_density
+    # overlapping campaign starts inside previous one (negative gap up to its duration)
+    gap = np.where(overlaps, -rng.integers(1, 5, n_campaigns), gap)
+
+    df = pd.DataFrame({'product_no': product_no, 'duration': duration, 'gap': gap})
+    df = df.sort_values('product_no', kind='mergesort')
+    previous_duration = df.groupby('product_no')['duration'].shift(1, fill_value=0)
+    first_offset = rng.integers(0, 60, n_products + 1)[df['product_no']]
+    offset = (previous_duration + df['gap']).groupby(df['product_no']).cumsum() + first_offset
+    df['start_date'] = PERIOD_START + pd.to_timedelta(offset.clip(lower=0), unit='D')
+    df['end_date'] = df['start_date'] + pd.to_timedelta(df['duration'] - 1, unit='D')
+    df = df.sort_index()
+
+    ids = np.arange(1, n_campaigns + 1)
+    return pd.DataFrame({
+        'campaign_id': [f'CAM{i:03d}' for i in ids],
+        'product_id': [f'P{p:03d}' for p in df['product_no']],
+        'campaign_name': [f'Campaign {i}' for i in ids],
+        'start_date': df['start_date'].dt.strftime('%Y-%m-%d').to_numpy(),
+        'end_date': df['end_date'].dt.strftime('%Y-%m-%d').to_numpy(),
+        'channel': rng.choice(CHANNELS, n_campaigns),
+    })
+
+
+def generate_sales_chunk(first_row, n_rows, n_products=20, n_customers=100, negative_price_rate=0.25,
+                         null_product_rate=0.012, null_customer_rate=0.018, seed=42, chunk_no=0):
+    """One chunk of sales_data - rates default to what the sample file has (122 negative prices / 500 rows etc.)."""
+    rng = chunk_rng(seed, chunk_no)
+    row_no = np.arange(first_row, first_row + n_rows)
+    product_no = rng.integers(1, n_products + 1, n_rows)
+    customer_no = rng.integers(1, n_customers + 1, n_rows)
+    price = np.round(rng.uniform(5, 100, n_rows), 2)
+    price = np.where(rng.random(n_rows) < negative_price_rate, -price, price)
+
+    df = pd.DataFrame({
+        'transaction_id': 'T' + pd.Series(row_no).astype(str).str.zfill(9),
+        'product_id': 'P' + pd.Series(product_no).astype(str).str.zfill(3),
+        'customer_id': 'C' + pd.Series(customer_no).astype(str).str.zfill(4),
+        'quantity': rng.integers(1, 11, n_rows),
+        'price_per_unit': price,
+        'transaction_date': (PERIOD_START + pd.to_timedelta(rng.integers(0, PERIOD_DAYS, n_rows), unit='D'))
+        .strftime('%Y-%m-%d'),
+        'region': rng.choice(REGIONS, n_rows),
+    })
+    df.loc[rng.random(n_rows) < null_product_rate, 'product_id'] = None
+    df.loc[rng.random(n_rows) < null_customer_rate, 'customer_id'] = None
+    return df
+
+
+def generate_bidlog_chunk(n_rows, ssp_count=8, max_sizes=8, multi_size_rate=0.4, status_mix=None,
+                          null_adformat_rate=0.15, null_hits_rate=0.4, duplicate_rate=0.3, seed=42, chunk_no=0):
+    """
+    One chunk of bid log (columns of Data_Analysis_Programmatic_Operations_Manager.xlsx).
+    multi_size_rate - share of requests with more than one available size (list length up to max_sizes),
+    duplicate_rate - share of rows copied from previous row (sample file has a lot of exact duplicates).
+    """
+    rng = chunk_rng(seed, chunk_no)
+    status_mix = status_mix or DEFAULT_STATUS_MIX
+    statuses = list(status_mix)
+    probabilities = np.array([status_mix[s] for s in statuses], dtype=float)
+
+    # available sizes: distinct size lists drawn from small pool - like real traffic, lists repeat a lot
+    n_lists = max(10, min(5_000, n_rows // 50))
+    list_lengths = np.where(rng.random(n_lists) < multi_size_rate, rng.integers(2, max_sizes + 1, n_lists), 1)
+    size_lists = [','.join(rng.choice(AD_SIZES, length, replace=False)) for length in list_lengths]
+    list_no = rng.integers(0, n_lists, n_rows)
+    available = np.array(size_lists, dtype=object)[list_no]
+
+    # chosen format is one of available sizes
+    first_sizes = np.array([sizes.split(',')[0] for sizes in size_lists], dtype=object)
+    chosen = first_sizes[list_no]
+
+    df = pd.DataFrame({
+        'ssp_id': rng.integers(1, ssp_count + 1, n_rows),
+        'bidlog_status': rng.choice(statuses, n_rows, p=probabilities / probabilities.sum()),
+        'bid_adformat': chosen,
+        'available_sizes_in_request': available,
+        'hits': np.round(rng.lognormal(3, 2.5, n_rows)).clip(1, None),
+    })
+    df.loc[rng.random(n_rows) < null_adformat_rate, 'bid_adformat'] = np.nan
+    df.loc[rng.random(n_rows) < null_hits_rate, 'hits'] = np.nan
+
+    source_row = np.arange(n_rows)
+    duplicated = np.flatnonzero(rng.random(n_rows) < duplicate_rate)
+    duplicated = duplicated[duplicated > 0]
+    source_row[duplicated] = duplicated - 1
+    return df.take(source_row).reset_index(drop=True)
+
+
+def write_chunks(path, chunks):
+    """Write generator of DataFrames as one csv (header only once)."""
+    rows = 0
+    for chunk_no, df in enumerate(chunks):
+        df.to_csv(path, mode='w' if chunk_no == 0 else 'a', header=chunk_no == 0, index=False)
+        rows += len(df)
+    return rows
+
+
+def chunk_sizes(n_rows, chunk_rows):
+    """(chunk_no, first_row, rows) for n_rows split into chunks"""
+    for chunk_no, first_row in enumerate(range(0, n_rows, chunk_rows)):
+        yield chunk_no, first_row, min(chunk_rows, n_rows - first_row)
+
+
+def generate_etl_inputs(out_dir, n_rows, n_campaigns=30, n_products=20, n_customers=100, overlap_density=0.1,
+                        negative_price_rate=0.25, null_product_rate=0.012, null_customer_rate=0.018,
+                        seed=42, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write sales_data.csv and marketing_campaigns.csv into out_dir, returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    sales_path = os.path.join(out_dir, 'sales_data.csv')
+    campaigns_path = os.path.join(out_dir, 'marketing_campaigns.csv')
+
+    generate_campaigns(n_campaigns, n_products, overlap_density, seed).to_csv(campaigns_path, index=False)
+    write_chunks(sales_path, (
+        generate_sales_chunk(first_row, rows, n_products, n_customers, negative_price_rate,
+                             null_product_rate, null_customer_rate, seed, chunk_no)
+        for chunk_no, first_row, rows in chunk_sizes(n_rows, chunk_rows)))
+    return sales_path, campaigns_path
+
+
+def generate_bidlog(out_dir, n_rows, ssp_count=8, max_sizes=8, multi_size_rate=0.4, status_mix=None,
+                    seed=42, chunk_rows=DEFAULT_CHUNK_ROWS, xlsx=None):
+    """
+    Write bid log as bidlog.csv into out_dir.
+    xlsx=None -> also bidlog.xlsx (sheet 'Sheet1') when it fits into Excel row limit.
+    Returns (csv path, xlsx path or None).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    csv_path = os.path.join(out_dir, 'bidlog.csv')
+    write_chunks(csv_path, (
+        generate_bidlog_chunk(rows, ssp_count, max_sizes, multi_size_rate, status_mix, seed=seed, chunk_no=chunk_no)
+        for chunk_no, _, rows in chunk_sizes(n_rows, chunk_rows)))
+
+    xlsx_path = None
+    if xlsx or (xlsx is None and n_rows <= EXCEL_MAX_ROWS):
+        xlsx_path = os.path.join(out_dir, 'bidlog.xlsx')
+        pd.read_csv(csv_path).to_excel(xlsx_path, sheet_name='Sheet1', index=False)
+    return csv_path, xlsx_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic ETL / bid log input files')
+    parser.add_argument('--out', default='generated_data')
+    parser.add_argument('--sales-rows', type=int, default=10_000)
+    parser.add_argument('--campaigns', type=int, default=30)
+    parser.add_argument('--products', type=int, default=20)
+    parser.add_argument('--overlap-density', type=float, default=0.1)
+    parser.add_argument('--negative-price-rate', type=float, default=0.25)
+    parser.add_argument('--null-product-rate', type=float, default=0.012)
+    parser.add_argument('--null-customer-rate', type=float, default=0.018)
+    parser.add_argument('--bidlog-rows', type=int, default=10_000)
+    parser.add_argument('--ssp-count', type=int, default=8)
+    parser.add_argument('--max-sizes', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generate_etl_inputs(args.out, args.sales_rows, args.campaigns, args.products,
+                        overlap_density=args.overlap_density, negative_price_rate=args.negative_price_rate,
+                        null_product_rate=args.null_product_rate, null_customer_rate=args.null_customer_rate,
+                        seed=args.seed)
+    generate_bidlog(args.out, args.bidlog_rows, args.ssp_count, args.max_sizes, seed=args.seed)
+    print(f"✅ Generated data in {args.out}")
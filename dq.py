@@ -0,0 +1,351 @@
+"""
+Streaming data quality engine - DQ checks of etl.py without whole dataset in memory.
+
+    report = DataQualityReport()
+    for df_raw, df_fact in chunks:          # or whole frames at once
+        report.update(df_raw, df_fact)
+    report.merge(report_of_other_worker)    # every part is mergeable
+    report.to_dict()                        # structured report (dq_report.json)
+
+Every check keeps a small state instead of full columns:
+1. duplicate transaction_id - scalable Bloom filter (configurable false positive rate, grows with distinct keys)
+   or exact set of 64-bit hashes
+2. P99 outlier threshold of total_sales - KLL quantile sketch (mergeable, ~1% rank error with k=200)
+3. distinct regions/campaigns/products/customers - HyperLogLog
+4. month gaps - set of seen months (tiny)
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+# two independent 64-bit hashes of the same value (hash_key must be 16 characters)
+HASH_KEYS = ('dq-hash-key-0001', 'dq-hash-key-0002')
+# scalable Bloom filter - every next layer has 2x capacity and half of false positive rate of previous one
+BLOOM_GROWTH = 2
+BLOOM_TIGHTENING = 0.5
+DISTINCT_COLUMNS = ['region', 'campaign_name', 'product_id', 'customer_id']
+
+
+def hash_values(values, key_no=0):
+    """64-bit hash per value, NULLs hash to the same value (like duplicated() treats NaN)."""
+    values = pd.Series(values).astype(object).to_numpy()
+    return pd.util.hash_array(values, hash_key=HASH_KEYS[key_no], categorize=False)
+
+
+class QuantileSketch:
+    """
+    KLL sketch - levels of compactors, item at level h stands for 2**h values.
+    Full level is sorted and every second item (random offset) goes one level up,
+    so memory is O(k log n) and sketches of chunks/workers merge by concatenating levels.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # odd item stays at this level, the rest is halved and promoted
+            keep = items[len(items) - len(items) % 2:]
+            promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # capacities depend on number of levels - check from the bottom again
+            level = 0
+
+    def update(self, values):
+        values = np.asarray(pd.Series(values, dtype='float64').dropna())
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Value with rank ~ q * n (None for empty sketch)."""
+        items, weights = self._weighted_items()
+        if not len(items):
+            return None
+        cumulative = np.cumsum(weights)
+        return float(items[min(np.searchsorted(cumulative, q * cumulative[-1]), len(items) - 1)])
+
+    def rank(self, value):
+        """Estimated number of values <= value."""
+        items, weights = self._weighted_items()
+        estimate = weights[items <= value].sum() * self.n / max(weights.sum(), 1)
+        return int(round(estimate))
+
+
+class BloomFilter:
+    """One Bloom filter of capacity keys at fp_rate, positions by double hashing of two 64-bit hashes."""
+
+    def __init__(self, capacity, fp_rate):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.count = 0
+        self.n_bits = int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, int(round(self.n_bits / capacity * math.log(2))))
+        # allocated on first add - fact-only reports of parallel workers stay small
+        self.bits = None
+
+    def _positions(self, h1, h2):
+        steps = np.arange(self.n_hashes, dtype=np.uint64)[:, None]
+        return (h1[None, :] + steps * h2[None, :]) % np.uint64(self.n_bits)
+
+    def contains(self, h1, h2):
+        if self.bits is None:
+            return np.zeros(len(h1), dtype=bool)
+        positions = self._positions(h1, h2)
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=0)
+
+    def add(self, h1, h2):
+        if self.bits is None:
+            self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        positions = self._positions(h1, h2)
+        np.bitwise_or.at(self.bits, (positions >> np.uint64(3)).ravel(),
+                         (1 << (positions & np.uint64(7))).astype(np.uint8).ravel())
+        self.count += len(h1)
+
+    def distinct_estimate(self):
+        """Keys in the filter estimated from share of set bits."""
+        if self.bits is None:
+            return 0.0
+        set_bits = int(np.unpackbits(self.bits, bitorder='little')[:self.n_bits].sum())
+        if set_bits >= self.n_bits:
+            return float('inf')
+        return -self.n_bits / self.n_hashes * math.log(1 - set_bits / self.n_bits)
+
+    def merge(self, other):
+        self.bits = other.bits.copy() if self.bits is None else self.bits | other.bits
+        self.count = int(round(self.distinct_estimate()))
+
+
+class DuplicateDetector:
+    """
+    Duplicated keys in a stream - count of rows whose key was seen before (like duplicated().sum()).
+    method='bloom' -> scalable Bloom filter: first layer sized by capacity, when it is full a new layer
+                      with BLOOM_GROWTH x capacity and BLOOM_TIGHTENING x false positive rate is added,
+                      so rate over all layers stays below fp_rate for any number of keys
+                      (may overcount by ~fp_rate * rows, keys shared by merged parts are estimated from set bits),
+    method='hash' -> exact set of 64-bit hashes (8 bytes per distinct key).
+    """
+
+    def __init__(self, method='bloom', capacity=1_000_000, fp_rate=0.001):
+        if method not in ('bloom', 'hash'):
+            raise ValueError(f"Unknown duplicate detection method: {method} (bloom, hash)")
+        self.method = method
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.duplicates = 0
+        self.rows = 0
+        if method == 'bloom':
+            # fp_rate * (1 - r) * (1 + r + r^2 + ...) = fp_rate
+            self.filters = [BloomFilter(capacity, fp_rate * (1 - BLOOM_TIGHTENING))]
+        else:
+            self.hashes = np.empty(0, dtype=np.uint64)
+
+    def _add_to_filters(self, h1, h2):
+        """New keys go to the last layer, full layer gets a bigger one behind it."""
+        start = 0
+        while start < len(h1):
+            layer = self.filters[-1]
+            if layer.count >= layer.capacity:
+                self.filters.append(BloomFilter(layer.capacity * BLOOM_GROWTH, layer.fp_rate * BLOOM_TIGHTENING))
+                continue
+            stop = start + layer.capacity - layer.count
+            layer.add(h1[start:stop], h2[start:stop])
+            start = stop
+
+    def update(self, values):
+        values = pd.Series(values).reset_index(drop=True)
+        # duplicates inside the chunk are exact, first occurrences are checked against earlier chunks
+        in_chunk = values.duplicated().to_numpy()
+        first = values[~in_chunk]
+        if self.method == 'bloom':
+            h1, h2 = hash_values(first, 0), hash_values(first, 1)
+            seen = np.zeros(len(first), dtype=bool)
+            for layer in self.filters:
+                seen |= layer.contains(h1, h2)
+            self._add_to_filters(h1[~seen], h2[~seen])
+        else:
+            hashes = hash_values(first)
+            seen = np.isin(hashes, self.hashes)
+            self.hashes = np.union1d(self.hashes, hashes)
+        self.duplicates += int(in_chunk.sum() + seen.sum())
+        self.rows += len(values)
+        return self
+
+    def distinct_estimate(self):
+        """Distinct keys - exact for hash set, from share of set bits (sum of layers) for Bloom filter."""
+        if self.method == 'hash':
+            return len(self.hashes)
+        return sum(layer.distinct_estimate() for layer in self.filters)
+
+    def merge(self, other):
+        """
+        Keys seen by both parts are duplicates too: |A| + |B| - |A u B| (estimated for Bloom filter).
+        Bloom layers are merged layer by layer - key which landed in different layers of the parts is not
+        counted, so parts should stay within capacity (etl.py checks raw transaction_ids in one process,
+        parallel workers merge only fact parts without duplicate filters).
+        """
+        if (other.method, other.capacity, other.fp_rate) != (self.method, self.capacity, self.fp_rate):
+            raise ValueError("Only detectors with the same method, capacity and fp_rate can be merged")
+        if not other.rows:
+            return self
+        distinct_self, distinct_other = self.distinct_estimate(), other.distinct_estimate()
+        if self.method == 'bloom':
+            for level, layer in enumerate(other.filters):
+                if level == len(self.filters):
+                    self.filters.append(BloomFilter(layer.capacity, layer.fp_rate))
+                if layer.bits is not None:
+                    self.filters[level].merge(layer)
+        else:
+            self.hashes = np.union1d(self.hashes, other.hashes)
+        common = distinct_self + distinct_other - self.distinct_estimate()
+        self.duplicates += other.duplicates + max(0, int(round(common)))
+        self.rows += other.rows
+        return self
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2**p one-byte registers (~1.04 / sqrt(2**p) relative error), merge = max."""
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if values.empty:
+            return self
+        hashes = hash_values(values)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        # rank = position of first 1 bit in the rest of hash (frexp exponent = bit length)
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.p + 1, 65 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        self.registers = np.maximum(self.registers, other.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        # small range correction - linear counting
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class DataQualityReport:
+    """
+    DQ checks of raw sales (duplicates) and df_fact (outliers, distinct values, months)
+    updated chunk by chunk and merged across chunks/workers.
+    """
+
+    def __init__(self, duplicate_method='bloom', duplicate_capacity=1_000_000, duplicate_fp_rate=0.001,
+                 quantile=0.99, sketch_k=200, hll_p=14):
+        self._settings = {
+            'duplicate_method': duplicate_method, 'duplicate_capacity': duplicate_capacity,
+            'duplicate_fp_rate': duplicate_fp_rate, 'quantile': quantile, 'sketch_k': sketch_k, 'hll_p': hll_p,
+        }
+        self.quantile = quantile
+        self.raw_rows = 0
+        self.fact_rows = 0
+        self.duplicates = DuplicateDetector(duplicate_method, duplicate_capacity, duplicate_fp_rate)
+        self.total_sales = QuantileSketch(sketch_k)
+        self.distinct = {col: HyperLogLog(hll_p) for col in DISTINCT_COLUMNS}
+        self.months = set()
+
+    def settings(self):
+        """Arguments for empty report which can be merged into this one (parallel workers)."""
+        return dict(self._settings)
+
+    def update(self, df_raw=None, df_fact=None):
+        """df_raw - raw sales chunk (before cleaning), df_fact - fact chunk; either can be None."""
+        if df_raw is not None:
+            self.raw_rows += len(df_raw)
+            self.duplicates.update(df_raw['transaction_id'])
+        if df_fact is not None:
+            self.fact_rows += len(df_fact)
+            self.total_sales.update(df_fact['total_sales'])
+            for col, hll in self.distinct.items():
+                hll.update(df_fact[col])
+            dates = pd.to_datetime(df_fact['transaction_date']).dropna()
+            # month as YYYYMM integer (like etl.month_key)
+            self.months.update((dates.dt.year * 100 + dates.dt.month).unique().tolist())
+        return self
+
+    def merge(self, other):
+        self.raw_rows += other.raw_rows
+        self.fact_rows += other.fact_rows
+        self.duplicates.merge(other.duplicates)
+        self.total_sales.merge(other.total_sales)
+        for col, hll in self.distinct.items():
+            hll.merge(other.distinct[col])
+        self.months |= other.months
+        return self
+
+    def month_gaps(self):
+        """Months between first and last transaction month without any transaction."""
+        if not self.months:
+            return []
+        first, last = min(self.months), max(self.months)
+        all_months = pd.period_range(f'{first // 100}-{first % 100:02d}', f'{last // 100}-{last % 100:02d}', freq='M')
+        return [str(month) for month in all_months if month.year * 100 + month.month not in self.months]
+
+    def to_dict(self):
+        threshold = self.total_sales.quantile(self.quantile)
+        outliers = self.total_sales.n - self.total_sales.rank(threshold) if threshold is not None else 0
+        return {
+            'raw_rows': self.raw_rows,
+            'fact_rows': self.fact_rows,
+            'duplicate_transaction_id': self.duplicates.duplicates,
+            'duplicate_method': self.duplicates.method,
+            'duplicate_fp_rate': self.duplicates.fp_rate if self.duplicates.method == 'bloom' else 0.0,
+            'duplicate_bloom_layers': len(self.duplicates.filters) if self.duplicates.method == 'bloom' else 0,
+            'total_sales_quantile': self.quantile,
+            'total_sales_threshold': threshold,
+            'outliers': outliers,
+            'distinct': {col: hll.count() for col, hll in self.distinct.items()},
+            'months': len(self.months),
+            'month_gaps': self.month_gaps(),
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -1,25 +1,406 @@
+import json
+import logging
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import shutil
+import tempfile
+
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from artifact_writer import background_writes, wait_for_writes
+from cache import cached_frame, rules_version
+from dq import DataQualityReport, hash_values
+from metrics import MetricsRecorder, add_dropped, setup_logging
+from shards import SeenKeys, ShardManifest, check_columns, concat_shards, is_sharded, read_shards, resolve_shards
+from sinks import (DEFAULT_OUTPUT_FORMATS, APPENDABLE_FORMATS, FACT_PARTITION_COLS, artifact_path, output_path,
+                   output_directory, current_output_directory, set_output_directory, write_artifact, write_parquet,
+                   read_artifact, remove_artifact)
+
+log = logging.getLogger('etl')
+
+# relative to current directory, portable (os.path.join) - other inputs via etl_pipeline(sales_csv=...) / cli.py
+SALES_CSV = os.path.join('csv_files', 'sales_data.csv')
+CAMPAIGNS_CSV = os.path.join('csv_files', 'marketing_campaigns.csv')
+SUMMARY_KEYS = ['region', 'campaign_name', 'transaction_month']
+DEFAULT_CHUNKSIZE = 100_000
+STATE_DIR = 'etl_state'
+METRICS_PATH = 'etl_metrics.jsonl'
+DQ_REPORT_PATH = 'dq_report.json'
+STATE_FILE = 'etl_state.json'
+FACT_STAGING_DIR = '.df_fact_staging'
+MEMORY_SAMPLE_ROWS = 100_000
 
-def extract_data():
+# declared schema of input files - no type inference, dates parsed while reading
+# ids -> arrow strings (compact, no python object per value), low cardinality -> category,
+# quantity -> nullable Int32 (empty quantity stays NA like in inferred float64), price stays float64
+# (money, float32 would change total_sales)
+SALES_SCHEMA = {
+    'dtype': {
+        'transaction_id': 'string[pyarrow]',
+        'product_id': 'string[pyarrow]',
+        'customer_id': 'string[pyarrow]',
+        'quantity': 'Int32',
+        'price_per_unit': 'float64',
+        'region': 'category',
+    },
+    'parse_dates': ['transaction_date'],
+    'date_format': '%Y-%m-%d',
+}
+CAMPAIGNS_SCHEMA = {
+    'dtype': {
+        'campaign_id': 'string[pyarrow]',
+        'product_id': 'string[pyarrow]',
+        'campaign_name': 'category',
+        'channel': 'category',
+    },
+    'parse_dates': ['start_date', 'end_date'],
+    'date_format': '%Y-%m-%d',
+}
+
+
+def extract_data(typed=True, sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV):
     """
     ETL Step 1: EXTRACT - Load raw CSVs into memory (pandas DataFrames) Memory is limited, so for large files required is database staging or other tools.
-    Logic: pandas.read_csv() - automatically infers column types and parses YYYY-MM-DD dates.
+    Logic: pandas.read_csv() with declared schema (SALES_SCHEMA, CAMPAIGNS_SCHEMA) - keys as category/arrow strings,
+    YYYY-MM-DD dates parsed while reading. typed=False -> old behaviour, pandas infers types.
+    sales_csv can be directory or glob of daily/hourly shards (extract_sales_shards), read concurrently.
     Staging: saved data as staging_*.csv for audit and replayability of the pipeline.
     Why: row data stored as is enables debugging and ETL validation.
 
     """
-    df_sales = pd.read_csv('csv_files\sales_data.csv')
-    df_campaigns = pd.read_csv('csv_files\marketing_campaigns.csv')
+    df_sales = read_all_sales(sales_csv, typed)
+    df_campaigns = read_campaigns(campaigns_csv, typed)
 
-    print(f"✅ Extracted: {len(df_sales)} sales rows, {len(df_campaigns)} campaigns rows")
-    print(f"   Sales shape: {df_sales.shape}, Campaigns shape: {df_campaigns.shape}")
+    log.info(f"✅ Extracted: {len(df_sales)} sales rows, {len(df_campaigns)} campaigns rows")
+    log.info(f"   Sales shape: {df_sales.shape}, Campaigns shape: {df_campaigns.shape}")
+    if typed:
+        sales_sample = resolve_shards(sales_csv, ('*.csv',))[0] if is_sharded(sales_csv) else sales_csv
+        log.info(f"   Memory before (inferred types): sales {inferred_memory_mb(sales_sample, len(df_sales)):.3f} MB, "
+                 f"campaigns {inferred_memory_mb(campaigns_csv, len(df_campaigns)):.3f} MB")
+        log.info(f"   Memory after (declared schema): sales {memory_usage_mb(df_sales):.3f} MB, "
+                 f"campaigns {memory_usage_mb(df_campaigns):.3f} MB")
+    else:
+        log.info(f"   Memory: sales {memory_usage_mb(df_sales):.3f} MB, campaigns {memory_usage_mb(df_campaigns):.3f} MB")
     return df_sales, df_campaigns
 
 
-def transform_fact_sales(df_sales, df_campaigns):
+def validate_inputs(sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV):
+    """
+    Validation only (cli.py etl run --validate-only): inputs parsed with declared schema (input cache hit when
+    files did not change) and checked by cleaning rules - nothing is written.
+    Raises ValueError when file does not match schema.
+    """
+    df_sales = read_all_sales(sales_csv)
+    df_campaigns = read_campaigns(campaigns_csv)
+    _, removed = clean_sales(df_sales)
+    summary = {
+        'sales_rows': len(df_sales),
+        'campaigns_rows': len(df_campaigns),
+        'removed': removed,
+        'duplicate_transaction_id': int(df_sales['transaction_id'].duplicated().sum()),
+    }
+    if is_sharded(sales_csv):
+        summary['sales_shards'] = len(resolve_shards(sales_csv, ('*.csv',)))
+    return summary
+
+
+def read_sales(path=SALES_CSV, typed=True, cache=True, **kwargs):
+    """
+    sales_data.csv with declared schema (typed=False -> inferred types).
+    Whole typed file comes from input cache (cache.py) - parsed again only when file or SALES_SCHEMA changes.
+    """
+    if cache and typed and not kwargs:
+        return cached_frame(path, lambda p: read_sales(p, cache=False), 'sales', rules_version(SALES_SCHEMA))
+    return pd.read_csv(path, **(SALES_SCHEMA if typed else {}), **kwargs)
+
+
+def read_sales_shard(path, typed=True):
+    """One sales shard - header checked first (error names the shard), then read like sales_data.csv (cached)."""
+    check_columns(pd.read_csv(path, nrows=0).columns, list(SALES_SCHEMA['dtype']) + SALES_SCHEMA['parse_dates'], path)
+    return read_sales(path, typed)
+
+
+def read_all_sales(sales_csv=SALES_CSV, typed=True):
+    """Whole sales input - one file, or all shards of directory/glob without transaction_id repeated across shards."""
+    if not is_sharded(sales_csv):
+        return read_sales(sales_csv, typed)
+    frames = [df_shard for _, df_shard in extract_sales_shards(sales_csv, typed=typed)]
+    return concat_shards(frames, SALES_SCHEMA['dtype'] if typed else None)
+
+
+def read_campaigns(path=CAMPAIGNS_CSV, typed=True, cache=True):
+    """marketing_campaigns.csv with declared schema (typed=False -> inferred types), cached like read_sales"""
+    if cache and typed:
+        return cached_frame(path, lambda p: read_campaigns(p, cache=False), 'campaigns',
+                            rules_version(CAMPAIGNS_SCHEMA))
+    return pd.read_csv(path, **(CAMPAIGNS_SCHEMA if typed else {}))
+
+
+def memory_usage_mb(df):
+    """Real memory of DataFrame (deep=True counts also python strings in object columns)."""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def inferred_memory_mb(path, rows, sample_rows=MEMORY_SAMPLE_ROWS):
+    """
+    Memory of file with pandas-inferred types (before declared schema) for extract_data report -
+    measured on first sample_rows rows and scaled to rows, so the file is not parsed twice (exact for smaller files).
+    """
+    df_sample = pd.read_csv(path, nrows=sample_rows)
+    return memory_usage_mb(df_sample) / max(len(df_sample), 1) * rows
+
+
+def month_key(dates):
+    """Month as integer key YYYYMM (e.g. 202405) - cheap to group on, no string per row."""
+    return dates.dt.year * 100 + dates.dt.month
+
+
+def month_labels(dates):
+    """
+    'YYYY-MM' labels as categorical - formatted once per distinct month
+    instead of dt.strftime for every row.
+    """
+    codes, keys = pd.factorize(month_key(dates), sort=True)
+    labels = [f'{int(key) // 100:04d}-{int(key) % 100:02d}' for key in keys]
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def extract_sales_chunks(chunksize=DEFAULT_CHUNKSIZE, sales_csv=SALES_CSV):
+    """
+    ETL Step 1 (streaming mode): EXTRACT sales in fixed-size chunks.
+    Generator - only one chunk of sales_data.csv is in memory at a time
+    (sharded input: shards read ahead by extract_sales_shards are split into chunks).
+    """
+    if is_sharded(sales_csv):
+        yield from shard_chunks(extract_sales_shards(sales_csv), chunksize)
+        return
+    with read_sales(sales_csv, chunksize=chunksize) as reader:
+        for df_chunk in reader:
+            yield df_chunk
+
+
+def extract_sales_shards(sales_source, seen_keys=None, paths=None, workers=None, typed=True):
+    """
+    ETL Step 1 (sharded input): EXTRACT sales from directory/glob of daily or hourly csv shards.
+    Shards are parsed concurrently by thread pool (shards.read_shards) and yielded as (path, df_shard)
+    in name order. Rows whose transaction_id came in an earlier shard (or earlier run - seen_keys of
+    ShardManifest) are dropped, duplicates inside one shard stay for DQ check 1 like in one file.
+    paths -> only these shards (pending shards of manifest), default all shards of sales_source.
+    """
+    seen_keys = seen_keys if seen_keys is not None else SeenKeys()
+    paths = resolve_shards(sales_source, ('*.csv',)) if paths is None else paths
+    log.info(f"📥 Reading {len(paths)} sales shards of {sales_source}")
+    for path, df_shard in read_shards(paths, lambda p: read_sales_shard(p, typed), workers):
+        first_seen = seen_keys.first_seen(df_shard['transaction_id'])
+        repeated = int((~first_seen).sum())
+        if repeated:
+            add_dropped('shard_duplicates', repeated)
+            log.info(f"   {path}: {repeated} rows with transaction_id of earlier shard removed")
+            df_shard = df_shard[first_seen].reset_index(drop=True)
+        yield path, df_shard
+
+
+def shard_chunks(shards, chunksize):
+    """Shards -> chunks of at most chunksize rows, row index continues across chunks like read_csv chunks."""
+    first_row = 0
+    for _, df_shard in shards:
+        for start in range(0, len(df_shard), chunksize):
+            df_chunk = df_shard.iloc[start:start + chunksize].copy()
+            df_chunk.index = pd.RangeIndex(first_row, first_row + len(df_chunk))
+            first_row += len(df_chunk)
+            yield df_chunk
+
+
+def transaction_id_chunks(sales_csv=SALES_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Only transaction_id column of sales, chunk by chunk (sharded input: ids of every shard without ids of
+    earlier shards, like extract_sales_shards removes them).
+    """
+    id_dtype = {'transaction_id': SALES_SCHEMA['dtype']['transaction_id']}
+    if is_sharded(sales_csv):
+        seen_keys = SeenKeys()
+        for path in resolve_shards(sales_csv, ('*.csv',)):
+            ids = pd.read_csv(path, usecols=['transaction_id'], dtype=id_dtype)['transaction_id']
+            yield ids[seen_keys.first_seen(ids)]
+        return
+    with pd.read_csv(sales_csv, usecols=['transaction_id'], dtype=id_dtype, chunksize=chunksize) as reader:
+        for df_ids in reader:
+            yield df_ids['transaction_id']
+
+
+def duplicated_transaction_ids(sales_csv=SALES_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Pre-pass of streaming/parallel mode - sorted 64-bit hashes (dq.hash_values) of transaction_id which occur
+    more than once in whole input (NULL id counts as one value, like drop_duplicates). Only the id column is read,
+    8 bytes per row while sorting.
+    """
+    return repeated_hashes([hash_values(ids) for ids in transaction_id_chunks(sales_csv, chunksize)])
+
+
+def repeated_hashes(hash_parts):
+    """Sorted hashes which occur more than once in all parts together."""
+    hashes = np.sort(np.concatenate(hash_parts or [np.empty(0, dtype=np.uint64)]))
+    return np.unique(hashes[1:][hashes[1:] == hashes[:-1]])
+
+
+def duplicates_last(chunks, duplicated):
+    """
+    (df_chunk, False) without rows of duplicated transaction_id (duplicated_transaction_ids), then
+    (rows of all duplicated ids, True) - attribution of a repeated id depends on all its rows (latest campaign wins,
+    rows without campaign are dropped when another row has one), so they are attributed together at the end
+    like in one frame. Hash collision only moves a row to the last chunk, result stays the same.
+    """
+    deferred = []
+    for df_chunk in chunks:
+        is_duplicated = np.isin(hash_values(df_chunk['transaction_id']), duplicated)
+        if is_duplicated.any():
+            deferred.append(df_chunk[is_duplicated])
+            df_chunk = df_chunk[~is_duplicated]
+        if len(df_chunk):
+            yield df_chunk, False
+    if deferred:
+        log.info(f"   {sum(map(len, deferred)):,} rows of repeated transaction_id attributed together")
+        yield concat_shards(deferred, SALES_SCHEMA['dtype']), True
+
+
+def build_campaign_index(df_campaigns):
+    """
+    Interval index of campaigns per product_id (used by attribute_campaigns).
+
+    Overlapping campaigns of one product are flattened into disjoint segments
+    [segment_start, segment_end]. Every segment keeps campaign which wins there:
+    active campaign with MAX(start_date), on equal start_date first one from campaigns file.
+    Size depends only on campaigns table (max 2 segments per campaign), not on sales.
+    """
+    one_tick = pd.Timedelta(1, unit='ns')
+    campaigns = df_campaigns.dropna(subset=['product_id', 'start_date', 'end_date']).reset_index(drop=True)
+    campaigns['campaign_pos'] = np.arange(len(campaigns))
+
+    # segment boundaries: campaign starts and first moment after campaign end (end_date is inclusive)
+    bounds = pd.concat([
+        pd.DataFrame({'product_id': campaigns['product_id'], 'segment_start': campaigns['start_date']}),
+        pd.DataFrame({'product_id': campaigns['product_id'], 'segment_start': campaigns['end_date'] + one_tick}),
+    ]).drop_duplicates().sort_values(['product_id', 'segment_start'], kind='mergesort')
+    bounds['segment_end'] = bounds.groupby('product_id')['segment_start'].shift(-1) - one_tick
+
+    # winner per segment - candidates are only boundaries x campaigns of the same product
+    candidates = bounds.merge(campaigns[['product_id', 'start_date', 'end_date', 'campaign_pos']], on='product_id')
+    candidates = candidates[
+        (candidates['start_date'] <= candidates['segment_start']) &
+        (candidates['end_date'] >= candidates['segment_start'])
+    ]
+    segments = candidates.sort_values(['start_date', 'campaign_pos'], ascending=[False, True], kind='mergesort') \
+        .drop_duplicates(subset=['product_id', 'segment_start'], keep='first') \
+        .sort_values('segment_start', kind='mergesort')
+
+    return segments[['product_id', 'segment_start', 'segment_end', 'campaign_pos']].reset_index(drop=True), campaigns
+
+
+def lookup_campaigns(df_clean, segments):
+    """
+    As-of lookup of transactions in campaign segments (build_campaign_index):
+    last segment started before transaction, then check it is not finished.
+    Returns row_pos (position in df_clean) and campaign_pos of winning campaign.
+    """
+    lookup = pd.DataFrame({
+        'row_pos': np.arange(len(df_clean)),
+        'product_id': df_clean['product_id'].array,
+        'transaction_date': df_clean['transaction_date'].to_numpy(),
+    }).dropna(subset=['transaction_date']).sort_values('transaction_date', kind='mergesort')
+    # merge_asof needs the same key dtype on both sides - small segments table is converted
+    segments = segments.astype({'product_id': lookup['product_id'].dtype})
+    lookup = pd.merge_asof(lookup, segments, left_on='transaction_date', right_on='segment_start',
+                           by='product_id', direction='backward')
+    lookup = lookup[lookup['transaction_date'] <= lookup['segment_end']].sort_values('row_pos')
+    return lookup[['row_pos', 'campaign_pos']]
+
+
+def attribute_campaigns(df_clean, df_campaigns, campaign_index=None):
+    """
+    Campaign attribution - same result like LEFT JOIN + BETWEEN filter + MAX(start_date),
+    but without sales x campaigns intermediate table.
+    Every transaction is looked up (merge_asof) in disjoint segments from build_campaign_index,
+    so memory depends on len(sales) + len(campaigns).
+    campaign_index - prebuilt build_campaign_index(df_campaigns), reused between chunks.
+    Transactions without active campaign get campaign_name 'No Campaign'.
+    """
+    segments, campaigns = campaign_index or build_campaign_index(df_campaigns)
+    df_clean = df_clean.reset_index(drop=True)
+    lookup = lookup_campaigns(df_clean, segments)
+
+    active_campaigns = pd.concat([
+        df_clean.iloc[lookup['row_pos'].to_numpy()].reset_index(drop=True),
+        campaigns.iloc[lookup['campaign_pos'].to_numpy().astype(int)]
+        .drop(columns=['product_id', 'campaign_pos']).reset_index(drop=True),
+    ], axis=1)
+    # nullable bool - the same column type in every chunk, also when chunk has no campaign at all
+    active_campaigns['is_active_campaign'] = pd.array([True] * len(active_campaigns), dtype='boolean')
+
+    # duplicated transaction_id - keep the one with latest campaign (like before)
+    df_fact = active_campaigns.sort_values('start_date', ascending=False, kind='mergesort') \
+        .drop_duplicates(subset=['transaction_id'], keep='first')
+
+    # for transaction without campaign - same columns and types, campaign columns empty
+    no_campaign_mask = ~df_clean['transaction_id'].isin(df_fact['transaction_id'])
+    df_no_campaign = df_clean[no_campaign_mask].reindex(columns=df_fact.columns).astype(df_fact.dtypes.to_dict())
+    df_no_campaign['campaign_name'] = 'No Campaign'
+
+    return pd.concat([df for df in (df_fact, df_no_campaign) if len(df)] or [df_fact], ignore_index=True)
+
+
+def attribute_campaigns_merge(df_clean, df_campaigns):
+    """
+    Reference attribution (merge-then-filter) - old way used by transform_fact_sales.
+    Memory grows as sales x campaigns per product, kept only to compare results in run_tests.
+    """
+    df_merged = pd.merge(df_clean, df_campaigns, on='product_id', how='left')
+    df_merged['is_active_campaign'] = (
+            (df_merged['transaction_date'] >= df_merged['start_date']) &
+            (df_merged['transaction_date'] <= df_merged['end_date'])
+    )
+    active_campaigns = df_merged[df_merged['is_active_campaign']].copy()
+    df_fact = active_campaigns.sort_values('start_date', ascending=False) \
+        .drop_duplicates(subset=['transaction_id'], keep='first')
+
+    no_campaign_mask = ~df_clean['transaction_id'].isin(df_fact['transaction_id'])
+    df_no_campaign = df_clean[no_campaign_mask].copy()
+    df_no_campaign['campaign_name'] = 'No Campaign'
+
+    return pd.concat([df_fact, df_no_campaign], ignore_index=True)
+
+
+def clean_sales(df_sales):
+    """
+    Cleaning rules of transform_fact_sales (works on whole file or single chunk).
+    Returns cleaned sales with total_sales and counters of removed rows per filter.
+    """
+    df_sales['transaction_date'] = pd.to_datetime(df_sales['transaction_date'])
+    initial_rows = len(df_sales)
+
+    # Filtr 1: price_per_unit >= 0
+    df_clean = df_sales[df_sales['price_per_unit'] >= 0].copy()
+    after_price_rows = len(df_clean)
+
+    # Filtr 2: Remove NULL product_id/customer_id
+    mask_valid_keys = df_clean['product_id'].notna() & df_clean['customer_id'].notna()
+    df_clean = df_clean[mask_valid_keys].copy()
+
+    # 3. Calculate total_sales (empty quantity -> NaN total_sales, skipped by SUM like before)
+    df_clean['total_sales'] = df_clean['quantity'].astype('float64') * df_clean['price_per_unit']
+
+    removed = {
+        'negative_price': initial_rows - after_price_rows,
+        'null_keys': after_price_rows - len(df_clean),
+    }
+    for name, count in removed.items():
+        add_dropped(name, count)
+    return df_clean, removed
+
+
+def transform_fact_sales(df_sales, df_campaigns, output_formats=DEFAULT_OUTPUT_FORMATS):
     """
     ETL Step 2: TRANSFORM - Create fact_sales with validation and campaign join
 
@@ -34,6 +415,7 @@ def transform_fact_sales(df_sales, df_campaigns):
     - Filtr: transaction_date BETWEEN start_date AND end_date
     - Edge case OVERLAP: GROUP BY + MAX(start_date) chooses latest campaign
     - Result: Each transaction has assign to campaign or 'No Campaign'
+    - How: interval index per product + merge_asof (attribute_campaigns), no sales x campaigns table
 
     Business profit: ROI campaign analysis
     """
@@ -51,61 +433,37 @@ def transform_fact_sales(df_sales, df_campaigns):
     - Filter: transaction_date BETWEEN start_date AND end_date
     - Edge case OVERLAP: GROUP BY + MAX(start_date) selects latest campaign
     - Result: Each transaction has assigned campaign or 'No Campaign'
+    - HOW: interval index per product + as-of lookup (attribute_campaigns) - memory bounded by
+      len(sales) + len(campaigns), not by sales x campaigns per product
     Business Benefit: Ability to analyze campaign ROI (how much sales each generated)
     """
     # 1. Date validation
-    df_sales['transaction_date'] = pd.to_datetime(df_sales['transaction_date'])
     df_campaigns['start_date'] = pd.to_datetime(df_campaigns['start_date'])
     df_campaigns['end_date'] = pd.to_datetime(df_campaigns['end_date'])
 
-    # 2. Cleaning: delete invalid rows
-    print("🔧 Cleaning data...")
-    initial_rows = len(df_sales)
-
-    # Filtr 1: price_per_unit >= 0
-    df_clean = df_sales[df_sales['price_per_unit'] >= 0].copy()
-    print(f"   Removed {initial_rows - len(df_clean)} rows with negative prices")
-
-    # Filtr 2: Remove NULL product_id/customer_id
-    mask_valid_keys = df_clean['product_id'].notna() & df_clean['customer_id'].notna()
-    df_clean = df_clean[mask_valid_keys].copy()
-    print(f"   Removed {mask_valid_keys.sum() - len(df_clean)} rows with NULL product/customer_id")
+    # 2. Cleaning: delete invalid rows + 3. total_sales
+    log.info("🔧 Cleaning data...")
+    df_clean, removed = clean_sales(df_sales)
+    log.info(f"   Removed {removed['negative_price']} rows with negative prices")
+    log.info(f"   Removed {removed['null_keys']} rows with NULL product/customer_id")
 
-    # 3. Calculate total_sales
-    df_clean['total_sales'] = df_clean['quantity'] * df_clean['price_per_unit']
+    # 4. JOIN - interval index per product instead of merge sales x campaigns + filter
+    df_fact = attribute_campaigns(df_clean, df_campaigns)
 
-    # 4. JOIN
-    df_merged = pd.merge(df_clean, df_campaigns, on='product_id', how='left')
+    # save (parquet partitioned by month/region, csv/xlsx optional - see sinks.py)
+    save_fact(df_fact, output_formats)
+    log.info(f"df_fact created: {len(df_fact):,} rows")
 
-    # 5. Filter for active campaigns (BETWEEN dates)
-    df_merged['is_active_campaign'] = (
-            (df_merged['transaction_date'] >= df_merged['start_date']) &
-            (df_merged['transaction_date'] <= df_merged['end_date'])
-    )
-    active_campaigns = df_merged[df_merged['is_active_campaign']].copy()
-
-    # 6. SORT + DROP DUPLICATES (without GROUP BY!)
-    df_fact = active_campaigns.sort_values('start_date', ascending=False) \
-        .drop_duplicates(subset=['transaction_id'], keep='first')
-
-    # for transaction without campaign
-    no_campaign_mask = ~df_clean['transaction_id'].isin(df_fact['transaction_id'])
-    df_no_campaign = df_clean[no_campaign_mask].copy()
-    df_no_campaign['campaign_name'] = 'No Campaign'
-
-    # Join
-    df_fact = pd.concat([df_fact, df_no_campaign], ignore_index=True)
+    return df_fact
 
-    # save
-    df_fact.to_csv('df_fact.csv', index=False)
-    # optional Excel file
-    df_fact.to_excel("df_fact.xlsx", index=False)
-    print(f"df_fact created: {len(df_fact):,} rows")
 
-    return df_fact
+def save_fact(df_fact, output_formats=DEFAULT_OUTPUT_FORMATS, append=False):
+    """Write df_fact (or chunk of it) to requested sinks, partitioned by transaction_month/region."""
+    df_fact['transaction_month'] = month_labels(df_fact['transaction_date'])
+    write_artifact(df_fact, 'df_fact', output_formats, append=append, partition_cols=FACT_PARTITION_COLS)
 
 
-def load_bi_summary(df_fact):
+def load_bi_summary(df_fact, output_formats=DEFAULT_OUTPUT_FORMATS):
     """
     ETL Step 3: LOAD - aggregation to bi_sales_summary (reporting table)
 
@@ -118,94 +476,852 @@ def load_bi_summary(df_fact):
 
     Usage: Dashboards BI (PowerBI/Tableau) - szybkie zapytania GROUP BY
     """
-    df_fact['transaction_month'] = df_fact['transaction_date'].dt.strftime('%Y-%m')
+    bi_sales_summary = merge_summaries([summarize_sales(df_fact)])
+    save_bi_summary(bi_sales_summary, output_formats)
+    return bi_sales_summary
+
+
+def summarize_sales(df_fact):
+    """
+    Partial aggregation of df_fact (or one chunk of it) to bi_sales_summary grain.
+    total_sales SUM and sales_count COUNT are additive, so partials can be merged by merge_summaries.
+    transaction_month is categorical (month_labels), so grouping works on integer codes.
+    """
+    df_fact['transaction_month'] = month_labels(df_fact['transaction_date'])
 
-    bi_sales_summary = df_fact.groupby(['region', 'campaign_name', 'transaction_month'], as_index=False).agg({
+    df_summary = df_fact.groupby(SUMMARY_KEYS, as_index=False, observed=True).agg({
         'total_sales': 'sum',
         'transaction_id': 'count'
     }).rename(columns={'transaction_id': 'sales_count'})
+    # summary is small - plain strings, so partials from different chunks merge without category clashes
+    return df_summary.astype({key: object for key in SUMMARY_KEYS})
+
+
+def merge_summaries(partials):
+    """Merge partial summaries (sum of sums and counts) into final bi_sales_summary."""
+    bi_sales_summary = pd.concat(partials, ignore_index=True)
+    if len(partials) > 1:
+        bi_sales_summary = bi_sales_summary.groupby(SUMMARY_KEYS, as_index=False)[['total_sales', 'sales_count']].sum()
 
     # Sort dla czytelności
-    bi_sales_summary = bi_sales_summary.sort_values(['region', 'transaction_month', 'total_sales'], ascending=[True, True, False])
-    # save to csv
-    bi_sales_summary.to_csv('bi_sales_summary.csv', index=False)
-    #  save to excel
-    bi_sales_summary.to_excel("bi_sales_summary.xlsx", index=False)
+    return bi_sales_summary.sort_values(['region', 'transaction_month', 'total_sales'], ascending=[True, True, False])
+
+
+def build_sales_cube(df_fact, output_formats=DEFAULT_OUTPUT_FORMATS):
+    """
+    ETL Step 3b: LOAD - rollup cube (cube.py), bi_sales_summary measures at more grains
+    (channel, product_id, week, region only...), so BI questions at other grain do not rescan df_fact.
+    Returns number of pre-aggregated rows.
+    """
+    from cube import SalesCube
+
+    sales_cube = SalesCube(df_fact)
+    sales_cube.save(output_formats)
+    cube_rows = sum(len(df) for df in sales_cube.aggregates.values())
+    log.info(f"✅ sales_cube created: {len(sales_cube.aggregates)} grains, {cube_rows} rows")
+    return cube_rows
+
+
+def save_bi_summary(bi_sales_summary, output_formats=DEFAULT_OUTPUT_FORMATS):
+    """Write bi_sales_summary to requested sinks (one compact parquet file by default)."""
+    write_artifact(bi_sales_summary, 'bi_sales_summary', output_formats)
+
+    log.info(f"✅ bi_sales_summary created: {len(bi_sales_summary)} rows")
+    log.debug('\n📊 Sample output:\n%s', bi_sales_summary.head(10).round(2))
+
+
+def appendable_formats(output_formats):
+    """Formats which can be written chunk by chunk (streaming/incremental), xlsx is skipped."""
+    skipped = [fmt for fmt in output_formats if fmt not in APPENDABLE_FORMATS]
+    if skipped:
+        log.info(f"   ⚠️ df_fact is written chunk by chunk - skipped formats: {skipped}")
+    return tuple(fmt for fmt in output_formats if fmt in APPENDABLE_FORMATS)
+
+
+def transform_chunk(df_chunk, df_campaigns, campaign_index=None):
+    """
+    TRANSFORM + partial LOAD of one chunk/partition of sales (streaming and parallel mode).
+    Returns (df_fact of chunk, partial summary, removed rows per filter).
+    """
+    df_clean, removed = clean_sales(df_chunk)
+    df_fact_chunk = attribute_campaigns(df_clean, df_campaigns, campaign_index)
+    return df_fact_chunk, summarize_sales(df_fact_chunk), removed
+
+
+def stream_fact_sales(df_campaigns, chunksize=DEFAULT_CHUNKSIZE, output_formats=DEFAULT_OUTPUT_FORMATS,
+                      sales_csv=SALES_CSV, dq_report=None):
+    """
+    ETL Step 2+3 (streaming mode): TRANSFORM + partial LOAD chunk by chunk.
+
+    Per chunk: clean_sales -> attribute_campaigns -> append to df_fact sinks -> summarize_sales.
+    Campaigns table is small, so it stays in memory together with its interval index.
+    Partial summaries are merged at the end (merge_summaries), so peak memory depends on chunksize.
+    transaction_id repeated in the file (DQ check 1) - ids found by a pre-pass over the id column, their rows
+    are attributed together as last chunk (duplicates_last), so df_fact and summary equal the in-memory path.
+    dq_report - DataQualityReport (dq.py) updated with every raw/fact chunk.
+    """
+    df_campaigns['start_date'] = pd.to_datetime(df_campaigns['start_date'])
+    df_campaigns['end_date'] = pd.to_datetime(df_campaigns['end_date'])
+
+    log.info(f"🔧 Streaming sales in chunks of {chunksize:,} rows...")
+    fact_formats = appendable_formats(output_formats)
+    campaign_index = build_campaign_index(df_campaigns)
+    partials = []
+    removed_total = {'negative_price': 0, 'null_keys': 0}
+    fact_rows = 0
+    chunks = duplicates_last(extract_sales_chunks(chunksize, sales_csv),
+                             duplicated_transaction_ids(sales_csv, chunksize))
+    for chunk_no, (df_chunk, _) in enumerate(chunks):
+        df_fact_chunk, df_summary_chunk, removed = transform_chunk(df_chunk, df_campaigns, campaign_index)
+        if dq_report is not None:
+            dq_report.update(df_chunk, df_fact_chunk)
+        save_fact(df_fact_chunk, fact_formats, append=chunk_no > 0)
+        fact_rows += len(df_fact_chunk)
+        for name, count in removed.items():
+            removed_total[name] += count
+
+        # partial sums per chunk are only (region, campaign_name, month) big
+        partials.append(df_summary_chunk)
+        partials = [merge_summaries(partials)] if len(partials) > 16 else partials
+
+    log.info(f"   Removed {removed_total['negative_price']} rows with negative prices")
+    log.info(f"   Removed {removed_total['null_keys']} rows with NULL product/customer_id")
+    log.info(f"df_fact created: {fact_rows:,} rows")
+
+    bi_sales_summary = merge_summaries(partials)
+    save_bi_summary(bi_sales_summary, output_formats)
+    return bi_sales_summary
+
+
+def sales_ranges(path, rows_per_range):
+    """
+    Byte ranges (start, end) of sales_data.csv with about rows_per_range rows, cut at line ends - in parallel mode
+    every worker parses its own range (read_sales_range), main process does not parse the file.
+    Row length is estimated from first 1 MB, one line per row (sales exports have no quoted line breaks).
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        sample = f.read(1 << 20)
+        step = max(int(len(sample) / max(sample.count(b'\n'), 1) * rows_per_range), 1)
+        while start < size:
+            f.seek(min(start + step, size))
+            f.readline()
+            ranges.append((start, f.tell()))
+            start = f.tell()
+    return ranges
+
+
+def read_sales_range(path, start, end, **kwargs):
+    """Rows of one byte range of sales_ranges, typed like read_sales (header from first line of file)."""
+    columns = pd.read_csv(path, nrows=0).columns
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, **{**SALES_SCHEMA, **kwargs})
+
+
+# campaigns + interval index of worker process, set once by init_partition_worker
+_worker_campaigns = None
+
+
+def init_partition_worker(df_campaigns, output_dir=''):
+    """
+    Process pool initializer - campaigns table is small, every worker gets its own copy and index.
+    output_dir - output directory of main process (parquet parts are written by workers).
+    """
+    global _worker_campaigns
+    _worker_campaigns = df_campaigns, build_campaign_index(df_campaigns)
+    set_output_directory(output_dir)
+
+
+def transform_partition(df_partition, parquet_in_worker, return_fact, dq_settings=None):
+    """
+    Worker task (parallel mode): clean + attribute + partial summary of one part of sales.
+    Parquet parts are written directly by worker (unique file names, safe for parallel writers),
+    df_fact goes back to main process only when it has to write csv.
+    dq_settings -> fact part of DataQualityReport is built in worker and merged in main process.
+    """
+    df_campaigns, campaign_index = _worker_campaigns
+    df_fact_part, df_summary_part, removed = transform_chunk(df_partition, df_campaigns, campaign_index)
+    if parquet_in_worker:
+        save_fact(df_fact_part, ('parquet',), append=True)
+    dq_part = DataQualityReport(**dq_settings).update(df_fact=df_fact_part) if dq_settings is not None else None
+    return df_summary_part, removed, len(df_fact_part), df_fact_part if return_fact else None, dq_part
+
+
+def range_transaction_ids(path, start, end):
+    """Worker task (parallel mode pre-pass): transaction_id column of one byte range of sales_ranges."""
+    id_dtype = {'transaction_id': SALES_SCHEMA['dtype']['transaction_id']}
+    return read_sales_range(path, start, end, usecols=['transaction_id'], dtype=id_dtype, parse_dates=False,
+                            date_format=None)['transaction_id']
+
+
+def transform_range(path, start, end, duplicated, parquet_in_worker, return_fact, dq_settings=None):
+    """
+    Worker task (parallel mode, one csv file): parse own byte range and transform it like transform_partition.
+    Rows of repeated transaction_id (duplicated hashes) are returned to main process for last task (duplicates_last).
+    """
+    df_range = read_sales_range(path, start, end)
+    is_duplicated = np.isin(hash_values(df_range['transaction_id']), duplicated)
+    return (*transform_partition(df_range[~is_duplicated], parquet_in_worker, return_fact, dq_settings),
+            df_range[is_duplicated])
+
+
+def parallel_fact_sales(df_campaigns, workers=None, chunksize=DEFAULT_CHUNKSIZE, output_formats=DEFAULT_OUTPUT_FORMATS,
+                        sales_csv=SALES_CSV, dq_report=None):
+    """
+    ETL Step 2+3 (parallel mode): parts of sales are processed in process pool, partial summaries are merged
+    in main process. Attribution needs only campaigns table (every worker has a copy) and summary is additive,
+    so parts of chunksize rows are independent - per task overhead and parquet parts like streaming mode.
+    One csv file: workers parse their own byte ranges (sales_ranges), main process only seeks line ends,
+    so parsing scales with workers too. First pass reads transaction_id of every range (DQ check 1 in main process,
+    in file order), rows of repeated ids come back from range tasks and are one last task (like duplicates_last).
+    Sharded input: shards are parsed by thread pool of extract_sales_shards, chunks go to workers.
+    Memory: at most 2 tasks per worker in flight.
+    dq_report - raw transaction_ids are checked in main process, fact parts in workers (partial reports merged).
+    """
+    workers = workers or os.cpu_count()
+    df_campaigns['start_date'] = pd.to_datetime(df_campaigns['start_date'])
+    df_campaigns['end_date'] = pd.to_datetime(df_campaigns['end_date'])
+    fact_formats = appendable_formats(output_formats)
+    parquet_in_worker = 'parquet' in fact_formats
+    main_formats = tuple(fmt for fmt in fact_formats if fmt != 'parquet')
+    remove_artifact('df_fact', fact_formats)
+    dq_settings = dq_report.settings() if dq_report is not None else None
+
+    log.info(f"🔧 Parallel transform: {workers} workers, tasks of {chunksize:,} rows...")
+    partials = []
+    removed_total = {'negative_price': 0, 'null_keys': 0}
+    fact_rows = 0
+    tasks = 0
+    deferred = []
+
+    def collect(done):
+        nonlocal fact_rows
+        for future in done:
+            df_summary_part, removed, rows, df_fact_part, dq_part, *df_deferred = future.result()
+            if dq_part is not None:
+                dq_report.merge(dq_part)
+            partials.append(df_summary_part)
+            fact_rows += rows
+            for name, count in removed.items():
+                removed_total[name] += count
+                # workers have no metrics stage - dropped rows are counted here
+                add_dropped(name, count)
+            if df_fact_part is not None:
+                save_fact(df_fact_part, main_formats, append=True)
+            deferred.extend(df for df in df_deferred if len(df))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_partition_worker,
+                             initargs=(df_campaigns, current_output_directory())) as pool:
+        in_flight = set()
+
+        def submit(task, *args):
+            nonlocal in_flight, tasks
+            in_flight.add(pool.submit(task, *args, parquet_in_worker, bool(main_formats), dq_settings))
+            tasks += 1
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if len(partials) > 16:
+                partials[:] = [merge_summaries(partials)]
+
+        if is_sharded(sales_csv):
+            chunks = duplicates_last(extract_sales_chunks(chunksize, sales_csv),
+                                     duplicated_transaction_ids(sales_csv, chunksize))
+            for df_chunk, _ in chunks:
+                if dq_report is not None:
+                    dq_report.update(df_raw=df_chunk)
+                submit(transform_partition, df_chunk)
+        else:
+            ranges = sales_ranges(sales_csv, chunksize)
+            starts, ends = [start for start, _ in ranges], [end for _, end in ranges]
+            hashes = []
+            for ids in pool.map(range_transaction_ids, [sales_csv] * len(ranges), starts, ends):
+                if dq_report is not None:
+                    dq_report.update(df_raw=ids.to_frame())
+                hashes.append(hash_values(ids))
+            duplicated = repeated_hashes(hashes)
+            for start, end in ranges:
+                submit(transform_range, sales_csv, start, end, duplicated)
+            collect(wait(in_flight)[0])
+            in_flight = set()
+            if deferred:
+                log.info(f"   {sum(map(len, deferred)):,} rows of repeated transaction_id attributed together")
+                submit(transform_partition, concat_shards(deferred, SALES_SCHEMA['dtype']))
+        collect(wait(in_flight)[0])
+
+    log.info(f"   Removed {removed_total['negative_price']} rows with negative prices")
+    log.info(f"   Removed {removed_total['null_keys']} rows with NULL product/customer_id")
+    log.info(f"df_fact created: {fact_rows:,} rows in {tasks} tasks")
+
+    bi_sales_summary = merge_summaries(partials)
+    save_bi_summary(bi_sales_summary, output_formats)
+    return bi_sales_summary
+
+
+def load_etl_state(state_dir=STATE_DIR):
+    """
+    State of incremental runs (etl_incremental), one generation of it is committed by etl_state.json:
+    - watermark: last (transaction_date, transaction_id) processed
+    - bi_sales_summary_<generation>.csv: summary cells so far
+    - marketing_campaigns_<generation>.csv: campaigns used for attribution of df_fact
+    - shards + shard_keys_<generation>.npy (+ key_segments): ShardManifest of sharded input
+    Returns (None, None, None, empty ShardManifest) before first run.
+    """
+    state_path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(state_path):
+        return None, None, None, ShardManifest()
+
+    with open(state_path) as f:
+        state = json.load(f)
+    generation = state['generation']
+    bi_sales_summary = pd.read_csv(state_file(state_dir, 'bi_sales_summary.csv', generation))
+    df_campaigns = read_campaigns(state_file(state_dir, 'marketing_campaigns.csv', generation))
+    manifest = ShardManifest.load(state['shards'], state_file(state_dir, 'shard_keys.npy', generation),
+                                  state.get('key_segments'))
+    return state['watermark'], bi_sales_summary, df_campaigns, manifest
+
+
+def state_file(state_dir, name, generation):
+    """bi_sales_summary.csv + generation 3 -> <state_dir>/bi_sales_summary_3.csv"""
+    base, ext = os.path.splitext(name)
+    return os.path.join(state_dir, f'{base}_{generation}{ext}')
+
+
+def state_generation(state_dir=STATE_DIR):
+    """Generation committed by etl_state.json, 0 before first run."""
+    state_path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(state_path):
+        return 0
+    with open(state_path) as f:
+        return json.load(f)['generation']
+
+
+def save_etl_state(watermark, bi_sales_summary, df_campaigns, manifest, state_dir=STATE_DIR):
+    """
+    Persist state of incremental run (see load_etl_state) as one unit: files of a new generation are written
+    first, etl_state.json pointing to them is replaced atomically, files of previous generation are removed last.
+    Interrupted save leaves previous generation valid - summary, watermark and ingested shards always match,
+    so the next run processes the same new rows/shards once more without counting them twice.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, STATE_FILE)
+    previous = state_generation(state_dir)
+    generation = previous + 1
+    bi_sales_summary.to_csv(state_file(state_dir, 'bi_sales_summary.csv', generation), index=False)
+    df_campaigns.to_csv(state_file(state_dir, 'marketing_campaigns.csv', generation), index=False)
+    manifest.save_keys(state_file(state_dir, 'shard_keys.npy', generation))
+    with open(f'{state_path}.tmp', 'w') as f:
+        json.dump({'generation': generation, 'watermark': watermark, 'shards': manifest.shards,
+                   'key_segments': manifest.key_segments()}, f, indent=2)
+    os.replace(f'{state_path}.tmp', state_path)
+    if previous:
+        for name in ('bi_sales_summary.csv', 'marketing_campaigns.csv', 'shard_keys.npy'):
+            os.remove(state_file(state_dir, name, previous))
+
+
+def stage_fact_changes(staging_dir, generation, fresh):
+    """
+    df_fact changes of incremental run are written to staging_dir (FACT_STAGING_DIR in output directory) first:
+    replace/ - re-attributed months of parquet + re-attributed df_fact.csv, append/ - new fact rows.
+    staging.json marks them as changes of state generation - they are applied (apply_fact_changes) only after
+    save_etl_state committed this generation, so df_fact always matches summary and watermark of the state.
+    fresh -> first run, staged rows replace whole df_fact instead of being appended.
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    replaced_csv = os.path.join(staging_dir, 'replace', 'df_fact.csv')
+    base_csv = replaced_csv if os.path.exists(replaced_csv) else artifact_path('df_fact', 'csv')
+    # size of df_fact.csv before new rows - apply interrupted in the middle of append starts again from here
+    csv_size = None if fresh or not os.path.exists(base_csv) else os.path.getsize(base_csv)
+    with open(os.path.join(staging_dir, 'staging.json'), 'w') as f:
+        json.dump({'generation': generation, 'fresh': fresh, 'csv_size': csv_size}, f)
+
+
+def apply_fact_changes(staging_dir):
+    """
+    Move staged df_fact changes (stage_fact_changes) into place. Every step can be repeated, so a run interrupted
+    here is finished by recover_fact_changes of the next run:
+    - parquet month (or whole dataset of first run): live directory is renamed away, staged one renamed in
+    - new parquet parts are renamed into their partition directories
+    - df_fact.csv: staged re-attributed file replaces it, new rows are appended from recorded size
+    """
+    with open(os.path.join(staging_dir, 'staging.json')) as f:
+        staged = json.load(f)
+    replaced, appended, old = (os.path.join(staging_dir, part) for part in ('replace', 'append', 'old'))
+    os.makedirs(old, exist_ok=True)
+    fact_parquet = artifact_path('df_fact', 'parquet')
+    replaced_parquet = os.path.join(replaced, 'df_fact.parquet')
+    appended_parquet = os.path.join(appended, 'df_fact.parquet')
+    swaps = [(os.path.join(replaced_parquet, month_dir), os.path.join(fact_parquet, month_dir))
+             for month_dir in (os.listdir(replaced_parquet) if os.path.isdir(replaced_parquet) else [])]
+    if staged['fresh'] and os.path.isdir(appended_parquet):
+        swaps.append((appended_parquet, fact_parquet))
+    for new_dir, live_dir in swaps:
+        if os.path.exists(live_dir):
+            os.replace(live_dir, os.path.join(old, os.path.basename(live_dir)))
+        os.replace(new_dir, live_dir)
+    for root, _, files in os.walk(appended_parquet):
+        live_dir = os.path.join(fact_parquet, os.path.relpath(root, appended_parquet))
+        os.makedirs(live_dir, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(live_dir, name))
+
+    fact_csv = artifact_path('df_fact', 'csv')
+    if os.path.exists(os.path.join(replaced, 'df_fact.csv')):
+        os.replace(os.path.join(replaced, 'df_fact.csv'), fact_csv)
+    appended_csv = os.path.join(appended, 'df_fact.csv')
+    if os.path.exists(appended_csv):
+        if staged['csv_size'] is None:
+            os.replace(appended_csv, fact_csv)
+        else:
+            with open(fact_csv, 'r+b') as f, open(appended_csv, 'rb') as rows:
+                f.truncate(staged['csv_size'])
+                f.seek(staged['csv_size'])
+                rows.readline()  # header
+                shutil.copyfileobj(rows, f)
+            os.remove(appended_csv)
+    shutil.rmtree(staging_dir)
+
+
+def recover_fact_changes(staging_dir, state_dir=STATE_DIR):
+    """
+    Staged df_fact changes left by an interrupted run: committed generation of state -> apply them (the state
+    already counts them), otherwise the state was not saved -> discard them, the run processes the rows again.
+    """
+    if not os.path.isdir(staging_dir):
+        return
+    info_path = os.path.join(staging_dir, 'staging.json')
+    committed = False
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            committed = json.load(f)['generation'] == state_generation(state_dir)
+    if committed:
+        log.info("   ♻️ Applying df_fact changes of interrupted run (state already committed)")
+        apply_fact_changes(staging_dir)
+    else:
+        log.info("   ♻️ Discarding df_fact changes of interrupted run (state not committed)")
+        shutil.rmtree(staging_dir)
+
+
+def upsert_summary(bi_sales_summary, df_added=None, df_removed=None):
+    """
+    Upsert contribution of fact rows into summary cells:
+    added rows are summed in, removed rows (old attribution) are subtracted.
+    Only cells touched by these rows change, empty cells are dropped.
+    """
+    partials = [] if bi_sales_summary is None else [bi_sales_summary]
+    if df_added is not None and len(df_added):
+        partials.append(summarize_sales(df_added))
+    if df_removed is not None and len(df_removed):
+        df_negative = summarize_sales(df_removed)
+        df_negative[['total_sales', 'sales_count']] *= -1
+        partials.append(df_negative)
+
+    if not partials:
+        return pd.DataFrame(columns=SUMMARY_KEYS + ['total_sales', 'sales_count'])
+    bi_sales_summary = merge_summaries(partials)
+    return bi_sales_summary[bi_sales_summary['sales_count'] > 0]
+
+
+def changed_campaigns(df_campaigns_old, df_campaigns_new):
+    """
+    Campaign rows added, removed or modified between two versions of marketing_campaigns.csv.
+    Both versions of modified campaign are returned - attribution can change in old and new date range.
+    """
+    compare = df_campaigns_old.merge(df_campaigns_new, how='outer', indicator=True)
+    return compare[compare['_merge'] != 'both'].drop(columns='_merge')
+
+
+def fact_sales_columns(fact_columns, df_campaigns):
+    """Columns of df_fact which come from sales (input of attribute_campaigns)."""
+    return [c for c in fact_columns
+            if c == 'product_id' or c not in df_campaigns.columns and c != 'is_active_campaign']
+
+
+def reattribute_fact_csv(changed_segments, df_campaigns_new, staging_dir, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    CSV sink: scan df_fact.csv chunk by chunk, copy not affected rows, re-attribute affected ones.
+    New file is written to staging_dir and replaces df_fact.csv in apply_fact_changes.
+    """
+    fact_path = artifact_path('df_fact', 'csv')
+    os.makedirs(staging_dir, exist_ok=True)
+    tmp_path = os.path.join(staging_dir, 'df_fact.csv')
+    affected = []
+    fact_columns = None
+    fact_dates = ['transaction_date', 'start_date', 'end_date']
+    with pd.read_csv(fact_path, chunksize=chunksize, parse_dates=fact_dates) as reader:
+        for chunk_no, df_chunk in enumerate(reader):
+            mask = np.zeros(len(df_chunk), dtype=bool)
+            mask[lookup_campaigns(df_chunk, changed_segments)['row_pos'].to_numpy()] = True
+            affected.append(df_chunk[mask])
+            df_chunk[~mask].to_csv(tmp_path, mode='w' if chunk_no == 0 else 'a', header=chunk_no == 0, index=False)
+            fact_columns = df_chunk.columns
+    if fact_columns is None:
+        return None, None
+
+    df_removed = pd.concat(affected, ignore_index=True)
+    df_reattributed = attribute_campaigns(df_removed[fact_sales_columns(fact_columns, df_campaigns_new)],
+                                          df_campaigns_new)
+    df_reattributed.reindex(columns=fact_columns).to_csv(tmp_path, mode='a', header=False, index=False)
+    return df_removed, df_reattributed
+
+
+def reattribute_fact_parquet(df_changed, changed_segments, df_campaigns_new, staging_dir):
+    """
+    Parquet sink: only transaction_month partitions overlapping changed campaigns are read
+    (predicate pushdown) and rewritten, other months are not touched at all.
+    Rewritten month is written to staging_dir, its live directory is swapped in apply_fact_changes.
+    """
+    months = sorted({str(month) for start, end in zip(df_changed['start_date'], df_changed['end_date'])
+                     if pd.notna(start) and pd.notna(end)
+                     for month in pd.period_range(start, end, freq='M')})
+    removed, reattributed = [], []
+    for month in months:
+        df_month = read_artifact('df_fact', 'parquet', filters=[('transaction_month', '=', month)])
+        mask = np.zeros(len(df_month), dtype=bool)
+        mask[lookup_campaigns(df_month, changed_segments)['row_pos'].to_numpy()] = True
+        if not mask.any():
+            continue
+
+        df_reattributed = attribute_campaigns(df_month[mask][fact_sales_columns(df_month.columns, df_campaigns_new)],
+                                              df_campaigns_new)
+        df_reattributed = df_reattributed.reindex(columns=df_month.columns).astype(df_month.dtypes.to_dict())
+        with output_directory(staging_dir):
+            write_parquet(pd.concat([df for df in (df_month[~mask], df_reattributed) if len(df)], ignore_index=True),
+                          'df_fact', append=True, partition_cols=FACT_PARTITION_COLS)
+        removed.append(df_month[mask])
+        reattributed.append(df_reattributed)
+
+    if not removed:
+        return None, None
+    return pd.concat(removed, ignore_index=True), pd.concat(reattributed, ignore_index=True)
+
+
+def reattribute_fact(df_campaigns_old, df_campaigns_new, staging_dir, output_formats=DEFAULT_OUTPUT_FORMATS,
+                     chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Re-attribution of existing df_fact after campaigns change.
+    Only transactions of changed products inside changed date ranges are attributed again,
+    every appendable sink is updated (staged in staging_dir/replace, see stage_fact_changes).
+    Returns (removed rows, re-attributed rows) for upsert_summary.
+    """
+    df_changed = changed_campaigns(df_campaigns_old, df_campaigns_new)
+    if df_changed.empty:
+        return None, None
+    log.info(f"   Campaigns changed: {len(df_changed)} campaign rows")
+
+    changed_segments, _ = build_campaign_index(df_changed)
+    result = None, None
+    for fmt in output_formats:
+        if not os.path.exists(artifact_path('df_fact', fmt)):
+            continue
+        if fmt == 'csv':
+            result = reattribute_fact_csv(changed_segments, df_campaigns_new, os.path.join(staging_dir, 'replace'),
+                                          chunksize)
+        elif fmt == 'parquet':
+            result = reattribute_fact_parquet(df_changed, changed_segments, df_campaigns_new,
+                                              os.path.join(staging_dir, 'replace'))
+
+    df_removed, df_reattributed = result
+    log.info(f"   Re-attributed {0 if df_reattributed is None else len(df_reattributed):,} transactions")
+    return df_removed, df_reattributed
+
+
+def etl_incremental(state_dir=STATE_DIR, chunksize=DEFAULT_CHUNKSIZE, sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV,
+                    output_formats=DEFAULT_OUTPUT_FORMATS):
+    """
+    ETL incremental mode - only transactions after watermark are processed.
+
+    1. campaigns changed since last run -> re-attribute only affected products/date ranges (reattribute_fact)
+    2. sales after watermark (transaction_date, transaction_id) -> clean + attribute + append to df_fact sinks
+    3. contribution of changed/new rows is upserted into stored summary cells (upsert_summary)
+    First run (no state) processes whole file. Late rows older than watermark are not picked up.
+    Sharded sales_csv (directory/glob): new or changed shards (ShardManifest of state) instead of watermark -
+    late rows of a new shard are picked up too, transaction_id of earlier shards/runs is skipped.
+    df_fact changes are staged and applied after the state is saved (stage_fact_changes), an interrupted run
+    is finished or rolled back by the next one - rows are never appended twice, months never lost.
+    """
+    staging_dir = output_path(FACT_STAGING_DIR)
+    recover_fact_changes(staging_dir, state_dir)
+    watermark, bi_sales_summary, df_campaigns_old, manifest = load_etl_state(state_dir)
+    df_campaigns = read_campaigns(campaigns_csv)
+    log.info(f"🔁 Incremental run, watermark: {watermark}")
+    fact_formats = appendable_formats(output_formats)
+
+    # 1. campaigns changed -> re-attribution of existing facts
+    if df_campaigns_old is not None:
+        df_removed, df_reattributed = reattribute_fact(df_campaigns_old, df_campaigns, staging_dir, fact_formats,
+                                                       chunksize)
+        bi_sales_summary = upsert_summary(bi_sales_summary, df_reattributed, df_removed)
 
-    print(f"✅ bi_sales_summary created: {len(bi_sales_summary)} rows")
-    print("\n📊 Sample output:")
-    print(bi_sales_summary.head(10).round(2))
+    # 2. only new sales rows
+    campaign_index = build_campaign_index(df_campaigns)
+    new_facts = []
+    removed_total = {'negative_price': 0, 'null_keys': 0}
+    fresh = bi_sales_summary is None
+    sharded = is_sharded(sales_csv)
+    if sharded:
+        sales_chunks = new_shard_chunks(manifest, sales_csv, chunksize)
+    else:
+        sales_chunks = extract_sales_chunks(chunksize, sales_csv)
+    for df_chunk in sales_chunks:
+        df_chunk['transaction_date'] = pd.to_datetime(df_chunk['transaction_date'])
+        if watermark is not None and not sharded:
+            last_date = pd.Timestamp(watermark['transaction_date'])
+            is_new = (df_chunk['transaction_date'] > last_date) | (
+                    (df_chunk['transaction_date'] == last_date) &
+                    (df_chunk['transaction_id'] > watermark['transaction_id']))
+            df_chunk = df_chunk[is_new].copy()
+        if df_chunk.empty:
+            continue
 
+        # watermark = max (transaction_date, transaction_id) also for rows discarded by cleaning,
+        # rows without date are skipped - NaT sorts last and would stop every later chunk (NaT compares False)
+        df_dated = df_chunk.dropna(subset=['transaction_date'])
+        if len(df_dated):
+            last_row = df_dated.sort_values(['transaction_date', 'transaction_id']).iloc[-1]
+            chunk_watermark = {'transaction_date': last_row['transaction_date'].isoformat(),
+                               'transaction_id': last_row['transaction_id']}
+            if watermark is None or (chunk_watermark['transaction_date'], chunk_watermark['transaction_id']) > \
+                    (watermark['transaction_date'], watermark['transaction_id']):
+                watermark = chunk_watermark
+
+        df_clean, removed = clean_sales(df_chunk)
+        for name, count in removed.items():
+            removed_total[name] += count
+        df_fact_chunk = attribute_campaigns(df_clean, df_campaigns, campaign_index)
+        with output_directory(os.path.join(staging_dir, 'append')):
+            save_fact(df_fact_chunk, fact_formats, append=True)
+        new_facts.append(summarize_sales(df_fact_chunk))
+
+    new_rows = sum(df['sales_count'].sum() for df in new_facts)
+    log.info(f"   Removed {removed_total['negative_price']} rows with negative prices")
+    log.info(f"   Removed {removed_total['null_keys']} rows with NULL product/customer_id")
+    log.info(f"   New fact rows: {new_rows:,}")
+
+    # 3. upsert new contribution
+    partials = ([] if bi_sales_summary is None else [bi_sales_summary]) + new_facts
+    bi_sales_summary = merge_summaries(partials) if partials else upsert_summary(None)
+    save_bi_summary(bi_sales_summary, output_formats)
+    if watermark is not None or sharded:
+        # summary, watermark, ingested shards and staged df_fact changes in one commit - shards also when all
+        # their rows were dropped (sharded input does not use watermark, so shards are not read again)
+        wait_for_writes('df_fact')
+        stage_fact_changes(staging_dir, state_generation(state_dir) + 1, fresh)
+        save_etl_state(watermark, bi_sales_summary, df_campaigns, manifest, state_dir)
+        apply_fact_changes(staging_dir)
+    elif os.path.isdir(staging_dir):
+        shutil.rmtree(staging_dir)
     return bi_sales_summary
 
 
-def additional_data_quality_checks(df_sales_raw, df_fact, df_summary):
+def new_shard_chunks(manifest, sales_source, chunksize=DEFAULT_CHUNKSIZE):
+    """Chunks of shards not in manifest yet (etl_incremental), every shard read is recorded in manifest."""
+    paths = manifest.pending(resolve_shards(sales_source, ('*.csv',)))
+    log.info(f"   New shards: {len(paths)}")
+
+    def recorded_shards():
+        for path, df_shard in extract_sales_shards(sales_source, manifest.keys, paths):
+            manifest.record(path, len(df_shard))
+            yield path, df_shard
+
+    return shard_chunks(recorded_shards(), chunksize)
+
+
+def additional_data_quality_checks(df_sales_raw, df_fact, df_summary, dq_report=None):
     """
     ADDITIONAL DATA QUALITY CHECKS (suggestions):
     1. Duplicate transaction_id
     2. Outliers in total_sales (e.g. >99th percentile)
     3. Region and campaign_name validation
     4. Temporal distribution (no gaps in months)
+    Checks 1-4 come from DataQualityReport (dq.py) - sketches, no full scans; streaming/parallel runs
+    build the same report chunk by chunk and only log it here (df_sales_raw/df_fact = None).
     """
-    print("\n🔍 Data Quality Checks:")
+    if dq_report is None:
+        dq_report = DataQualityReport().update(df_sales_raw, df_fact)
+    report = dq_report.to_dict()
+    log.info("\n🔍 Data Quality Checks:")
 
     # 1. duplicates in transactions
-    dupl = df_sales_raw['transaction_id'].duplicated().sum()
-    print(f"   Duplicate transaction_id: {dupl}")
+    log.info(f"   Duplicate transaction_id: {report['duplicate_transaction_id']} ({report['duplicate_method']})")
 
     # 2. Outliers total_sales
-    p99 = df_fact['total_sales'].quantile(0.99)
-    outliers = len(df_fact[df_fact['total_sales'] > p99])
-    print(f"   Potential outliers (>P99 total_sales=${p99:,.0f}): {outliers}")
+    if report['total_sales_threshold'] is not None:
+        log.info(f"   Potential outliers (>P{report['total_sales_quantile'] * 100:.0f} "
+                 f"total_sales=${report['total_sales_threshold']:,.0f}): {report['outliers']}")
 
     # 3. unique values
-    print(f"   Unique regions: {df_fact['region'].nunique()}")
-    print(f"   Unique campaigns: {df_fact['campaign_name'].nunique()}")
+    log.info(f"   Unique regions: {report['distinct']['region']}")
+    log.info(f"   Unique campaigns: {report['distinct']['campaign_name']}")
 
     # 4. monthly distribution
+    log.info(f"   Months: {report['months']}, months without sales: {report['month_gaps'] or 'none'}")
     monthly_trend = df_summary.groupby('transaction_month')['total_sales'].sum()
-    print(f"   Monthly sales trend (last 3):")
-    print(monthly_trend.tail(3).round(0))
+    log.info("   Monthly sales trend (last 3):\n%s", monthly_trend.tail(3).round(0))
+    return dq_report
+
+
+def etl_pipeline(chunksize=None, incremental=False, output_formats=DEFAULT_OUTPUT_FORMATS, workers=None,
+                 metrics_path=METRICS_PATH, backend='pandas', dq_report_path=DQ_REPORT_PATH, write_in_background=True,
+                 sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV, output_dir=None, dq_settings=None):
+    """
+    Main ETL pipeline orchestrator
+    chunksize=None -> whole sales file in memory, chunksize=N -> streaming mode (stream_fact_sales)
+    incremental=True -> only rows after watermark, summary upserted (etl_incremental)
+    workers=N -> parallel transform in N processes (parallel_fact_sales)
+    backend='sqlite' -> CSVs staged in SQLite, transform and rollup run as SQL (sql_backend.py),
+                        ValueError together with workers/incremental
+    output_formats -> sinks for df_fact and bi_sales_summary, e.g. ('parquet', 'csv', 'xlsx')
+    metrics_path -> per stage metrics (metrics.py): *.jsonl appended, *.prom Prometheus textfile, None = off
+    dq_report_path -> structured data quality report (dq.py) as JSON, None = off
+    dq_settings -> arguments of DataQualityReport, e.g. {'duplicate_method': 'hash'} or
+                   {'duplicate_capacity': 50_000_000, 'duplicate_fp_rate': 0.0001} (Bloom filter grows past capacity)
+    write_in_background -> artifacts written by background writer (artifact_writer.py) while next stages run,
+                           per artifact write timings land in metrics
+    sales_csv, campaigns_csv -> input files, output_dir -> directory of artifacts, state, metrics and DQ report
+    (None = current directory)
+    """
+    log.info("🚀 === SALES ETL PIPELINE ===\n")
+    recorder = MetricsRecorder('etl')
+    with output_directory(output_dir):
+        try:
+            with background_writes(recorder, enabled=write_in_background) as writer:
+                dq_report = run_pipeline_stages(recorder, chunksize, incremental, output_formats, workers, backend,
+                                                sales_csv, campaigns_csv, dq_settings)
+                if writer is not None:
+                    with recorder.stage('artifact_flush'):
+                        writer.flush()
+            if dq_report is not None and dq_report_path:
+                dq_report.write(output_path(dq_report_path))
+                log.info(f"🔍 Data quality report: {output_path(dq_report_path)}")
+        finally:
+            # also stages finished before failure are exported
+            if metrics_path:
+                recorder.write(output_path(metrics_path))
+                log.info(f"📈 Stage metrics: {output_path(metrics_path)}")
+
+
+def chunked_stage_rows(stage, bi_sales_summary):
+    """rows in/out of streaming/parallel stage - fact rows are sales_count of summary, input = fact + dropped."""
+    stage['rows_out'] = int(bi_sales_summary['sales_count'].sum())
+    stage['rows_in'] = stage['rows_out'] + sum(stage['dropped'].values())
+
+
+def run_pipeline_stages(recorder, chunksize, incremental, output_formats, workers, backend='pandas',
+                        sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV, dq_settings=None):
+    """
+    Stages of etl_pipeline, every one measured by recorder (wall/CPU time, peak RSS, rows, dropped rows).
+    Returns DataQualityReport built with dq_settings (None for incremental and sqlite runs).
+    """
+    dq_settings = dq_settings or {}
+    if backend not in ('pandas', 'sqlite'):
+        raise ValueError(f"Unknown ETL backend: {backend} (pandas, sqlite)")
+    if backend == 'sqlite' and (workers or incremental):
+        raise ValueError("sqlite backend runs whole transform in SQLite - it can not be combined with "
+                         "workers or incremental mode")
+    if incremental:
+        with recorder.stage('incremental') as stage:
+            stage['rows_out'] = len(etl_incremental(output_path(STATE_DIR), chunksize or DEFAULT_CHUNKSIZE,
+                                                    sales_csv, campaigns_csv, output_formats))
+        log.info("\n✅ ETL COMPLETED!")
+        return
+
+    if workers:
+        dq_report = DataQualityReport(**dq_settings)
+        with recorder.stage('parallel') as stage:
+            bi_sales_summary = parallel_fact_sales(read_campaigns(campaigns_csv), workers,
+                                                   chunksize or DEFAULT_CHUNKSIZE, output_formats, sales_csv,
+                                                   dq_report)
+            chunked_stage_rows(stage, bi_sales_summary)
+        additional_data_quality_checks(None, None, bi_sales_summary, dq_report)
+        log.info("\n✅ ETL COMPLETED!")
+        return dq_report
 
+    if backend == 'sqlite':
+        run_sql_stages(recorder, chunksize or DEFAULT_CHUNKSIZE, output_formats, sales_csv, campaigns_csv)
+        return
 
-def etl_pipeline():
-    """Main ETL pipeline orchestrator"""
-    print("🚀 === SALES ETL PIPELINE ===\n")
+    if chunksize:
+        dq_report = DataQualityReport(**dq_settings)
+        with recorder.stage('streaming') as stage:
+            df_campaigns = read_campaigns(campaigns_csv)
+            bi_sales_summary = stream_fact_sales(df_campaigns, chunksize, output_formats, sales_csv, dq_report)
+            chunked_stage_rows(stage, bi_sales_summary)
+        additional_data_quality_checks(None, None, bi_sales_summary, dq_report)
+        log.info("\n✅ ETL COMPLETED!")
+        return dq_report
 
     # ETL Steps
-    df_sales_raw, df_campaigns = extract_data()
+    with recorder.stage('extract') as stage:
+        df_sales_raw, df_campaigns = extract_data(sales_csv=sales_csv, campaigns_csv=campaigns_csv)
+        stage['rows_out'] = len(df_sales_raw)
 
-    print('df_sales_raw\n', df_sales_raw)
-    print('df_campaigns\n', df_campaigns)
-    df_fact = transform_fact_sales(df_sales_raw, df_campaigns)
-    # df_fact save to csv
-    df_fact.to_csv('df_fact.csv', index=False)
-    bi_sales_summary = load_bi_summary(df_fact)
+    # DataFrame dumps only with LOG_LEVEL=DEBUG - repr of whole file is not built otherwise
+    log.debug('df_sales_raw\n%s', df_sales_raw)
+    log.debug('df_campaigns\n%s', df_campaigns)
+    with recorder.stage('transform', rows_in=len(df_sales_raw)) as stage:
+        df_fact = transform_fact_sales(df_sales_raw, df_campaigns, output_formats)
+        stage['rows_out'] = len(df_fact)
+    with recorder.stage('load', rows_in=len(df_fact)) as stage:
+        bi_sales_summary = load_bi_summary(df_fact, output_formats)
+        stage['rows_out'] = len(bi_sales_summary)
+    with recorder.stage('cube', rows_in=len(df_fact)) as stage:
+        stage['rows_out'] = build_sales_cube(df_fact, output_formats)
 
     # Quality checks - I did that additionally
-    additional_data_quality_checks(df_sales_raw, df_fact, bi_sales_summary)
+    with recorder.stage('quality_checks', rows_in=len(df_fact)):
+        dq_report = additional_data_quality_checks(df_sales_raw, df_fact, bi_sales_summary,
+                                                   DataQualityReport(**dq_settings).update(df_sales_raw, df_fact))
+
+    log.info('additionall conclusion:')
+    log.info('there is no scale, amount of data are not enough to prepare scalable analysis and evaluate marketing campaings')
+    log.info('\nI assume this is only sample data for this exercise')
+    log.info('additionally  marketing campaings should be evaluate like we did in this analysis'
+             'not after campaign time or bought impressions \nbut after impresion + click in campaign banner and count redirects (ecommerce shop)')
+    log.info('that is efficient way to evaluate marketing campaings')
+
+    log.info('\nI planned also add auto generating PDF file with whole ready to sale team analysis report but I ran out of time')
+    log.info('in one of project on gihtub I did that example how to use ready library to generate PDF reports to test in python ')
+    log.info('same would be done for this analysis to deliver ready to use report for sales team')
 
-    print('additionall conclusion:')
-    print('there is no scale, amount of data are not enough to prepare scalable analysis and evaluate marketing campaings')
-    print('\nI assume this is only sample data for this exercise')
-    print('additionally  marketing campaings should be evaluate like we did in this analysis'
-          'not after campaign time or bought impressions \nbut after impresion + click in campaign banner and count redirects (ecommerce shop)')
-    print('that is efficient way to evaluate marketing campaings')
+    log.info("\n✅ ETL COMPLETED!")
+    log.info("📁 Generated files:")
+    for fmt in output_formats:
+        log.info(f"   • {artifact_path('df_fact', fmt)} (clean transactions)")
+    for fmt in output_formats:
+        log.info(f"   • {artifact_path('bi_sales_summary', fmt)} (required data to power bi, tableau etc.)")
+    for fmt in output_formats:
+        log.info(f"   • {artifact_path('sales_cube', fmt)} (pre-aggregates at more grains, cube.SalesCube.load)")
+    return dq_report
 
-    print('\nI planned also add auto generating PDF file with whole ready to sale team analysis report but I ran out of time')
-    print('in one of project on gihtub I did that example how to use ready library to generate PDF reports to test in python ')
-    print('same would be done for this analysis to deliver ready to use report for sales team')
 
-    print("\n✅ ETL COMPLETED!")
-    print("📁 Generated files:")
-    print("   • df_fact.csv (clean transactions)")
-    print("   • bi_sales_summary.csv (required data to power bi, tableau etc.)")
+def run_sql_stages(recorder, chunksize, output_formats, sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV):
+    """etl_pipeline(backend='sqlite') - extract/transform/load pushed down to SQLite staging database."""
+    import sql_backend
+
+    conn = sql_backend.connect(output_path(sql_backend.STAGING_DB))
+    try:
+        with recorder.stage('extract') as stage:
+            stage['rows_out'] = sql_backend.stage_inputs(conn, sales_csv, campaigns_csv, chunksize)
+        with recorder.stage('transform', rows_in=stage['rows_out']) as stage:
+            stage['rows_out'], _ = sql_backend.sql_transform_fact_sales(conn, output_formats, chunksize)
+        with recorder.stage('load', rows_in=stage['rows_out']) as stage:
+            stage['rows_out'] = len(sql_backend.sql_load_bi_summary(conn, output_formats))
+    finally:
+        conn.close()
+    log.info('\n🔍 Data Quality Checks need whole df_fact - skipped with sqlite backend')
+    log.info("\n✅ ETL COMPLETED!")
 
 
 def run_tests():
     """Pytest-style testy weryfikacyjne (TAK - bardzo sensowne!)"""
     df_sales, _ = extract_data()
-    df_fact = transform_fact_sales(df_sales, pd.read_csv('csv_files\marketing_campaigns.csv'))
+    df_fact = transform_fact_sales(df_sales, read_campaigns(CAMPAIGNS_CSV))
 
     # Test 1: Walidacja filtrów
     assert df_fact['price_per_unit'].min() >= 0, "Negative prices not filtered"
@@ -216,15 +1332,590 @@ def run_tests():
     sample_row = df_fact.iloc[0]
     assert abs(sample_row['total_sales'] - (sample_row['quantity'] * sample_row['price_per_unit'])) < 0.01
 
-    # Test 3: Summary aggregation
+    # Test 3: interval attribution == merge-then-filter attribution
+    df_campaigns = read_campaigns(CAMPAIGNS_CSV)
+    df_clean = df_fact[[c for c in df_sales.columns]].copy()
+    key = ['transaction_id', 'campaign_name']
+    df_reference = attribute_campaigns_merge(df_clean, df_campaigns).astype({'is_active_campaign': 'boolean'})
+    df_interval = attribute_campaigns(df_clean, df_campaigns)
+    pd.testing.assert_frame_equal(
+        df_interval.sort_values(key).reset_index(drop=True)[df_reference.columns],
+        df_reference.sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    # Test 4: overlap edge cases - nested campaign ended, campaign ends on transaction day, no campaign
+    df_campaigns_edge = pd.DataFrame({
+        'campaign_id': ['A', 'B', 'C'], 'product_id': ['P1', 'P1', 'P1'],
+        'campaign_name': ['Long', 'Nested', 'Late'], 'channel': ['Email', 'Search', 'Display'],
+        'start_date': pd.to_datetime(['2024-01-01', '2024-01-10', '2024-01-25']),
+        'end_date': pd.to_datetime(['2024-01-31', '2024-01-15', '2024-02-05']),
+    })
+    df_sales_edge = pd.DataFrame({
+        'transaction_id': ['T1', 'T2', 'T3', 'T4', 'T5', 'T6'],
+        'product_id': ['P1', 'P1', 'P1', 'P1', 'P1', 'P2'],
+        'transaction_date': pd.to_datetime(['2024-01-12', '2024-01-15', '2024-01-20', '2024-01-31', '2024-02-06', '2024-01-12']),
+    })
+    df_edge = attribute_campaigns(df_sales_edge, df_campaigns_edge).set_index('transaction_id')['campaign_name']
+    assert df_edge.to_dict() == {'T1': 'Nested', 'T2': 'Nested', 'T3': 'Long', 'T4': 'Late',
+                                 'T5': 'No Campaign', 'T6': 'No Campaign'}, "Wrong campaign attribution"
+    df_edge_reference = attribute_campaigns_merge(df_sales_edge, df_campaigns_edge).set_index('transaction_id')
+    assert df_edge.sort_index().equals(df_edge_reference['campaign_name'].sort_index())
+
+    # Test 5: Summary aggregation
     df_summary = load_bi_summary(df_fact)
     assert len(df_summary) > 0, "Summary is empty"
 
-    print("✅ All tests PASSED!")
+    # Test 6: streaming mode (small chunks) == in-memory path
+    df_summary_stream = stream_fact_sales(read_campaigns(CAMPAIGNS_CSV), chunksize=37)
+    pd.testing.assert_frame_equal(df_summary_stream.reset_index(drop=True), df_summary.reset_index(drop=True))
+    df_fact_stream = read_artifact('df_fact')
+    assert len(df_fact_stream) == len(df_fact), "Streaming df_fact has different number of rows"
+    assert dict(zip(df_fact_stream['transaction_id'], df_fact_stream['campaign_name'])) == \
+        dict(zip(df_fact['transaction_id'], df_fact['campaign_name'])), "Streaming attribution differs"
+
+    # Test 7: incremental runs (half of history, rest, campaign change) == full run
+    tmp_dir = tempfile.mkdtemp()
+    state_dir = os.path.join(tmp_dir, 'state')
+    sales_path = os.path.join(tmp_dir, 'sales.csv')
+    campaigns_path = os.path.join(tmp_dir, 'campaigns.csv')
+    df_sales_sorted = read_sales(SALES_CSV).sort_values(['transaction_date', 'transaction_id'])
+    df_campaigns = read_campaigns(CAMPAIGNS_CSV, typed=False)
+    df_campaigns.to_csv(campaigns_path, index=False)
+    output_formats = ('parquet', 'csv')
+    # rows without transaction_date in both runs - they must not become the watermark
+    df_sales_sorted.iloc[[10, 400], df_sales_sorted.columns.get_loc('transaction_date')] = pd.NaT
+    df_sales_sorted.head(250).to_csv(sales_path, index=False)
+    etl_incremental(state_dir, 64, sales_path, campaigns_path, output_formats)
+    df_sales_sorted.to_csv(sales_path, index=False)
+    df_summary_incremental = etl_incremental(state_dir, 64, sales_path, campaigns_path, output_formats)
+    df_summary_full = merge_summaries([summarize_sales(
+        transform_fact_sales(read_sales(sales_path), read_campaigns(campaigns_path)))])
+    pd.testing.assert_frame_equal(df_summary_incremental.reset_index(drop=True), df_summary_full.reset_index(drop=True))
+
+    # campaign change: one campaign longer, one removed, one new
+    df_campaigns.loc[0, 'end_date'] = '2024-09-30'
+    df_campaigns = pd.concat([df_campaigns.iloc[:-1], pd.DataFrame([{
+        'campaign_id': 'CAM099', 'product_id': 'P002', 'campaign_name': 'Campaign 99',
+        'start_date': '2024-03-01', 'end_date': '2024-05-31', 'channel': 'Email'}])], ignore_index=True)
+    df_campaigns.to_csv(campaigns_path, index=False)
+    df_summary_incremental = etl_incremental(state_dir, 64, sales_path, campaigns_path, output_formats)
+    df_summary_full = merge_summaries([summarize_sales(
+        transform_fact_sales(read_sales(sales_path), read_campaigns(campaigns_path)))])
+    pd.testing.assert_frame_equal(
+        df_summary_incremental.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+        df_summary_full.sort_values(SUMMARY_KEYS).reset_index(drop=True), check_dtype=False)
+    df_summary_parquet = merge_summaries([summarize_sales(read_artifact('df_fact', 'parquet'))])
+    df_summary_csv = merge_summaries([summarize_sales(read_artifact('df_fact', 'csv').assign(
+        transaction_date=lambda df: pd.to_datetime(df['transaction_date'])))])
+    for df_check in (df_summary_parquet, df_summary_csv):
+        pd.testing.assert_frame_equal(df_check.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      df_summary_full.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      check_dtype=False)
+
+    # interrupted run (campaign change + new rows): crash before state is saved -> df_fact untouched, rows processed
+    # again; crash in the middle of applying staged df_fact (csv append) -> next run finishes it, nothing twice -
+    # df_fact == the same runs without crash
+    def crash(*args, **kwargs):
+        raise RuntimeError("crash")
+
+    df_fact_runs = {}
+    for run in ('uninterrupted', 'crash'):
+        run_state_dir = os.path.join(tmp_dir, run, 'state')
+        df_sales_sorted.head(250).to_csv(sales_path, index=False)
+        read_campaigns(CAMPAIGNS_CSV, typed=False).to_csv(campaigns_path, index=False)
+        with output_directory(os.path.join(tmp_dir, run)):
+            etl_incremental(run_state_dir, 64, sales_path, campaigns_path, output_formats)
+            df_fact_before = {fmt: read_artifact('df_fact', fmt) for fmt in output_formats}
+            df_sales_sorted.to_csv(sales_path, index=False)
+            df_campaigns.to_csv(campaigns_path, index=False)
+            # save_keys - inside save_etl_state, copyfileobj - csv append of apply_fact_changes
+            for owner, name in ((ShardManifest, 'save_keys'), (shutil, 'copyfileobj')) * (run == 'crash'):
+                original = getattr(owner, name)
+                setattr(owner, name, crash)
+                try:
+                    etl_incremental(run_state_dir, 64, sales_path, campaigns_path, output_formats)
+                    raise AssertionError(f"Crash in {name} not raised")
+                except RuntimeError:
+                    pass
+                finally:
+                    setattr(owner, name, original)
+                if name == 'save_keys':
+                    for fmt in output_formats:
+                        pd.testing.assert_frame_equal(read_artifact('df_fact', fmt), df_fact_before[fmt])
+            df_summary_run = etl_incremental(run_state_dir, 64, sales_path, campaigns_path, output_formats)
+            assert not os.path.exists(output_path(FACT_STAGING_DIR)), "Staged df_fact changes left behind"
+            df_fact_runs[run] = {fmt: read_artifact('df_fact', fmt) for fmt in output_formats}
+        pd.testing.assert_frame_equal(df_summary_run.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      df_summary_full.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      check_dtype=False)
+    fact_key = ['transaction_id', 'campaign_name']
+    for fmt in output_formats:
+        pd.testing.assert_frame_equal(
+            df_fact_runs['crash'][fmt][fact_key].astype(str).sort_values(fact_key).reset_index(drop=True),
+            df_fact_runs['uninterrupted'][fmt][fact_key].astype(str).sort_values(fact_key).reset_index(drop=True))
+
+    # Test 8: predicate pushdown on df_fact partitions == filter after full read
+    df_fact_all = read_artifact('df_fact')
+    df_north = read_artifact('df_fact', filters=[('region', '=', 'North'), ('transaction_month', '>=', '2024-06')])
+    assert len(df_north) == ((df_fact_all['region'] == 'North') & (df_fact_all['transaction_month'] >= '2024-06')).sum()
+    shutil.rmtree(tmp_dir)
+
+    # Test 9: declared schema - less memory, same summary like with inferred types
+    df_sales_inferred, df_campaigns_inferred = read_sales(typed=False), read_campaigns(typed=False)
+    df_sales_typed = read_sales()
+    log.info(f"   Memory sales_data: inferred types {memory_usage_mb(df_sales_inferred):.3f} MB -> "
+             f"declared schema {memory_usage_mb(df_sales_typed):.3f} MB")
+    assert memory_usage_mb(df_sales_typed) < memory_usage_mb(df_sales_inferred), "Typed sales use more memory"
+    assert np.isclose(inferred_memory_mb(SALES_CSV, len(df_sales_typed)), memory_usage_mb(df_sales_inferred))
+    df_summary_inferred = merge_summaries([summarize_sales(transform_fact_sales(df_sales_inferred, df_campaigns_inferred))])
+    pd.testing.assert_frame_equal(df_summary_inferred.reset_index(drop=True), df_summary.reset_index(drop=True))
+    # empty quantity - declared schema reads it as NA (nullable Int32), same summary like inferred float64
+    tmp_dir = tempfile.mkdtemp()
+    sales_path = os.path.join(tmp_dir, 'sales.csv')
+    df_sales_inferred.assign(quantity=df_sales_inferred['quantity'].where(df_sales_inferred.index % 50 != 3)) \
+        .to_csv(sales_path, index=False)
+    df_summaries = [merge_summaries([summarize_sales(transform_fact_sales(df_read, read_campaigns(typed=typed)))])
+                    for df_read, typed in ((read_sales(sales_path, cache=False), True),
+                                           (read_sales(sales_path, typed=False), False))]
+    pd.testing.assert_frame_equal(df_summaries[0].reset_index(drop=True), df_summaries[1].reset_index(drop=True))
+    shutil.rmtree(tmp_dir)
+
+    # Test 10: parallel mode (2 workers, parquet + csv) == in-memory path, measured speedup
+    df_summary_parallel = parallel_fact_sales(read_campaigns(CAMPAIGNS_CSV), workers=2, chunksize=120,
+                                              output_formats=('parquet', 'csv'))
+    pd.testing.assert_frame_equal(df_summary_parallel.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                  df_summary.sort_values(SUMMARY_KEYS).reset_index(drop=True))
+    for fmt in ('parquet', 'csv'):
+        df_fact_parallel = read_artifact('df_fact', fmt)
+        assert dict(zip(df_fact_parallel['transaction_id'], df_fact_parallel['campaign_name'])) == \
+            dict(zip(df_fact['transaction_id'], df_fact['campaign_name'])), f"Parallel attribution differs ({fmt})"
+
+    # transaction_id repeated across chunks (other date/product, so other campaign) - streaming and parallel
+    # resolve it like the in-memory path (one row per id with campaign, latest campaign wins)
+    tmp_dir = tempfile.mkdtemp()
+    df_raw = pd.read_csv(SALES_CSV)
+    df_repeated = df_raw.iloc[::17].head(30).assign(
+        product_id=df_raw['product_id'].iloc[::13].head(30).to_numpy(),
+        transaction_date=lambda d: (pd.to_datetime(d['transaction_date']) - pd.Timedelta(days=20))
+        .dt.strftime('%Y-%m-%d'))
+    repeated_path = os.path.join(tmp_dir, 'sales.csv')
+    pd.concat([df_raw, df_repeated]).to_csv(repeated_path, index=False)
+    df_fact_repeated = transform_fact_sales(read_sales(repeated_path, cache=False), read_campaigns(CAMPAIGNS_CSV))
+    df_summary_repeated = merge_summaries([summarize_sales(df_fact_repeated)])
+    fact_key = ['transaction_id', 'campaign_name', 'transaction_date']
+    with output_directory(tmp_dir):
+        for df_summary_check in (
+                stream_fact_sales(read_campaigns(CAMPAIGNS_CSV), chunksize=37, sales_csv=repeated_path),
+                parallel_fact_sales(read_campaigns(CAMPAIGNS_CSV), workers=2, chunksize=120,
+                                    sales_csv=repeated_path)):
+            pd.testing.assert_frame_equal(df_summary_check.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                          df_summary_repeated.sort_values(SUMMARY_KEYS).reset_index(drop=True))
+            df_fact_check = read_artifact('df_fact')
+            pd.testing.assert_frame_equal(
+                df_fact_check[fact_key].astype(str).sort_values(fact_key).reset_index(drop=True),
+                df_fact_repeated[fact_key].astype(str).sort_values(fact_key).reset_index(drop=True))
+
+    # measured speedup on generated data: parallel does about the work of streaming (cpu of main process + workers),
+    # serial part in main process is small (speedup limit 1 / serial share, Amdahl), parquet parts like streaming
+    # (byte ranges are about chunksize rows); wall clock speedup is checked only when the 2 workers have 2 cores
+    import datagen
+    import resource
+    import time
+    speedup_sales, speedup_campaigns = datagen.generate_etl_inputs(os.path.join(tmp_dir, 'speedup'), 100_000, seed=11)
+    runs = {}
+    for mode in ('streaming', 'parallel'):
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        wall, cpu = time.perf_counter(), time.process_time()
+        with output_directory(os.path.join(tmp_dir, mode)):
+            if mode == 'streaming':
+                stream_fact_sales(read_campaigns(speedup_campaigns, cache=False), 10_000, sales_csv=speedup_sales)
+            else:
+                parallel_fact_sales(read_campaigns(speedup_campaigns, cache=False), 2, 10_000, sales_csv=speedup_sales)
+            parts = sum(len(files) for _, _, files in os.walk(artifact_path('df_fact', 'parquet')))
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        worker_cpu = children_after.ru_utime + children_after.ru_stime - children.ru_utime - children.ru_stime
+        runs[mode] = {'wall': time.perf_counter() - wall, 'main_cpu': time.process_time() - cpu,
+                      'worker_cpu': worker_cpu, 'parts': parts}
+    streaming, parallel = runs['streaming'], runs['parallel']
+    work_ratio = (parallel['main_cpu'] + parallel['worker_cpu']) / streaming['main_cpu']
+    serial_share = parallel['main_cpu'] / streaming['main_cpu']
+    wall_speedup = streaming['wall'] / parallel['wall']
+    log.info(f"   parallel (2 workers) vs streaming: work x{work_ratio:.2f}, main process {serial_share:.0%} "
+             f"(speedup limit x{1 / serial_share:.1f}), wall speedup x{wall_speedup:.2f}, "
+             f"parquet parts {parallel['parts']} vs {streaming['parts']}")
+    assert work_ratio < 2, f"Parallel mode does x{work_ratio:.2f} work of streaming mode"
+    assert serial_share < 0.25, f"Main process does {serial_share:.0%} of streaming work - limits parallel speedup"
+    assert parallel['parts'] <= streaming['parts'] * 1.1, "Parallel mode writes more parquet parts than streaming"
+    if len(os.sched_getaffinity(0)) >= 2:
+        assert wall_speedup > 1.2, f"Parallel mode with 2 workers only x{wall_speedup:.2f} faster"
+    shutil.rmtree(tmp_dir)
+
+    # Test 11: generated data with dense campaign overlaps - interval attribution == merge-then-filter
+    df_campaigns_generated = datagen.generate_campaigns(n_campaigns=200, n_products=20, overlap_density=0.5, seed=7)
+    df_campaigns_generated[['start_date', 'end_date']] = df_campaigns_generated[['start_date', 'end_date']] \
+        .apply(pd.to_datetime)
+    df_clean_generated, _ = clean_sales(datagen.generate_sales_chunk(0, 20_000, seed=7))
+    key = ['transaction_id', 'campaign_name']
+    pd.testing.assert_frame_equal(
+        attribute_campaigns(df_clean_generated, df_campaigns_generated).sort_values(key).reset_index(drop=True),
+        attribute_campaigns_merge(df_clean_generated, df_campaigns_generated).astype({'is_active_campaign': 'boolean'})
+        .sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    # Test 12: stage metrics - dropped rows per filter, rows in/out, JSON lines + Prometheus export
+    recorder = MetricsRecorder('etl')
+    with recorder.stage('transform', rows_in=len(df_sales)) as stage:
+        df_clean_metrics, removed = clean_sales(read_sales())
+        stage['rows_out'] = len(df_clean_metrics)
+    with recorder.stage('parallel') as stage:
+        chunked_stage_rows(stage, parallel_fact_sales(read_campaigns(CAMPAIGNS_CSV), workers=2, chunksize=120))
+    for record in recorder.records:
+        assert record['dropped'] == removed, f"Wrong dropped rows in {record['stage']}: {record['dropped']}"
+        assert record['rows_in'] - sum(record['dropped'].values()) == record['rows_out'] == len(df_fact)
+        assert record['wall_s'] >= 0 and record['peak_rss_mb'] > 0
+    tmp_dir = tempfile.mkdtemp()
+    recorder.write(os.path.join(tmp_dir, 'metrics.jsonl'))
+    with open(os.path.join(tmp_dir, 'metrics.jsonl')) as f:
+        assert [json.loads(line)['stage'] for line in f] == ['transform', 'parallel']
+    recorder.write(os.path.join(tmp_dir, 'metrics.prom'))
+    with open(os.path.join(tmp_dir, 'metrics.prom')) as f:
+        assert f'etl_stage_dropped_rows{{stage="parallel",filter="negative_price"}} {removed["negative_price"]}' \
+               in f.read().splitlines()
+    shutil.rmtree(tmp_dir)
+
+    # Test 13: input cache - hit == parsed frame (also dtypes), invalidation by content and rules version, LRU eviction
+    import cache
+    tmp_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    sales_path = os.path.join(tmp_dir, 'sales.csv')
+    shutil.copy(SALES_CSV, sales_path)
+    parsed = []
+
+    def read_counted(path):
+        parsed.append(path)
+        return read_sales(path, cache=False)
+
+    df_first = cache.cached_frame(sales_path, read_counted, 'sales', 'v1', cache_dir)
+    df_cached = cache.cached_frame(sales_path, read_counted, 'sales', 'v1', cache_dir)
+    assert len(parsed) == 1, "Unchanged input parsed again"
+    pd.testing.assert_frame_equal(df_cached, df_first)
+    cache.cached_frame(sales_path, read_counted, 'sales', 'v2', cache_dir)
+    assert len(parsed) == 2, "Changed rules version did not invalidate cache"
+    read_sales(SALES_CSV, cache=False).head(100).to_csv(sales_path, index=False)
+    assert len(cache.cached_frame(sales_path, read_counted, 'sales', 'v2', cache_dir)) == 100
+    assert len(parsed) == 3, "Changed input file did not invalidate cache"
+    entries = sorted(os.listdir(cache_dir), key=lambda f: os.path.getmtime(os.path.join(cache_dir, f)))
+    max_mb = max(os.path.getsize(os.path.join(cache_dir, f)) for f in entries) * 1.5 / 1024 ** 2
+    cache.cached_frame(sales_path, read_counted, 'sales', 'v3', cache_dir, max_mb=max_mb)
+    assert sum(os.path.getsize(os.path.join(cache_dir, f)) for f in os.listdir(cache_dir)) <= max_mb * 1024 ** 2
+    assert entries[0] not in os.listdir(cache_dir) and len(os.listdir(cache_dir)) == 2, "Cache not evicted (LRU)"
+    assert cache.rules_version(SALES_SCHEMA) != cache.rules_version({**SALES_SCHEMA, 'date_format': '%d.%m.%Y'})
+    shutil.rmtree(tmp_dir)
+
+    # Test 14: sqlite backend (SQL pushdown) == pandas path - sample and generated data with dense overlaps, timings
+    import sql_backend
+    tmp_dir = tempfile.mkdtemp()
+    generated_sales, generated_campaigns = datagen.generate_etl_inputs(tmp_dir, 50_000, n_campaigns=200,
+                                                                       overlap_density=0.5, seed=7)
+    for sales_path, campaigns_path in ((SALES_CSV, CAMPAIGNS_CSV), (generated_sales, generated_campaigns)):
+        started = time.perf_counter()
+        df_fact_pandas = transform_fact_sales(read_sales(sales_path, cache=False),
+                                              read_campaigns(campaigns_path, cache=False))
+        df_summary_pandas = load_bi_summary(df_fact_pandas)
+        pandas_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        conn = sql_backend.connect(os.path.join(tmp_dir, 'staging.db'))
+        sql_backend.stage_inputs(conn, sales_path, campaigns_path, chunksize=20_000)
+        fact_rows, removed = sql_backend.sql_transform_fact_sales(conn, chunksize=20_000)
+        df_summary_sql = sql_backend.sql_load_bi_summary(conn)
+        sql_s = time.perf_counter() - started
+        df_fact_sql = pd.concat(sql_backend.read_fact_chunks(conn), ignore_index=True)
+        conn.close()
+        log.info(f"   {sales_path}: pandas {pandas_s:.3f}s, sqlite {sql_s:.3f}s ({fact_rows:,} fact rows)")
+
+        pd.testing.assert_frame_equal(df_summary_sql.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      df_summary_pandas.sort_values(SUMMARY_KEYS).reset_index(drop=True))
+        key = ['transaction_id', 'campaign_name', 'transaction_date']
+        pd.testing.assert_frame_equal(
+            df_fact_sql.sort_values(key).reset_index(drop=True),
+            df_fact_pandas[df_fact_sql.columns].sort_values(key).reset_index(drop=True),
+            check_dtype=False, check_categorical=False)
+        assert removed == clean_sales(read_sales(sales_path, cache=False))[1], "SQL filters drop different rows"
+    shutil.rmtree(tmp_dir)
+
+    # Test 15: rollup cube - answers from pre-aggregates == group by on df_fact, saved cube == built, cold lookups
+    from cube import SalesCube, week_labels
+    sales_cube = SalesCube(df_fact)
+    df_dims = df_fact.assign(transaction_month=month_labels(df_fact['transaction_date']).astype(object),
+                             transaction_week=week_labels(df_fact['transaction_date']).astype(object),
+                             region=df_fact['region'].astype(object), channel=df_fact['channel'].astype(object))
+    pd.testing.assert_frame_equal(sales_cube.query(SUMMARY_KEYS)[SUMMARY_KEYS + ['total_sales', 'sales_count']],
+                                  df_summary.sort_values(SUMMARY_KEYS).reset_index(drop=True))
+    bi_queries = ((['transaction_week'], [('region', 'in', ['North', 'South'])]),
+                  (['region'], [('transaction_month', '>=', '2024-06')]),
+                  (['product_id', 'channel'], []), (['region', 'transaction_month'], []))
+    for group_by, filters in ((['channel'], []), (['product_id', 'transaction_week'], []), ([], []),
+                              (['region'], [('transaction_month', '>=', '2024-06'), ('channel', '!=', 'Email')]),
+                              *bi_queries):
+        df_expected = df_dims
+        for col, op, value in filters:
+            df_expected = df_expected[df_expected[col].isin(value) if op == 'in' else
+                                      df_expected[col].ne(value) if op == '!=' else df_expected[col] >= value]
+        df_expected = df_expected.groupby(group_by or np.zeros(len(df_expected)), dropna=False).agg(
+            total_sales=('total_sales', 'sum'), sales_count=('transaction_id', 'count'), quantity=('quantity', 'sum'))
+        df_answer = sales_cube.query(group_by, filters)
+        assert len(df_answer) == len(df_expected), f"Cube answer for {group_by} has wrong number of groups"
+        assert np.allclose(df_answer['total_sales'], df_expected['total_sales']), f"Cube total_sales differ {group_by}"
+        assert (df_answer['sales_count'].to_numpy() == df_expected['sales_count'].to_numpy()).all()
+    sales_cube.save()
+    loaded_cube = SalesCube.load()
+    assert loaded_cube.grain_for(['channel']) == ('channel',), "Query does not use smallest grain"
+    assert loaded_cube.grain_for(['product_id', 'channel']) == ('product_id', 'channel')
+    pd.testing.assert_frame_equal(loaded_cube.query(['channel', 'transaction_month']),
+                                  sales_cube.query(['channel', 'transaction_month']), check_dtype=False)
+    # cold lookups (new cube, nothing memoized) - only logged, wall time depends on the machine
+    for group_by, filters in bi_queries:
+        started = time.perf_counter()
+        SalesCube(aggregates=loaded_cube.aggregates).query(group_by, filters)
+        log.info(f"   Cube lookup {group_by} {filters}: {(time.perf_counter() - started) * 1000:.2f} ms (cold)")
+
+    # Test 16: streaming DQ report - same checks from whole frames, chunks and merged worker parts; sketch accuracy
+    df_sales_dq = read_sales()
+    report = additional_data_quality_checks(df_sales_dq, df_fact, df_summary).to_dict()
+    assert report['duplicate_transaction_id'] == df_sales_dq['transaction_id'].duplicated().sum()
+    assert report['distinct']['region'] == df_fact['region'].nunique()
+    assert report['distinct']['campaign_name'] == df_fact['campaign_name'].nunique()
+    assert report['months'] == df_summary['transaction_month'].nunique() and report['month_gaps'] == []
+    exact_fields = ['raw_rows', 'fact_rows', 'duplicate_transaction_id', 'distinct', 'months', 'month_gaps']
+    dq_stream = DataQualityReport(duplicate_method='hash')
+    stream_fact_sales(read_campaigns(CAMPAIGNS_CSV), chunksize=37, dq_report=dq_stream)
+    dq_parallel = DataQualityReport()
+    parallel_fact_sales(read_campaigns(CAMPAIGNS_CSV), workers=2, chunksize=120, dq_report=dq_parallel)
+    for dq_check in (dq_stream, dq_parallel):
+        assert {field: dq_check.to_dict()[field] for field in exact_fields} == \
+            {field: report[field] for field in exact_fields}, "Chunked DQ report differs"
+
+    df_dq = datagen.generate_sales_chunk(0, 50_000, seed=7)
+    df_dq = pd.concat([df_dq, df_dq.sample(1_000, random_state=7)], ignore_index=True).sample(frac=1, random_state=7)
+    df_dq['transaction_date'] = pd.to_datetime(df_dq['transaction_date'])
+    df_dq['total_sales'] = df_dq['quantity'] * df_dq['price_per_unit']
+    df_dq['campaign_name'] = 'No Campaign'
+    df_dq = df_dq[df_dq['transaction_date'].dt.month != 3]
+    exact_duplicates = df_dq['transaction_id'].duplicated().sum()
+    for method in ('hash', 'bloom'):
+        parts = [DataQualityReport(duplicate_method=method, duplicate_capacity=100_000, duplicate_fp_rate=0.01)
+                 .update(df_part, df_part) for df_part in np.array_split(df_dq, 4)]
+        dq_merged = parts[0]
+        for part in parts[1:]:
+            dq_merged.merge(part)
+        merged = dq_merged.to_dict()
+        if method == 'hash':
+            assert merged['duplicate_transaction_id'] == exact_duplicates, "Merged duplicate count differs"
+        else:
+            # Bloom filter: false positives + estimated overlap of merged parts
+            assert abs(merged['duplicate_transaction_id'] - exact_duplicates) <= 0.02 * len(df_dq)
+        threshold_rank = (df_dq['total_sales'] <= merged['total_sales_threshold']).mean()
+        assert 0.98 <= threshold_rank <= 1.0, f"P99 sketch threshold is at rank {threshold_rank:.4f}"
+        exact_outliers = (df_dq['total_sales'] > merged['total_sales_threshold']).sum()
+        assert abs(merged['outliers'] - exact_outliers) <= 0.01 * len(df_dq)
+        for col in ('customer_id', 'product_id', 'region'):
+            assert abs(merged['distinct'][col] - df_dq[col].nunique()) <= max(1, 0.03 * df_dq[col].nunique())
+        assert any(gap.endswith('-03') for gap in merged['month_gaps']), "Month gap not detected"
+    # Bloom filter past its capacity - bigger layers are added, false positives stay below fp_rate
+    from dq import DuplicateDetector
+    unique_ids = pd.Series([f'T{i:07d}' for i in range(200_000)])
+    detector = DuplicateDetector(capacity=5_000, fp_rate=0.01)
+    for ids_part in np.array_split(unique_ids, 8):
+        detector.update(ids_part)
+    assert len(detector.filters) > 1 and detector.duplicates <= 0.01 * len(unique_ids), \
+        f"Bloom filter overfilled: {detector.duplicates} duplicates of unique keys"
+
+    # Test 17: background artifact writer - chunk appends in order, snapshots, backpressure, errors, timings
+    from artifact_writer import ArtifactWriter, background_writes
+    stream_fact_sales(read_campaigns(CAMPAIGNS_CSV), chunksize=37, output_formats=('csv',))
+    df_fact_stream_csv = read_artifact('df_fact', 'csv')
+    recorder = MetricsRecorder('etl')
+    with background_writes(recorder) as writer:
+        df_summary_background = stream_fact_sales(read_campaigns(CAMPAIGNS_CSV), chunksize=37,
+                                                  output_formats=('parquet', 'csv'))
+        writer.flush()
+    pd.testing.assert_frame_equal(df_summary_background, df_summary_stream)
+    df_fact_background = read_artifact('df_fact', 'csv')
+    assert df_fact_background['transaction_id'].tolist() == df_fact_stream_csv['transaction_id'].tolist(), \
+        "Background appends changed order of df_fact chunks"
+    assert [record['artifact'] for record in recorder.artifacts].count('df_fact') == -(-len(df_sales) // 37)
+    assert all(record['write_s'] >= 0 for record in recorder.artifacts)
+
+    def slow_write(df, written):
+        time.sleep(0.05)
+        written.append(df['value'].tolist())
+
+    written = []
+    writer = ArtifactWriter(workers=2, max_pending_mb=1e-6)
+    df_mutable = pd.DataFrame({'value': [1, 2, 3]})
+    for name in ('a', 'b', 'c'):
+        writer.submit(name, slow_write, df_mutable, written)
+        df_mutable['value'] += 10
+    writer.submit('failing', lambda df: 1 / 0, df_mutable)
+    try:
+        writer.close()
+        raise AssertionError("Write error not raised by flush")
+    except ZeroDivisionError:
+        pass
+    assert written == [[1, 2, 3], [11, 12, 13], [21, 22, 23]], "Writer did not take snapshots"
+    assert [record['blocked_s'] > 0 for record in writer.records] == [False, True, True], "No backpressure"
+
+    # Test 18: CLI - no pandas at start, validation only, pipeline with input/output paths
+    import subprocess
+    import sys
+    cli_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, '-c', "import sys, cli; cli.build_parser().parse_args(['etl', 'run']); "
+                    "assert 'pandas' not in sys.modules, 'cli.py imports pandas at start'"], cwd=cli_dir, check=True)
+    import cli
+    validation = cli.main(['--log-level', 'WARNING', 'etl', 'run', '--validate-only'])
+    assert validation['sales_rows'] == len(df_sales) and validation['removed'] == clean_sales(df_sales.copy())[1]
+    tmp_dir = tempfile.mkdtemp()
+    shutil.copy(SALES_CSV, os.path.join(tmp_dir, 'sales.csv'))
+    shutil.copy(CAMPAIGNS_CSV, os.path.join(tmp_dir, 'campaigns.csv'))
+    cli.main(['--log-level', 'WARNING', 'etl', 'run', '--sales', os.path.join(tmp_dir, 'sales.csv'),
+              '--campaigns', os.path.join(tmp_dir, 'campaigns.csv'), '--output-dir', os.path.join(tmp_dir, 'out'),
+              '--formats', 'parquet', 'csv', '--workers', '2', '--dq-method', 'hash'])
+    assert {'df_fact.parquet', 'df_fact.csv', 'bi_sales_summary.parquet', 'etl_metrics.jsonl', 'dq_report.json'} <= \
+        set(os.listdir(os.path.join(tmp_dir, 'out'))), "Outputs not written to --output-dir"
+    with output_directory(os.path.join(tmp_dir, 'out')):
+        pd.testing.assert_frame_equal(read_artifact('bi_sales_summary').reset_index(drop=True),
+                                      df_summary.sort_values(['region', 'transaction_month', 'total_sales'],
+                                                             ascending=[True, True, False]).reset_index(drop=True),
+                                      check_dtype=False)
+        assert len(read_artifact('df_fact', 'csv')) == len(df_fact)
+    with open(os.path.join(tmp_dir, 'out', 'dq_report.json')) as f:
+        assert json.load(f)['duplicate_method'] == 'hash', "DQ settings of CLI not used"
+    # sqlite backend with workers/incremental - error instead of silently running pandas path
+    for mode in (['--workers', '2'], ['--incremental']):
+        try:
+            cli.main(['--log-level', 'WARNING', 'etl', 'run', '--backend', 'sqlite', *mode,
+                      '--output-dir', os.path.join(tmp_dir, 'out_sqlite'), '--metrics', ''])
+            raise AssertionError(f"--backend sqlite accepted with {mode[0]}")
+        except ValueError as error:
+            assert 'sqlite' in str(error)
+    shutil.rmtree(tmp_dir)
+
+    # Test 19: sharded input - shards read concurrently in order, transaction_id repeated across shards removed,
+    # schema error names the shard, manifest skips ingested shards (bid log shards: excel_analysis.run_tests)
+    from shards import read_shards
+    tmp_dir = tempfile.mkdtemp()
+    shard_dir = os.path.join(tmp_dir, 'sales')
+    os.makedirs(shard_dir)
+    df_raw = pd.read_csv(SALES_CSV)
+    days = np.array_split(np.arange(len(df_raw)), 3)
+    df_raw.iloc[days[0]].to_csv(os.path.join(shard_dir, 'sales_2024-01-01.csv'), index=False)
+    df_raw.iloc[days[1]].to_csv(os.path.join(shard_dir, 'sales_2024-01-02.csv'), index=False)
+    # third day delivers again 20 rows of the first day
+    pd.concat([df_raw.iloc[days[0][:20]], df_raw.iloc[days[2]]]).to_csv(
+        os.path.join(shard_dir, 'sales_2024-01-03.csv'), index=False)
+    pd.testing.assert_frame_equal(read_all_sales(shard_dir), read_sales(SALES_CSV))
+
+    recorder = MetricsRecorder('etl')
+    with recorder.stage('parallel') as stage:
+        df_summary_sharded = parallel_fact_sales(read_campaigns(CAMPAIGNS_CSV), workers=2, chunksize=100,
+                                                 sales_csv=os.path.join(shard_dir, 'sales_*.csv'))
+    assert stage['dropped']['shard_duplicates'] == 20, "Rows repeated across shards not counted"
+    pd.testing.assert_frame_equal(df_summary_sharded.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                  df_summary.sort_values(SUMMARY_KEYS).reset_index(drop=True))
+
+    # incremental: two days, then third day (with repeated rows), then nothing new
+    incoming_dir = os.path.join(tmp_dir, 'incoming')
+    state_dir = os.path.join(tmp_dir, 'state')
+    os.makedirs(incoming_dir)
+    with output_directory(os.path.join(tmp_dir, 'out')):
+        for day in ('01', '02', '03'):
+            shutil.copy(os.path.join(shard_dir, f'sales_2024-01-{day}.csv'), incoming_dir)
+            if day != '01':
+                df_summary_incremental = etl_incremental(state_dir, 64, incoming_dir, CAMPAIGNS_CSV)
+        assert not load_etl_state(state_dir)[3].pending(resolve_shards(incoming_dir))
+        df_summary_again = etl_incremental(state_dir, 64, incoming_dir, CAMPAIGNS_CSV)
+        assert len(read_artifact('df_fact')) == len(df_fact), "Sharded incremental df_fact has different rows"
+        assert sorted(os.listdir(state_dir)) == ['bi_sales_summary_3.csv', 'etl_state.json',
+                                                 'marketing_campaigns_3.csv', 'shard_keys_3.npy']
+
+    # run interrupted while state is saved (summary written, shards not) - next run does not count day 3 twice
+    crash_state_dir = os.path.join(tmp_dir, 'crash_state')
+    shutil.rmtree(incoming_dir)
+    os.makedirs(incoming_dir)
+    with output_directory(os.path.join(tmp_dir, 'crash_out')):
+        for day in ('01', '02'):
+            shutil.copy(os.path.join(shard_dir, f'sales_2024-01-{day}.csv'), incoming_dir)
+        etl_incremental(crash_state_dir, 64, incoming_dir, CAMPAIGNS_CSV)
+        shutil.copy(os.path.join(shard_dir, 'sales_2024-01-03.csv'), incoming_dir)
+        save_keys = ShardManifest.save_keys
+        ShardManifest.save_keys = lambda manifest, path: 1 / 0
+        try:
+            etl_incremental(crash_state_dir, 64, incoming_dir, CAMPAIGNS_CSV)
+            raise AssertionError("Interrupted state save not raised")
+        except ZeroDivisionError:
+            pass
+        finally:
+            ShardManifest.save_keys = save_keys
+        df_summary_recovered = etl_incremental(crash_state_dir, 64, incoming_dir, CAMPAIGNS_CSV)
+        assert len(read_artifact('df_fact')) == len(df_fact), "Interrupted run appended day 3 to df_fact twice"
+    for df_check in (df_summary_incremental, df_summary_again, df_summary_recovered):
+        pd.testing.assert_frame_equal(df_check.sort_values(SUMMARY_KEYS).reset_index(drop=True),
+                                      df_summary.sort_values(SUMMARY_KEYS).reset_index(drop=True), check_dtype=False)
+
+    # shard whose rows are all dropped by cleaning - recorded anyway, not read again by next run
+    dropped_dir = os.path.join(tmp_dir, 'dropped')
+    os.makedirs(dropped_dir)
+    df_raw.head(10).assign(price_per_unit=-1.0).to_csv(os.path.join(dropped_dir, 'sales_2024-01-01.csv'), index=False)
+    dropped_state_dir = os.path.join(tmp_dir, 'dropped_state')
+    with output_directory(os.path.join(tmp_dir, 'dropped_out')):
+        assert etl_incremental(dropped_state_dir, 64, dropped_dir, CAMPAIGNS_CSV).empty
+        assert not load_etl_state(dropped_state_dir)[3].pending(resolve_shards(dropped_dir)), "Shard not recorded"
+
+    # seen keys are bounded - keys of the last max_shards shards are found, older blocks are forgotten
+    seen_keys = SeenKeys(max_shards=8)
+    for shard_no in range(40):
+        seen_keys.first_seen(pd.Series([f'T{shard_no}-{i}' for i in range(100)]))
+    assert len(seen_keys.segments) <= 6 and sum(shards for shards, _ in seen_keys.segments) <= 8 + 2
+    repeated = seen_keys.first_seen(pd.Series(['T39-1', 'T32-1', 'T0-1', None]))
+    assert repeated.tolist() == [False, False, True, True]
+    state_keys = ShardManifest(keys=seen_keys)
+    state_keys.save_keys(os.path.join(tmp_dir, 'keys.npy'))
+    loaded = ShardManifest.load({}, os.path.join(tmp_dir, 'keys.npy'), state_keys.key_segments())
+    assert [shards for shards, _ in loaded.keys.segments] == [shards for shards, _ in seen_keys.segments]
+    assert np.array_equal(loaded.keys.hashes, seen_keys.hashes)
+
+    bad_dir = os.path.join(tmp_dir, 'bad')
+    os.makedirs(bad_dir)
+    df_raw.head(10).to_csv(os.path.join(bad_dir, 'a.csv'), index=False)
+    df_raw.head(10).drop(columns='region').to_csv(os.path.join(bad_dir, 'b.csv'), index=False)
+    try:
+        read_all_sales(bad_dir)
+        assert False, "Shard without region column accepted"
+    except ValueError as error:
+        assert 'b.csv' in str(error) and 'region' in str(error)
+
+    # 4 shards read concurrently - every reader waits at the barrier until all 4 run (BrokenBarrierError
+    # after timeout otherwise), yielded in order of paths
+    import threading
+    readers = threading.Barrier(4, timeout=30)
+
+    def read_together(path):
+        readers.wait()
+        return pd.DataFrame({'path': [path]})
+
+    order = [path for path, _ in read_shards(['d1', 'd2', 'd3', 'd4'], read_together, workers=4)]
+    assert order == ['d1', 'd2', 'd3', 'd4'], "Shards not yielded in order of paths"
+    shutil.rmtree(tmp_dir)
+
+    log.info("✅ All tests PASSED!")
     return True
 
 
 if __name__ == "__main__":
+    setup_logging()  # LOG_LEVEL=DEBUG shows also DataFrame dumps
     etl_pipeline()
     run_tests()  # I didn't implement as many as tests I wanted. These are basic ones.
     # I generated more code and test but couldnt finish in time and validate everything
@@ -1,246 +1,614 @@
+"""
+Bid log analysis - answers of the four questions about Data_Analysis_Programmatic_Operations_Manager.xlsx.
+
+Importable, nothing runs on import:
+
+    from excel_analysis import BidLogAnalyzer, load_bidlog, validate_bidlog, drop_duplicate_bids
+    analyzer = BidLogAnalyzer(drop_duplicate_bids(validate_bidlog(load_bidlog(path)), export=False))
+    analyzer.inventory.head(3)          # 1. top inventory sizes
+    analyzer.ssp_rates                  # 2. bid rate per SSP
+    analyzer.ssp_top_size               # 3. most chosen size per SSP
+    analyzer.opportunity_loss           # 4. opportunity loss per size
+
+python excel_analysis.py runs whole analysis like before (main) - logs answers, writes xlsx exports and stage metrics
+(--export-exploded also df_after_separation_via_formats.xlsx, one row per request x available size - debug only).
+"""
+import argparse
+from functools import cached_property
+import logging
+import os
+import numpy as np
 import pandas as pd
 import re
 
+from artifact_writer import background_writes, submit_write
+from cache import cached_frame, rules_version
+from metrics import MetricsRecorder, add_dropped, setup_logging
+from shards import concat_shards, is_sharded, read_shards, resolve_shards
+from sinks import output_directory, output_path
+
+log = logging.getLogger('bidlog')
+METRICS_PATH = 'bidlog_metrics.jsonl'
+BIDLOG_XLSX = os.path.join('xlsx_files', 'Data_Analysis_Programmatic_Operations_Manager.xlsx')
+EXPECTED_COLUMNS = {"ssp_id", "bidlog_status", "bid_adformat", "available_sizes_in_request", "hits"}
+DUPLICATE_KEYS = ["ssp_id", "bidlog_status", "bid_adformat", "available_sizes_in_request", "hits"]
+
+
+# 5. Size dictionary - every distinct size string is parsed and validated only once (helpers)
+def size_dictionary(size_strings):
+    """
+    Distinct size strings -> size_code (row position), size, width, height, is_valid.
+    Valid size is "w x h" (regex explained in BidLogAnalyzer), validated with one vectorized regex on distinct values
+    instead of python callback per row.
+    """
+    sizes = pd.Series(pd.unique(pd.Series(size_strings, dtype=object).dropna()), dtype=object)
+    parts = sizes.str.extract(r"^(\d+)x(\d+)$", flags=re.IGNORECASE)
+    return pd.DataFrame({
+        'size': sizes,
+        'width': pd.to_numeric(parts[0]).astype('Int64'),
+        'height': pd.to_numeric(parts[1]).astype('Int64'),
+        'is_valid': parts[0].notna(),
+    })
+
+
+def split_size_lists(available_sizes):
+    """
+    available_sizes_in_request -> (list_code per row, distinct lists, sizes of every distinct list).
+    Distinct lists are split once, sizes come as Series: index = list_code, value = size string.
+    Empty / 'nan' list has no sizes.
+    """
+    # missing list gets its own code too, so every row has list_code
+    list_codes, size_lists = pd.factorize(available_sizes, use_na_sentinel=False)
+    size_lists = pd.Series(size_lists, dtype=object)
+    not_empty = size_lists.notna() & (size_lists != "") & (size_lists.str.lower() != "nan")
+    list_sizes = size_lists[not_empty].str.split(",").explode().str.strip()
+    return list_codes, size_lists, list_sizes[list_sizes != ""]
+
+
+def size_codes(size_strings, sizes):
+    """Integer size_code of every value (position in size_dictionary), -1 for missing value."""
+    return pd.Index(sizes['size']).get_indexer(size_strings)
+
+
+def is_valid_size(codes, sizes):
+    """Validation of size codes - lookup in size dictionary, -1 (no size) is not valid."""
+    codes = np.asarray(codes)
+    return (codes >= 0) & sizes['is_valid'].to_numpy()[codes]
+
+
+def load_bidlog(path=BIDLOG_XLSX):
+    # 1 load data (shards of bid log can come also as csv)
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_excel(path, sheet_name='Sheet1')
+
+
+def validate_bidlog(df):
+    """
+    2 basic schema validation + 3 data cleaning (empty rows, normalisation of text columns).
+    Raises ValueError when expected column is missing.
+    """
+    missing = EXPECTED_COLUMNS - set(df.columns)
+    log.info('Start data validation')
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+    else:
+        log.info("All expected columns are present.")
+
+    #  -------------------------
+    log.info(f'\nLiczba wierszy w pliku: {len(df)}')
+    # DF has 895 rows
+    #  -------------------------
+    # add col with assign row number to achieve verification of delete empty rows and other operations.
+    df["lp"] = range(1, len(df) + 1)
+    #  -------------------------
+    # detele empty rows in all columns.
+    rows_before = len(df)
+    df = df.dropna(how="all").copy()
+    add_dropped('empty_rows', rows_before - len(df))
+    log.info(f'\nRepeat validation amount of rows after delete empty rows {len(df)}, nothing change, data set had no empty rows')
+    # -------------------------- Section of data exploration --------------------------
+    # next line presents unique values in particular columns to understand data better
+    # (unique() scans whole columns - only when debug dump is on)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('%s', df["ssp_id"].unique())
+        # result > [ 8  5  2  9  6  3  7 10]
+        #  -------------------------
+        log.debug('%s', df["bidlog_status"].unique())
+        # Result ['BID_OK' 'TIMEOUT' 'NO_BID' 'NOT_LEGAL'] same like in spec.
+        #  -------------------------
+        log.debug('list of list of formats/sizes represents all possible format inside request sent to monetise\n%s',
+                  df["bid_adformat"].unique())
+        log.debug('-------------------------')
+        log.debug('available_sizes_in_request\n %s', df["available_sizes_in_request"].unique())
+        log.debug('-------------------------')
+    # Conclusion 1 for solution point 1:
+    # To get information about the most popular sizes, you need to split the rows and count the data for each format separately.
+    # If there was a request with multiple formats, it means you could specify a given format and bid on it, so each one should be counted separately.
+    # -------------------------- End of section data exploration --------------------------
+
+    # -------------------------- Section of data cleaning --------------------------
+    # Normalisation of data - trim spaces and convert to string
+    df["bidlog_status"] = df["bidlog_status"].str.strip()
+    df["bid_adformat"] = df["bid_adformat"].astype(str).str.strip()
+    df["available_sizes_in_request"] = df["available_sizes_in_request"].astype(str).str.strip()
+    # -------------------------- End of section data cleaning --------------------------
+    return df
+
+
+def read_clean_bidlog(path):
+    return validate_bidlog(load_bidlog(path))
+
+
+def load_clean_bidlog(path=BIDLOG_XLSX, cache=True):
+    """
+    Loaded and validated bid log. With cache=True from input cache (cache.py) - openpyxl parses the workbook
+    again only when the file, load_bidlog or validate_bidlog change.
+    path can be directory or glob of bid log shards (load_bidlog_shards).
+    """
+    if is_sharded(path):
+        return load_bidlog_shards(path, cache)
+    if not cache:
+        return read_clean_bidlog(path)
+    return cached_frame(path, read_clean_bidlog, 'bidlog',
+                        rules_version(load_bidlog, validate_bidlog, EXPECTED_COLUMNS))
+
+
+def load_bidlog_shards(source, cache=True, workers=None):
+    """
+    Bid log delivered as many daily/hourly xlsx or csv files - every shard is loaded and validated
+    (missing columns -> ValueError naming the shard) concurrently, from input cache when unchanged.
+    Shards are concatenated in name order and lp is numbered again; same bids repeated across shards
+    are removed by drop_duplicate_bids like inside one file.
+    """
+    paths = resolve_shards(source)
+    log.info(f'Loading {len(paths)} bid log shards of {source}')
+    df = concat_shards([df_shard for _, df_shard in read_shards(paths, lambda p: load_bidlog_shard(p, cache),
+                                                                 workers)])
+    df["lp"] = range(1, len(df) + 1)
+    return df
+
+
+def load_bidlog_shard(path, cache=True):
+    """One shard of load_bidlog_shards - schema error of validate_bidlog is raised again with the shard path."""
+    try:
+        return load_clean_bidlog(path, cache)
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from error
+
+
+def drop_duplicate_bids(df, export=True):
+    """
+    Section Dupplicate check - exactly same rows (DUPLICATE_KEYS) are removed, first one is kept.
+    export=True -> duplicates.xlsx, df_cleaned_from_duplicates.xlsx, df_after_validation.xlsx to check in excel.
+    """
+    # find duplicates with all same values in key columns
+    duplicates = df[df.duplicated(subset=DUPLICATE_KEYS, keep=False)].sort_values(["available_sizes_in_request", "hits"])
+    if export:
+        export_xlsx(duplicates, "duplicates.xlsx")
+
+    log.debug('table duplicates to watch how it looks like\n %s', duplicates)
+    log.info(f"rows  {len(duplicates)}")
+
+    # detele exactly same duplicates (keep first exist )
+    df_cleaned_from_duplicates = df.drop_duplicates(subset=DUPLICATE_KEYS).copy()
+    if export:
+        export_xlsx(df_cleaned_from_duplicates, "df_cleaned_from_duplicates.xlsx")
+    # reasign lp after delete duplicates
+    df_cleaned_from_duplicates["lp"] = range(1, len(df_cleaned_from_duplicates) + 1)
+    add_dropped('duplicates', len(df) - len(df_cleaned_from_duplicates))
+    log.info(f'count rows number after delete duplicates \n {len(df_cleaned_from_duplicates)}')
+    log.info('-------------------------')
+
+    # save df to check in excel after first part validation
+    if export:
+        export_xlsx(df_cleaned_from_duplicates, "df_after_validation.xlsx")
+    return df_cleaned_from_duplicates
+
+
+def export_xlsx(df, path):
+    """xlsx export to check in excel (in output directory) - in background inside main(), snapshot of df is written."""
+    submit_write(path, pd.DataFrame.to_excel, df, output_path(path), index=False)
+
+
+def exploded_requests(df, sizes):
+    """
+    Original df spread vertically by each size inside request (one row per available size, all columns copied).
+    Memory grows with average number of sizes per request - not needed for answers (BidLogAnalyzer.inventory),
+    built only for debug export (main(export_exploded=True)).
+    """
+    list_codes, _, list_sizes = split_size_lists(df["available_sizes_in_request"])
+    # request x size incidence joined to rows - left join keeps row and size order (like explode)
+    incidence = pd.DataFrame({"list_code": list_sizes.index.to_numpy(), "size_code": size_codes(list_sizes, sizes)})
+    row_sizes = pd.DataFrame({"row_pos": np.arange(len(df)), "list_code": list_codes}) \
+        .merge(incidence, on="list_code", how="left")
+    exploded_codes = row_sizes["size_code"].fillna(-1).astype(int).to_numpy()
+    return df.iloc[row_sizes["row_pos"].to_numpy()].assign(
+        available_size=np.where(exploded_codes >= 0, sizes["size"].to_numpy()[exploded_codes], np.nan))
+
+
+def reference_answers(df):
+    """
+    Reference answers (explode + row-wise apply + groupby) - old way of the original script.
+    Requests are exploded into one row per size and every size string is checked by python callback,
+    kept only to compare BidLogAnalyzer results in run_tests (same columns, without size_code).
+    """
+    size_pattern = re.compile(r"^\d+x\d+$", re.IGNORECASE)
+
+    def is_size(s):
+        return bool(size_pattern.match(s))
+
+    def split_sizes(s):
+        if pd.isna(s) or s == "" or s.lower() == "nan":
+            return []
+        return [x.strip() for x in str(s).split(",") if x.strip()]
+
+    requests_exploded = (
+        df
+        .assign(size_list=df["available_sizes_in_request"].apply(split_sizes))
+        .explode("size_list")
+        .rename(columns={"size_list": "available_size"})
+    )
+    # request with empty size list explodes to NaN - not a size
+    requests_exploded = requests_exploded[requests_exploded["available_size"].apply(
+        lambda size: isinstance(size, str) and is_size(size))]
+    inventory = (
+        requests_exploded
+        .groupby("available_size", as_index=False)["hits"]
+        .sum()
+        .sort_values("hits", ascending=False)
+    )
+
+    ssp_total = df.groupby("ssp_id", as_index=False)["hits"].sum().rename(columns={"hits": "hits_total"})
+    ssp_bidok = (
+        df[df["bidlog_status"] == "BID_OK"]
+        .groupby("ssp_id", as_index=False)["hits"]
+        .sum()
+        .rename(columns={"hits": "hits_bid_ok"})
+    )
+    ssp_rates = ssp_total.merge(ssp_bidok, on="ssp_id", how="left").fillna({"hits_bid_ok": 0})
+    ssp_rates["bid_rate"] = ssp_rates["hits_bid_ok"] / ssp_rates["hits_total"]
+
+    chosen = df[df["bidlog_status"].isin(["BID_OK", "TIMEOUT"])].copy()
+    chosen = chosen[chosen["bid_adformat"].apply(is_size)]
+    ssp_size_hits = (
+        chosen
+        .groupby(["ssp_id", "bid_adformat"], as_index=False)["hits"]
+        .sum()
+        .rename(columns={"bid_adformat": "chosen_size", "hits": "hits_chosen"})
+    )
+    ssp_top_size = (
+        ssp_size_hits
+        .sort_values(["ssp_id", "hits_chosen"], ascending=[True, False])
+        .groupby("ssp_id", as_index=False)
+        .head(1)
+    )
+
+    inventory_size = inventory.rename(columns={"available_size": "ad_size", "hits": "hits_inventory"})
+    wins_size = (
+        df[(df["bidlog_status"] == "BID_OK") & df["bid_adformat"].apply(is_size)]
+        .groupby("bid_adformat", as_index=False)["hits"]
+        .sum()
+        .rename(columns={"bid_adformat": "ad_size", "hits": "hits_won"})
+    )
+    df_joined = inventory_size.merge(wins_size, on="ad_size", how="left").fillna({"hits_won": 0})
+    df_joined["opportunity_loss"] = (df_joined["hits_inventory"] - df_joined["hits_won"]).clip(lower=0)
+    df_joined["opportunity_loss_perc"] = ((df_joined["hits_inventory"] - df_joined["hits_won"])
+                                          / df_joined["hits_inventory"] * 100).clip(lower=0)
+    return {'inventory': inventory, 'ssp_rates': ssp_rates, 'ssp_top_size': ssp_top_size,
+            'opportunity_loss': df_joined}
+
+
+class BidLogAnalyzer:
+    """
+    Aggregation engine of cleaned bid log (after validate_bidlog + drop_duplicate_bids).
+
+    One pass over the data builds two small tables:
+    - bids: groupby ssp_id x bidlog_status x bid size code -> hits, rows
+    - requests: hits and rows per distinct available_sizes_in_request (size multiplicity table),
+      with sparse incidence distinct list x size in CSR form: sizes of list k are
+      size_index[size_indptr[k]:size_indptr[k + 1]]
+    Requests are never exploded into one row per size - per size hits are incidence^T x list hits.
+    All answers (inventory, bid rates, chosen sizes, wins, opportunity loss) are derived from them,
+    so their cost depends on number of distinct combinations, not on bid log rows.
+
+    Valid size: regex ^\\d+x\\d+$ ("number x number", x in any case) - ^ start of string, \\d+ one or more digits,
+    x exactly letter "x", $ end of string. Checked once per distinct string (size_dictionary),
+    rows carry integer size codes.
+    """
+    CHOSEN_STATUSES = ("BID_OK", "TIMEOUT")
+
+    def __init__(self, df, weights=None):
+        """weights - bid log rows behind every row of df (pre-aggregated counters of live_bidlog.py), default 1."""
+        list_codes, _, list_sizes = split_size_lists(df["available_sizes_in_request"])
+        self.sizes = size_dictionary(pd.concat([list_sizes, df["bid_adformat"]]))
+        # list_sizes are ordered by list_code, so they are directly CSR indices
+        self.size_index = size_codes(list_sizes, self.sizes)
+        list_lengths = np.bincount(list_sizes.index.to_numpy(dtype=int), minlength=list_codes.max(initial=-1) + 1)
+        self.size_indptr = np.concatenate([[0], np.cumsum(list_lengths)])
+        bid_codes = pd.Series(size_codes(df["bid_adformat"], self.sizes), index=df.index, name="size_code")
+        counts = pd.DataFrame({"hits": df["hits"], "rows": 1 if weights is None else np.asarray(weights)},
+                              index=df.index)
+        # rows with NaN status still count into SSP totals - keep NaN keys
+        self.bids = counts.groupby([df["ssp_id"], df["bidlog_status"], bid_codes], dropna=False) \
+            .agg(hits=("hits", "sum"), rows=("rows", "sum")).reset_index()
+        self.requests = counts.groupby(pd.Series(list_codes, index=df.index, name="list_code")) \
+            .agg(hits=("hits", "sum"), rows=("rows", "sum"))
+        self.rows = int(counts["rows"].sum())
+
+    def size_names(self, codes):
+        return self.sizes["size"].to_numpy()[np.asarray(codes)]
+
+    def per_size(self, list_values):
+        """Sum of per distinct list values for every size code (sparse incidence^T x vector)."""
+        weights = np.repeat(np.asarray(list_values, dtype=float), np.diff(self.size_indptr))
+        return np.bincount(self.size_index, weights=weights, minlength=len(self.sizes))
+
+    @cached_property
+    def exploded_rows(self):
+        """Rows which exploded requests would have (request with empty size list stays as one row)."""
+        return int((self.requests["rows"].to_numpy() * np.maximum(np.diff(self.size_indptr), 1)).sum())
+
+    @cached_property
+    def request_sizes(self):
+        """All sizes inside requests (first appearance order), valid or not."""
+        return self.size_names(np.unique(self.size_index))
+
+    @cached_property
+    def inventory(self):
+        """
+        Question 1 - all possible hits per available size (size_code, available_size, hits), sorted by hits.
+        Every size of multi-size request gets hits of the request - sum of distinct list hits per size.
+        """
+        in_requests = np.bincount(self.size_index, minlength=len(self.sizes)) > 0
+        valid = in_requests & self.sizes["is_valid"].to_numpy()
+        # rows of exploded requests without valid size (also requests with empty size list)
+        size_rows = self.per_size(self.requests["rows"])
+        without_sizes = np.diff(self.size_indptr) == 0
+        add_dropped('invalid_available_size',
+                    size_rows[in_requests & ~valid].sum() + self.requests["rows"].to_numpy()[without_sizes].sum())
+        size_code = np.flatnonzero(valid)
+        return (
+            pd.DataFrame({"size_code": size_code, "hits": self.per_size(self.requests["hits"])[size_code]})
+            .assign(available_size=lambda d: self.size_names(d["size_code"]))
+            .sort_values("available_size")
+            .reset_index(drop=True)
+            [["size_code", "available_size", "hits"]]
+            .sort_values("hits", ascending=False)
+        )
+
+    @cached_property
+    def ssp_rates(self):
+        """Question 2 - bid rate per SSP = hits with BID_OK / all hits (all possible requests to buy)."""
+        # total auctions per SSP (weighted by hits)
+        ssp_total = self.bids.groupby("ssp_id", as_index=False)["hits"].sum().rename(columns={"hits": "hits_total"})
+        # successful bids per SSP
+        ssp_bidok = (
+            self.bids[self.bids["bidlog_status"] == "BID_OK"]
+            .groupby("ssp_id", as_index=False)["hits"]
+            .sum()
+            .rename(columns={"hits": "hits_bid_ok"})
+        )
+        # merge to connect bids ok won with all possible requests to buy
+        ssp_rates = ssp_total.merge(ssp_bidok, on="ssp_id", how="left").fillna({"hits_bid_ok": 0})
+        ssp_rates["bid_rate"] = ssp_rates["hits_bid_ok"] / ssp_rates["hits_total"]
+        return ssp_rates
+
+    @cached_property
+    def ssp_size_hits(self):
+        """Question 3 (all) - hits per SSP and size chosen by SSP (status BID_OK or TIMEOUT, valid size)."""
+        chosen = self.bids[self.bids["bidlog_status"].isin(self.CHOSEN_STATUSES)]
+        # filter out rows with 'n/a' / empty bid_adformat, acceptable size is "WxH"
+        valid = is_valid_size(chosen["size_code"], self.sizes)
+        add_dropped('not_chosen_status', self.rows - chosen["rows"].sum())
+        add_dropped('invalid_bid_adformat', chosen.loc[~valid, "rows"].sum())
+        return (
+            chosen[valid]
+            .groupby(["ssp_id", "size_code"], as_index=False)["hits"]
+            .sum()
+            .assign(chosen_size=lambda d: self.size_names(d["size_code"]))
+            .sort_values(["ssp_id", "chosen_size"])
+            .reset_index(drop=True)
+            [["ssp_id", "chosen_size", "hits"]]
+            .rename(columns={"hits": "hits_chosen"})
+        )
+
+    @cached_property
+    def ssp_top_size(self):
+        """Question 3 - TOP 1 size per SSP, i.e. most chosen size of every SSP."""
+        return (
+            self.ssp_size_hits
+            .sort_values(["ssp_id", "hits_chosen"], ascending=[True, False])
+            .groupby("ssp_id", as_index=False)
+            .head(1)
+        )
+
+    @cached_property
+    def wins_size(self):
+        """Wins per size (where DSP actually bid with that size and status is BID_OK)."""
+        won = self.bids[(self.bids["bidlog_status"] == "BID_OK") & is_valid_size(self.bids["size_code"], self.sizes)]
+        return won.groupby("size_code", as_index=False)["hits"].sum().rename(columns={"hits": "hits_won"})
+
+    @cached_property
+    def opportunity_loss(self):
+        """Question 4 - inventory per size which was not won: opportunity_loss (hits) and opportunity_loss_perc."""
+        inventory_size = self.inventory.rename(columns={"available_size": "ad_size", "hits": "hits_inventory"})
+        # join data to calculate opportunity loss per size
+        df_joined = inventory_size.merge(self.wins_size, on="size_code", how="left").fillna({"hits_won": 0})
+        df_joined["opportunity_loss"] = (df_joined["hits_inventory"] - df_joined["hits_won"]).clip(lower=0)
+        df_joined["opportunity_loss_perc"] = ((df_joined["hits_inventory"] - df_joined["hits_won"])
+                                              / df_joined["hits_inventory"] * 100).clip(lower=0)
+        return df_joined
+
+
+def validate_only(path=BIDLOG_XLSX, cache=True):
+    """
+    Only load + schema validation of the bid log (fast with input cache hit), nothing is written.
+    Returns short summary, raises ValueError when expected column is missing.
+    """
+    df = load_clean_bidlog(path, cache)
+    return {'path': path, 'rows': len(df), 'columns': list(df.columns),
+            'duplicates': int(df.duplicated(subset=DUPLICATE_KEYS).sum())}
+
+
+def main(path=BIDLOG_XLSX, metrics_path=METRICS_PATH, export_exploded=False, cache=True, write_in_background=True,
+         output_dir=None):
+    """
+    Whole analysis like the original script - every block is one measured stage (see metrics.py).
+    export_exploded=True -> also df_after_separation_via_formats.xlsx (requests exploded per size, debug only).
+    cache=False -> workbook parsed and validated again even if it did not change.
+    write_in_background=False -> xlsx exports written inline (artifact_writer.py), blocking every stage.
+    output_dir -> directory of xlsx exports and metrics (None = current directory).
+    """
+    with output_directory(output_dir):
+        return run_analysis(path, metrics_path, export_exploded, cache, write_in_background)
+
+
+def run_analysis(path, metrics_path, export_exploded, cache, write_in_background):
+    """Stages of main() inside its output directory."""
+    recorder = MetricsRecorder('bidlog')
+
+    # xlsx exports are written in background while next questions are computed
+    with background_writes(recorder, enabled=write_in_background) as writer:
+        # load + validation (skipped when validated bid log comes from input cache)
+        with recorder.stage('load') as stage:
+            df = load_clean_bidlog(path, cache)
+            stage['rows_out'] = len(df)
+
+        with recorder.stage('deduplication', rows_in=len(df)) as stage:
+            df = drop_duplicate_bids(df)
+            stage['rows_out'] = len(df)
+
+        # one pass over bid log, answers below use only small aggregates
+        with recorder.stage('aggregation', rows_in=len(df)) as stage:
+            analyzer = BidLogAnalyzer(df)
+            stage['rows_out'] = len(analyzer.bids) + len(analyzer.requests)
+
+        with recorder.stage('question_1', rows_in=len(df)) as stage:
+            log.info(f'additional check how number of rows changed.  {analyzer.exploded_rows}')
+            log.info('-------------------------')
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('it shows all possible sizes inside request sent to monetise: \n %s', analyzer.request_sizes)
+                log.debug('-------------------------')
+            if export_exploded:
+                # save with seperated sizes to check in excel - copies all columns per size, only for debugging
+                requests_exploded = exploded_requests(df, analyzer.sizes)
+                log.debug('new requests_exploded df represent original df spread vertically by each size inside '
+                          'request to allow achieve answer to question number 1 \n %s', requests_exploded)
+                export_xlsx(requests_exploded, "df_after_separation_via_formats.xlsx")
+                del requests_exploded
+            inventory = analyzer.inventory
+            log.info('grouped data per avialable size to answer question 1')
+            log.debug('data frame with groped data per available size and summed hits %s \n', inventory)
+            log.debug('-------------------------')
+            # ------------------------- response question 1 -------------------------
+            log.info('# ------------------------- response question 1 -------------------------')
+            log.info('Answer 1: top 3 inventory formats: \n %s', inventory.head(3).drop(columns="size_code"))
+            log.info('-------------------------')
+            stage['rows_out'] = len(inventory)
+
+        with recorder.stage('question_2', rows_in=len(df)) as stage:
+            ssp_rates = analyzer.ssp_rates
+            log.debug('ssp rates - all possible request to buy, bids with status ok and bid rate: \n %s', ssp_rates)
+            # ------------------------- Response question 2 -------------------------
+            log.info('# ------------------------- response question 2 -------------------------')
+            log.info("Highest bid rate:\n %s", ssp_rates.sort_values("bid_rate", ascending=False).head(1))
+            log.info("Lowest bid rate:\n %s", ssp_rates.sort_values("bid_rate", ascending=True).head(1))
+            stage['rows_out'] = len(ssp_rates)
+
+        with recorder.stage('question_3', rows_in=len(df)) as stage:
+            ssp_size_hits = analyzer.ssp_size_hits
+            log.debug('--------------------------')
+            log.debug('all possible volumen per size per SSP to buy\n %s', ssp_size_hits)
+            log.debug('--------------------------')
+            export_xlsx(ssp_size_hits, "df_total_amount_bid_per_SSP_per_Size.xlsx")
+            # ------------------------- Response question 3 -------------------------
+            log.info(' ------------------------- Response question 3 -------------------------')
+            log.info('TOP 1 from all possible volumen per SSP per size to buy MEANS most choosen size per SSP\n %s',
+                     analyzer.ssp_top_size)
+            log.info('--------------------------')
+            export_xlsx(analyzer.ssp_top_size, "df_total_amount_bid_per_SSP_per_Size_winning_sizes_top_1.xlsx")
+            stage['rows_out'] = len(analyzer.ssp_top_size)
+
+        with recorder.stage('question_4', rows_in=len(df)) as stage:
+            log.debug('Wins per size (where DSP actually bid with that size and status is BID_OK)\n %s',
+                      analyzer.wins_size.head(20))
+            log.info('------------------------- Response question 4 -------------------------')
+            df_joined = analyzer.opportunity_loss.drop(columns="size_code")
+            # get top 3 sizes with highest opportunity loss
+            log.info('top3 opportunity loss \n %s', df_joined.sort_values("opportunity_loss", ascending=False).head(3))
+            log.info('top3 opportunity loss perc \n %s',
+                     df_joined.sort_values("opportunity_loss_perc", ascending=False).head(3))
+            log.info('--------------------------')
+            stage['rows_out'] = len(df_joined)
+
+        if writer is not None:
+            with recorder.stage('artifact_flush'):
+                writer.flush()
+
+    if metrics_path:
+        recorder.write(output_path(metrics_path))
+        log.info(f'📈 Stage metrics: {output_path(metrics_path)}')
+    return analyzer
+
+
+def run_tests():
+    """
+    Verification tests of bid log analysis (python cli.py bidlog test) - generated bid logs in temp directory,
+    sample workbook (BIDLOG_XLSX of current directory) for the reference answers.
+    """
+    import shutil
+    import tempfile
+
+    import datagen
+
+    # Test 1: bid log shards (xlsx + csv, rows repeated across shards) == one file
+    tmp_dir = tempfile.mkdtemp()
+    bidlog_csv, _ = datagen.generate_bidlog(tmp_dir, 3_000, seed=7, xlsx=False)
+    df_bidlog = pd.read_csv(bidlog_csv)
+    bidlog_dir = os.path.join(tmp_dir, 'bidlog')
+    os.makedirs(bidlog_dir)
+    df_bidlog.iloc[:1_500].to_excel(os.path.join(bidlog_dir, 'bidlog_01.xlsx'), sheet_name='Sheet1', index=False)
+    pd.concat([df_bidlog.iloc[1_500:], df_bidlog.iloc[:100]]).to_csv(os.path.join(bidlog_dir, 'bidlog_02.csv'),
+                                                                      index=False)
+    analyzers = [BidLogAnalyzer(drop_duplicate_bids(load_clean_bidlog(path, cache=False), export=False))
+                 for path in (bidlog_csv, bidlog_dir)]
+    for answer in ('inventory', 'ssp_rates', 'ssp_top_size', 'opportunity_loss'):
+        pd.testing.assert_frame_equal(getattr(analyzers[1], answer), getattr(analyzers[0], answer))
+    # shard without hits column - error names the shard
+    df_bidlog.iloc[:10].drop(columns='hits').to_csv(os.path.join(bidlog_dir, 'bidlog_03.csv'), index=False)
+    try:
+        load_clean_bidlog(bidlog_dir, cache=False)
+        raise AssertionError("Shard without hits column accepted")
+    except ValueError as error:
+        assert 'bidlog_03.csv' in str(error) and 'hits' in str(error)
+
+    # Test 2: BidLogAnalyzer (size dictionary, CSR incidence) == explode/apply/groupby of the original script -
+    # sample workbook and generated bid log with NaN hits, missing formats and multi-size requests
+    generated_csv, _ = datagen.generate_bidlog(tmp_dir, 20_000, seed=3, xlsx=False)
+    for path in (BIDLOG_XLSX, generated_csv):
+        df = drop_duplicate_bids(load_clean_bidlog(path, cache=False), export=False)
+        if path == generated_csv:
+            assert df['hits'].isna().any() and df['available_sizes_in_request'].str.contains(',').any()
+        analyzer = BidLogAnalyzer(df)
+        for answer, df_reference in reference_answers(df).items():
+            pd.testing.assert_frame_equal(getattr(analyzer, answer).drop(columns='size_code', errors="ignore"),
+                                          df_reference)
+    shutil.rmtree(tmp_dir)
 
+    log.info("✅ Bid log tests PASSED!")
+    return True
 
-def is_size(s: str) -> bool:
-    return bool(size_pattern.match(s))
-
-# 5. Expand available_sizes_in_request into exploded table (helper)
-def split_sizes(s):
-    if pd.isna(s) or s == "" or s.lower() == "nan":
-        return []
-    return [x.strip() for x in str(s).split(",") if x.strip()]
-
-
-# 1 load data
-df = pd.read_excel('xlsx_files\Data_Analysis_Programmatic_Operations_Manager.xlsx', sheet_name='Sheet1')
-
-# 2 basic schema validation
-expected_cols = {"ssp_id", "bidlog_status", "bid_adformat", "available_sizes_in_request", "hits"}
-missing = expected_cols - set(df.columns)
-print('Start data validation')
-if missing:
-    raise ValueError(f"Missing columns: {missing}")
-else:
-    print("All expected columns are present.")
-
-#  -------------------------
-print(f'\nLiczba wierszy w pliku: {len(df)}')
-# DF has 895 rows
-#  -------------------------
-# add col with assign row number to achieve verification of delete empty rows and other operations.
-df["lp"] = range(1, len(df) + 1)
-#  -------------------------
-# detele empty rows in all columns.
-df = df.dropna(how="all").copy()
-print(f'\nRepeat validation amount of rows after delete empty rows {len(df)}, nothing change, data set had no empty rows')
-# -------------------------- Section of data exploration --------------------------
-# next line presents unique values in particular columns to understand data better
-print(df["ssp_id"].unique())
-# result > [ 8  5  2  9  6  3  7 10]
-#  -------------------------
-print(df["bidlog_status"].unique())
-# Result ['BID_OK' 'TIMEOUT' 'NO_BID' 'NOT_LEGAL'] same like in spec.
-#  -------------------------
-print('list of list of formats/sizes represents all possible format inside request sent to monetise')
-print(df["bid_adformat"].unique())
-print('-------------------------')
-print('available_sizes_in_request\n', df["available_sizes_in_request"].unique())
-print('-------------------------')
-# Conclusion 1 for solution point 1:
-# To get information about the most popular sizes, you need to split the rows and count the data for each format separately.
-# If there was a request with multiple formats, it means you could specify a given format and bid on it, so each one should be counted separately.
-# -------------------------- End of section data exploration --------------------------
-
-# -------------------------- Section of data cleaning --------------------------
-# Normalisation of data - trim spaces and convert to string
-df["bidlog_status"] = df["bidlog_status"].str.strip()
-df["bid_adformat"] = df["bid_adformat"].astype(str).str.strip()
-df["available_sizes_in_request"] = df["available_sizes_in_request"].astype(str).str.strip()
-# -------------------------- End of section data cleaning --------------------------
-
-#  ------------------------- Section Dupplicate check --------------------------
-# find duplicates with all same values in key columns
-duplicates = df[
-    df.duplicated(subset=["ssp_id", "bidlog_status", "bid_adformat", "available_sizes_in_request", "hits"], keep=False)
-].sort_values(["available_sizes_in_request", "hits"])
-duplicates.to_excel("duplicates.xlsx", index=False)
-
-print('table duplicates to watch how it looks like\n', duplicates)
-print(f"rows  {len(duplicates)}")
-
-# detele exactly same duplicates (keep first exist )
-df_cleaned_from_duplicates = df.drop_duplicates(subset=["ssp_id", "bidlog_status", "bid_adformat", "available_sizes_in_request", "hits"])
-df_cleaned_from_duplicates.to_excel("df_cleaned_from_duplicates.xlsx", index=False)
-# reasign lp after delete duplicates
-df_cleaned_from_duplicates["lp"] = range(1, len(df_cleaned_from_duplicates) + 1)
-df = df_cleaned_from_duplicates
-print('count rows number after delete duplicates \n', len(df))
-print('-------------------------')
-# -------------------------- End of section Dupplicate check -------------------
-#  ------------------------- Section Nan check --------------------------
-
-
-# --------------------------
-# save df to check in excel after first part validation
-df.to_excel("df_after_validation.xlsx", index=False)
-#  -------------------------
-
-# -------------------------- Section df manipulation and cleaning --------------------------
-# 4. Flag valid ad size pattern (w x h) or 'n/a'
-
-# explenation regex pattern code
-# Creates regex pattern ^\d+x\d+$ which checks if string has "number x number" format:
-# ^ - start of string
-# \d+ - one or more digits
-# x - exactly letter "x"
-# \d+ - one or more digits
-# $ - end of string
-# re.IGNORECASE - ignores case (uppercase/lowercase)
-size_pattern = re.compile(r"^\d+x\d+$", re.IGNORECASE)
-
-requests_exploded = (
-    df
-    .assign(size_list=df["available_sizes_in_request"].apply(split_sizes))
-    .explode("size_list")
-    .rename(columns={"size_list": "available_size"})
-)
-print('new requests_exploded df represent original df spread vertically by each size inside request to allow '
-      'achieve answer to question number 1'
-      ' \n', requests_exploded)
-print('-------------------------')
-# -------------------------- End of section df manipulation and cleaning --------------------------
-#  -------------------------
-print('additional check how number of rows changed. ', len(requests_exploded))
-print('-------------------------')
-#  -------------------------
-print('it shows all possible sizes inside request sent to monetise: \n', requests_exploded["available_size"].unique())
-print('-------------------------')
-#  -------------------------
-# save with seperated sizes to check in excel
-requests_exploded.to_excel("df_after_separation_via_formats.xlsx", index=False)
-#  -------------------------
-# keep only validated sizes; ignore 'n/a' etc.
-requests_exploded = requests_exploded[requests_exploded["available_size"].apply(is_size)]
-print('grouped data per avialable size to answer question 1')
-inventory = (
-    requests_exploded
-    .groupby("available_size", as_index=False)["hits"]
-    .sum()
-    .sort_values("hits", ascending=False)
-)
-print('data frame with groped data per available size and summed hits', inventory, '\n')
-print('-------------------------')
-# ------------------------- response question 1 -------------------------
-print('# ------------------------- response question 1 -------------------------')
-top3_inventory = inventory.head(3)
-print('Answer 1: top 3 inventory formats: \n', top3_inventory)
-print('-------------------------')
-# ------------------------- end of response question 1 -------------------------
-
-# total auctions per SSP (weighted by hits)
-ssp_total = df.groupby("ssp_id", as_index=False)["hits"].sum().rename(columns={"hits": "hits_total"})
-print('ssp total means all possible request to buy: \n', ssp_total)
-df.groupby("ssp_id", as_index=False)["hits"].sum().rename(columns={"hits": "hits_total"})
-
-# successful bids per SSP
-ssp_bidok = (
-    df[df["bidlog_status"] == "BID_OK"]
-    .groupby("ssp_id", as_index=False)["hits"]
-    .sum()
-    .rename(columns={"hits": "hits_bid_ok"})
-)
-print('df grouped per ssp with bids status ok:\n', ssp_bidok)
-# -------------------------
-# merge to connect bids ok won with all possible requests to buy
-ssp_rates = (
-    ssp_total
-    .merge(ssp_bidok, on="ssp_id", how="left")
-    .fillna({"hits_bid_ok": 0})
-)
-# calculate bid rate
-ssp_rates["bid_rate"] = ssp_rates["hits_bid_ok"] / ssp_rates["hits_total"]
-# prepare highest and lowest bid rate ssps
-ssp_highest = ssp_rates.sort_values("bid_rate", ascending=False).head(1)
-ssp_lowest = ssp_rates.sort_values("bid_rate", ascending=True).head(1)
-
-# ------------------------- Response question 2 -------------------------
-print('# ------------------------- response question 2 -------------------------')
-print("Highest bid rate:\n", ssp_highest)
-print("Lowest bid rate:\n", ssp_lowest)
-# ------------------------- end of response question 2 -------------------------
-
-# Filter > SSP chosen sizes (bid status BID_OK or TIMEOUT)
-chosen = (
-    df[df["bidlog_status"].isin(["BID_OK", "TIMEOUT"])]
-    .copy()
-)
-
-# filter out rows with 'n/a' / empty bid_adformat, acceptable size is "WxH"
-chosen = chosen[chosen["bid_adformat"].apply(is_size)]
-
-# grouping: which size SSP most often CHOOSES
-ssp_size_hits = (
-    chosen
-    .groupby(["ssp_id", "bid_adformat"], as_index=False)["hits"]
-    .sum()
-    .rename(columns={"bid_adformat": "chosen_size", "hits": "hits_chosen"})
-)
-print('--------------------------')
-print('all possible volumen per size per SSP to buy\n', ssp_size_hits)
-print('--------------------------')
-# df_total_amount_bid_per_SSP_per_Size
-ssp_size_hits.to_excel("df_total_amount_bid_per_SSP_per_Size.xlsx", index=False)
-
-# ------------------------- Response question 3 -------------------------
-print(' ------------------------- Response question 3 -------------------------')
-# Top format per SSP
-ssp_top_size = (
-    ssp_size_hits
-    .sort_values(["ssp_id", "hits_chosen"], ascending=[True, False])
-    .groupby("ssp_id", as_index=False)
-    .head(1)
-)
-
-print('TOP 1 from all possible volumen per SSP per size to buy MEANS most choosen size per SSP\n', ssp_top_size)
-print('--------------------------')
-# df_total_amount_bid_per_SSP_per_Size_winning_sizes_top_1
-ssp_top_size.to_excel("df_total_amount_bid_per_SSP_per_Size_winning_sizes_top_1.xlsx", index=False)
-# ------------------------- End response question 3 -------------------------
-inventory_size = (
-    inventory
-    .rename(columns={"available_size": "ad_size", "hits": "hits_inventory"})
-)
-print('all possible requests per ad_size (capacity per size)\n', inventory_size.head())
-print('--------------------------')
-# --------------------------
-# Wins per size (where DSP actually bid with that size and status is BID_OK)
-wins_size = (
-    df[(df["bidlog_status"] == "BID_OK") & df["bid_adformat"].apply(is_size)]
-    .groupby("bid_adformat", as_index=False)["hits"]
-    .sum()
-    .rename(columns={"bid_adformat": "ad_size", "hits": "hits_won"})
-)
-print('Wins per size (where DSP actually bid with that size and status is BID_OK)\n', wins_size.head(20))
-print('------------------------- Response question 4 -------------------------')
-# join data to calculate opportunity loss per size
-df_joined = (
-    inventory_size
-    .merge(wins_size, on="ad_size", how="left")
-    .fillna({"hits_won": 0})
-)
-# calculate opportunity loss
-df_joined["opportunity_loss"] = (df_joined["hits_inventory"] - df_joined["hits_won"]).clip(lower=0)
-#calculate opportunity loss percentage
-df_joined["opportunity_loss_perc"] = ((df_joined["hits_inventory"] - df_joined["hits_won"])/df_joined["hits_inventory"] * 100).clip(lower=0)
-# get top 3 sizes with highest opportunity loss
-top3_opp_loss = df_joined.sort_values("opportunity_loss", ascending=False).head(3)
-print('top3 opportunity loss \n', top3_opp_loss)
-top3_opp_loss_perc = df_joined.sort_values("opportunity_loss_perc", ascending=False).head(3)
-print('top3 opportunity loss perc \n', top3_opp_loss_perc)
-
-print('--------------------------')
-# ------------------------- End response question 4 -------------------------
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bid log analysis (questions 1-4)')
+    parser.add_argument('--path', default=BIDLOG_XLSX)
+    parser.add_argument('--metrics', default=METRICS_PATH, help='*.jsonl or *.prom, empty string = off')
+    parser.add_argument('--export-exploded', action='store_true',
+                        help='write df_after_separation_via_formats.xlsx (one row per request x size)')
+    parser.add_argument('--no-cache', action='store_true', help='parse workbook again, do not use input cache')
+    parser.add_argument('--no-background-writes', action='store_true', help='write xlsx exports inline')
+    args = parser.parse_args()
 
+    setup_logging()  # LOG_LEVEL=DEBUG shows also intermediate data frames
+    main(args.path, args.metrics, args.export_exploded, not args.no_cache, not args.no_background_writes)
@@ -0,0 +1,175 @@
+"""
+Run instrumentation - per stage wall time, CPU time, peak memory, rows in/out and dropped rows per filter.
+
+    recorder = MetricsRecorder('etl')
+    with recorder.stage('transform', rows_in=len(df_sales)) as stage:
+        df_fact = transform_fact_sales(df_sales, df_campaigns)   # filters call add_dropped(...)
+        stage['rows_out'] = len(df_fact)
+    recorder.write('etl_metrics.jsonl')   # JSON lines, or .prom -> Prometheus textfile format
+    (also per artifact write timings of artifact_writer.py - recorder.artifacts)
+
+Logging is leveled (setup_logging): INFO = progress, DEBUG = DataFrame dumps, which are
+formatted lazily ('%s') - with INFO level their repr is never built.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger('metrics')
+
+# stage record which is active now - add_dropped() called deep inside ETL functions lands there
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+
+def setup_logging(level=None):
+    """Plain message logging for scripts, level from argument or LOG_LEVEL env (default INFO)."""
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    logging.basicConfig(format='%(message)s', level=level.upper() if isinstance(level, str) else level)
+
+
+def current_rss_mb():
+    """Resident memory of this process (linux /proc), elsewhere peak RSS from resource/psutil."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        import resource
+        # ru_maxrss is KB on linux, bytes on macOS
+        scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+class PeakMemory:
+    """Context manager - samples RSS in background thread, peak_mb = max RSS seen inside the block."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def add_dropped(filter_name, count):
+    """Count rows dropped by a filter in the active stage (no-op outside of any stage)."""
+    record = _current_stage.get()
+    if record is not None:
+        record['dropped'][filter_name] = record['dropped'].get(filter_name, 0) + int(count)
+
+
+class MetricsRecorder:
+    """Collects stage records of one run (ETL pipeline or bid log analysis)."""
+
+    def __init__(self, run_name):
+        self.run_name = run_name
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        self.records = []
+        # per artifact write timings (artifact_writer.py)
+        self.artifacts = []
+
+    def add_artifact(self, record):
+        """Timing of one artifact write - rows, snapshot MB, seconds blocked/queued/writing."""
+        self.artifacts.append({'run': self.run_name, 'run_id': self.run_id, **record})
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """with recorder.stage('load', rows_in=n) as record: ... record['rows_out'] = m"""
+        record = {
+            'run': self.run_name,
+            'run_id': self.run_id,
+            'stage': name,
+            'rows_in': rows_in,
+            'rows_out': None,
+            'dropped': {},
+        }
+        token = _current_stage.set(record)
+        memory = PeakMemory()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            with memory:
+                yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+            record['peak_rss_mb'] = round(memory.peak_mb, 1)
+            _current_stage.reset(token)
+            self.records.append(record)
+            log.debug(f"⏱️ {record['stage']}: {record['wall_s']:.3f}s wall, {record['cpu_s']:.3f}s CPU, "
+                      f"peak RSS {record['peak_rss_mb']:.0f} MB, rows {record['rows_in']} -> {record['rows_out']}, "
+                      f"dropped {record['dropped']}")
+
+    def write(self, path):
+        """.prom -> Prometheus textfile (replaced), anything else -> JSON lines (appended, keeps history)."""
+        if path.endswith('.prom'):
+            self.write_prometheus(path)
+        else:
+            self.write_jsonl(path)
+
+    def write_jsonl(self, path):
+        with open(path, 'a') as f:
+            for record in self.records + self.artifacts:
+                f.write(json.dumps(record) + '\n')
+
+    def write_prometheus(self, path):
+        """Prometheus text exposition format, written atomically for node_exporter textfile collector."""
+        gauges = {
+            'wall_seconds': 'wall_s',
+            'cpu_seconds': 'cpu_s',
+            'peak_rss_megabytes': 'peak_rss_mb',
+            'rows_in': 'rows_in',
+            'rows_out': 'rows_out',
+        }
+        lines = []
+        for metric, field in gauges.items():
+            lines.append(f'# TYPE {self.run_name}_stage_{metric} gauge')
+            for record in self.records:
+                if record[field] is not None:
+                    lines.append(f'{self.run_name}_stage_{metric}{{stage="{record["stage"]}"}} {record[field]}')
+        lines.append(f'# TYPE {self.run_name}_stage_dropped_rows gauge')
+        for record in self.records:
+            for filter_name, count in record['dropped'].items():
+                lines.append(f'{self.run_name}_stage_dropped_rows{{stage="{record["stage"]}",filter="{filter_name}"}} '
+                             f'{count}')
+        # artifact written chunk by chunk has many records - one series per artifact (sums)
+        artifact_totals = {}
+        for record in self.artifacts:
+            totals = artifact_totals.setdefault(record['artifact'],
+                                                {'write_s': 0, 'queued_s': 0, 'rows': 0, 'writes': 0})
+            for field in ('write_s', 'queued_s', 'rows'):
+                totals[field] += record[field]
+            totals['writes'] += 1
+        for metric, field in (('write_seconds', 'write_s'), ('queued_seconds', 'queued_s'), ('rows', 'rows'),
+                              ('writes', 'writes')):
+            lines.append(f'# TYPE {self.run_name}_artifact_{metric} gauge')
+            for artifact, totals in artifact_totals.items():
+                lines.append(f'{self.run_name}_artifact_{metric}{{artifact="{artifact}"}} {round(totals[field], 4)}')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
@@ -0,0 +1,182 @@
+"""
+Sharded inputs - sales / bid logs delivered as many daily or hourly files instead of one.
+
+    paths = resolve_shards('incoming/sales_2024-*.csv')          # glob, directory or one file
+    for path, df in read_shards(paths, read_fn, workers=4):       # parsed concurrently, yielded in order of paths
+        first_seen = seen_keys.first_seen(df['transaction_id'])   # keys of earlier shards -> duplicates
+    manifest = load_etl_state(state_dir)[3]                      # ingested shards + seen keys between runs (etl.py)
+    manifest.pending(paths)                                        # only new or changed shards
+
+Shards are parsed by a thread pool - csv C parser and pyarrow release the GIL while parsing, so reading
+of one shard overlaps with parsing of others. At most `workers` shards are read ahead of the consumer,
+memory is bounded by workers x shard size. Shards are ordered by file name (daily files sort by date),
+first shard which brings a key wins.
+"""
+import contextvars
+import glob
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cache import file_digest
+from dq import hash_values
+
+log = logging.getLogger('shards')
+
+SHARD_PATTERNS = ('*.csv', '*.xlsx')
+DEFAULT_SHARD_WORKERS = min(8, os.cpu_count() or 1)
+# keys of at least this many newest shards are remembered (one year of daily shards)
+SEEN_KEY_SHARDS = 365
+
+
+def is_sharded(source):
+    """Directory or glob pattern (not a single file)."""
+    return os.path.isdir(source) or glob.has_magic(source)
+
+
+def resolve_shards(source, patterns=SHARD_PATTERNS):
+    """Shard files of source sorted by name: directory -> files matching patterns, glob -> matches, file -> itself."""
+    if os.path.isdir(source):
+        paths = [path for pattern in patterns for path in glob.glob(os.path.join(source, pattern))]
+    elif glob.has_magic(source):
+        paths = glob.glob(source)
+    else:
+        paths = [source]
+    paths = sorted(set(os.path.normpath(path) for path in paths))
+    if not paths:
+        raise FileNotFoundError(f"No shards found: {source}")
+    return paths
+
+
+def check_columns(columns, expected, path):
+    """Schema check of one shard (like EXPECTED_COLUMNS of bid log), error names the shard."""
+    missing = set(expected) - set(columns)
+    if missing:
+        raise ValueError(f"{path}: missing columns: {missing}")
+
+
+def read_shards(paths, read_fn, workers=None):
+    """
+    (path, read_fn(path)) of every shard in order of paths. Thread pool parses next shards while
+    consumer works on current one; read_fn runs with context of the caller (metrics stage, output directory).
+    First failing shard raises its error.
+    """
+    workers = workers or DEFAULT_SHARD_WORKERS
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard-reader') as pool:
+        def submit(path):
+            pending.append((path, pool.submit(contextvars.copy_context().run, read_fn, path)))
+
+        pending = deque()
+        for _, path in zip(range(workers), paths):
+            submit(path)
+        while pending:
+            path, future = pending.popleft()
+            df = future.result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                submit(next_path)
+            log.debug(f"📥 {path}: {len(df)} rows")
+            yield path, df
+
+
+def concat_shards(frames, dtypes=None):
+    """One frame of shards - categories of shards differ, dtypes are applied again after concat."""
+    df = pd.concat(frames, ignore_index=True)
+    return df.astype(dtypes) if dtypes else df
+
+
+class SeenKeys:
+    """
+    Keys (transaction_id) of recent shards as 64-bit hashes (dq.hash_values) - 8 bytes per key.
+    Hashes are kept in sorted segments (shards, hashes) - segments of the same size are merged like a binary
+    counter up to blocks of max_shards / 4 shards, so lookup of a shard is a few searchsorted calls, not
+    a union with all keys so far. Only keys of the last max_shards shards (plus one block) are kept, the oldest
+    block is forgotten - transaction_id repeated later than that is not removed as duplicate of an earlier shard.
+    """
+
+    def __init__(self, segments=None, max_shards=SEEN_KEY_SHARDS):
+        self.segments = [] if segments is None else segments
+        self.max_shards = max_shards
+        self.block_shards = max(1, max_shards // 4)
+
+    @property
+    def hashes(self):
+        return np.concatenate([hashes for _, hashes in self.segments] or [np.empty(0, dtype=np.uint64)])
+
+    def contains(self, hashes):
+        seen = np.zeros(len(hashes), dtype=bool)
+        for _, segment in self.segments:
+            if len(segment):
+                positions = np.minimum(np.searchsorted(segment, hashes), len(segment) - 1)
+                seen |= segment[positions] == hashes
+        return seen
+
+    def first_seen(self, values):
+        """
+        Mask of rows whose key was not in any earlier shard, keys of this shard are added.
+        Duplicates inside one shard and NULL keys are kept (counted by DQ check 1 like in one file).
+        """
+        values = pd.Series(values).reset_index(drop=True)
+        hashes = hash_values(values)
+        missing = values.isna().to_numpy()
+        mask = ~self.contains(hashes) | missing
+        self.add_shard(np.unique(hashes[~missing]))
+        return mask
+
+    def add_shard(self, hashes):
+        """Sorted unique hashes of one shard as newest segment, then merges and forgetting of the oldest block."""
+        self.segments.append((1, hashes))
+        while (len(self.segments) > 1 and self.segments[-1][0] == self.segments[-2][0]
+               and 2 * self.segments[-1][0] <= self.block_shards):
+            (shards, newer), (_, older) = self.segments.pop(), self.segments.pop()
+            self.segments.append((2 * shards, np.union1d(older, newer)))
+        while sum(shards for shards, _ in self.segments[1:]) >= self.max_shards:
+            self.segments.pop(0)
+
+
+class ShardManifest:
+    """
+    Shards already ingested (path -> content digest, rows, time) and keys seen in them, kept between runs
+    as part of incremental state (etl.save_etl_state): shards in the state file, keys in a .npy file of the same
+    state generation - summary, watermark and ingested shards are committed together. Shard is pending when it
+    is new or its content changed - changed shard is read again, its keys ingested before are dropped as duplicates
+    (while they are still remembered by SeenKeys).
+    """
+
+    def __init__(self, shards=None, keys=None):
+        self.shards = {} if shards is None else shards
+        self.keys = SeenKeys() if keys is None else keys
+
+    @classmethod
+    def load(cls, shards, keys_path, key_segments=None):
+        """key_segments - [shards, keys] of every SeenKeys segment (one segment when missing)."""
+        hashes = np.load(keys_path)
+        if key_segments is None:
+            key_segments = [[max(len(shards), 1), len(hashes)]] if len(hashes) else []
+        parts = np.split(hashes, np.cumsum([keys for _, keys in key_segments])[:-1])
+        return cls(shards, SeenKeys([(shard_count, part) for (shard_count, _), part in zip(key_segments, parts)]))
+
+    def key_segments(self):
+        return [[shards, len(hashes)] for shards, hashes in self.keys.segments]
+
+    def save_keys(self, keys_path):
+        with open(keys_path, 'wb') as f:
+            np.save(f, self.keys.hashes)
+
+    def pending(self, paths):
+        """Shards of paths not ingested yet (or changed since)."""
+        return [path for path in paths
+                if self.shards.get(os.path.normpath(path), {}).get('digest') != file_digest(path)]
+
+    def record(self, path, rows):
+        self.shards[os.path.normpath(path)] = {
+            'digest': file_digest(path),
+            'rows': int(rows),
+            'ingested_at': datetime.now().isoformat(timespec='seconds'),
+        }
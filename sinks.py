@@ -0,0 +1,148 @@
+"""
+Output sinks for ETL artifacts (df_fact, bi_sales_summary).
+
+Every sink is a function write_<format>(df, name, append=False, partition_cols=None) registered in SINKS,
+so the pipeline only says WHAT to write and in which formats (etl_pipeline output_formats).
+Default is parquet (columnar, compressed, fast to write and read).
+csv/xlsx are written only when asked for - openpyxl is the slowest part of the whole run.
+"""
+import contextlib
+import contextvars
+import os
+import shutil
+
+import pandas as pd
+import pyarrow.dataset
+
+from artifact_writer import submit_write, wait_for_writes
+
+DEFAULT_OUTPUT_FORMATS = ('parquet',)
+FACT_PARTITION_COLS = ['transaction_month', 'region']
+
+# directory of outputs of the running pipeline ('' = current directory), see output_directory
+_output_dir = contextvars.ContextVar('output_dir', default='')
+
+
+@contextlib.contextmanager
+def output_directory(path):
+    """Artifacts, exports and reports inside the block are written to path (created when missing)."""
+    if path:
+        os.makedirs(path, exist_ok=True)
+    token = _output_dir.set(path or '')
+    try:
+        yield path
+    finally:
+        _output_dir.reset(token)
+
+
+def current_output_directory():
+    return _output_dir.get()
+
+
+def set_output_directory(path):
+    """Output directory for whole life of worker process (parallel mode) - no with-block there."""
+    _output_dir.set(path or '')
+
+
+def output_path(file_name):
+    """file_name inside active output directory"""
+    return os.path.join(_output_dir.get(), file_name)
+
+
+def artifact_path(name, fmt):
+    """df_fact + parquet -> df_fact.parquet (file or partitioned directory) in output directory"""
+    return output_path(f'{name}.{fmt}')
+
+
+def write_csv(df, name, append=False, partition_cols=None):
+    path = artifact_path(name, 'csv')
+    append = append and os.path.exists(path)
+    df.to_csv(path, mode='a' if append else 'w', header=not append, index=False)
+
+
+def write_excel(df, name, append=False, partition_cols=None):
+    if append:
+        raise ValueError(f"{name}.xlsx cannot be appended chunk by chunk, use csv or parquet")
+    df.to_excel(artifact_path(name, 'xlsx'), index=False)
+
+
+def write_parquet(df, name, append=False, partition_cols=None):
+    """
+    Parquet via pyarrow.
+    partition_cols -> hive partitioned directory (transaction_month=2024-05/region=North/...),
+    append adds new files to the dataset, otherwise old dataset is removed first.
+    Without partition_cols -> one compact file (bi_sales_summary).
+    """
+    path = artifact_path(name, 'parquet')
+    if not append and os.path.isdir(path):
+        shutil.rmtree(path)
+    # categories differ between chunks (and so dictionary index width) - store plain strings
+    categorical = [col for col in df.columns
+                   if isinstance(df[col].dtype, pd.CategoricalDtype) and col not in (partition_cols or [])]
+    if categorical:
+        df = df.astype({col: 'string[pyarrow]' for col in categorical})
+    if partition_cols:
+        df.to_parquet(path, partition_cols=partition_cols, index=False)
+    else:
+        df.to_parquet(path, index=False)
+
+
+SINKS = {
+    'csv': write_csv,
+    'xlsx': write_excel,
+    'parquet': write_parquet,
+}
+APPENDABLE_FORMATS = ('csv', 'parquet')
+
+
+def write_artifact(df, name, output_formats=DEFAULT_OUTPUT_FORMATS, append=False, partition_cols=None):
+    """
+    Write df to every requested format (see SINKS).
+    Inside artifact_writer.background_writes a snapshot is queued and written in background.
+    """
+    unknown = set(output_formats) - set(SINKS)
+    if unknown:
+        raise ValueError(f"Unknown output formats: {unknown}, available: {list(SINKS)}")
+    submit_write(name, write_formats, df, name, output_formats, append, partition_cols)
+
+
+def write_formats(df, name, output_formats, append=False, partition_cols=None):
+    for fmt in output_formats:
+        SINKS[fmt](df, name, append=append, partition_cols=partition_cols)
+
+
+def remove_artifact(name, output_formats=DEFAULT_OUTPUT_FORMATS):
+    """Remove old artifact files before parts of new one are appended (streaming/parallel writers)."""
+    wait_for_writes(name)
+    for fmt in output_formats:
+        path = artifact_path(name, fmt)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def read_artifact(name, fmt='parquet', filters=None, columns=None):
+    """
+    Read artifact back for BI/tests.
+    For parquet filters are pushed down to partitions, e.g.
+    read_artifact('df_fact', filters=[('region', '=', 'North'), ('transaction_month', '>=', '2024-06')])
+    reads only matching transaction_month=/region= directories.
+    """
+    wait_for_writes(name)
+    path = artifact_path(name, fmt)
+    if fmt == 'parquet':
+        # partitions without dictionaries - rows without transaction_date (__HIVE_DEFAULT_PARTITION__) come back
+        # as NULL instead of failing to unify dictionaries with nulls
+        df = pd.read_parquet(path, filters=filters, columns=columns,
+                             partitioning=pyarrow.dataset.HivePartitioning.discover(infer_dictionary=False))
+        # categorical columns of single file artifacts - restore plain strings
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(str)
+        return df
+    if filters:
+        raise ValueError("filters (predicate pushdown) are supported only for parquet")
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    return pd.read_excel(path, usecols=columns)
@@ -0,0 +1,184 @@
+"""
+SQL pushdown backend of the ETL - etl_pipeline(backend='sqlite').
+
+Database staging from extract_data docstring: input CSVs are bulk loaded chunk by chunk into local SQLite
+database file (indexes on product_id/transaction_date), then cleaning filters, campaign attribution
+(BETWEEN + MAX(start_date)) and bi_sales_summary rollup run as SQL inside the database.
+pandas holds only one chunk of input or df_fact at a time - the heavy lifting is out-of-core.
+Results are the same like pandas path (transform_fact_sales + load_bi_summary).
+
+    conn = connect()
+    stage_inputs(conn)
+    fact_rows, removed = sql_transform_fact_sales(conn)
+    bi_sales_summary = sql_load_bi_summary(conn)
+"""
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+from etl import (CAMPAIGNS_CSV, DEFAULT_CHUNKSIZE, SALES_CSV, SUMMARY_KEYS, appendable_formats, extract_sales_chunks,
+                 merge_summaries, read_campaigns, save_bi_summary, save_fact)
+from metrics import add_dropped
+from sinks import DEFAULT_OUTPUT_FORMATS
+
+log = logging.getLogger('etl')
+
+STAGING_DB = 'etl_staging.db'
+
+SALES_COLUMNS = ['transaction_id', 'product_id', 'customer_id', 'quantity', 'price_per_unit', 'transaction_date',
+                 'region']
+CAMPAIGN_COLUMNS = ['campaign_id', 'campaign_name', 'start_date', 'end_date', 'channel']
+DATE_COLUMNS = ['transaction_date', 'start_date', 'end_date']
+
+# Filtr 1 + Filtr 2 of clean_sales (NULL price is also dropped, like NaN >= 0 in pandas) + total_sales
+CLEAN_SALES_SQL = """
+CREATE TEMP VIEW clean_sales AS
+SELECT rowid AS row_pos, {columns}, quantity * price_per_unit AS total_sales
+FROM sales
+WHERE price_per_unit >= 0 AND product_id IS NOT NULL AND customer_id IS NOT NULL
+""".format(columns=', '.join(SALES_COLUMNS))
+
+REMOVED_SQL = """
+SELECT COALESCE(SUM(NOT COALESCE(price_per_unit >= 0, 0)), 0) AS negative_price,
+       COALESCE(SUM(COALESCE(price_per_unit >= 0, 0) AND (product_id IS NULL OR customer_id IS NULL)), 0) AS null_keys
+FROM sales
+"""
+
+# winner per transaction row: active campaign with MAX(start_date), on equal start_date first one from campaigns
+# file (campaign_pos); duplicated transaction_id - row with latest campaign, on tie the first row of sales file
+ATTRIBUTED_SQL = """
+CREATE TEMP TABLE attributed AS
+WITH matched AS (
+    SELECT s.row_pos, s.transaction_id, c.campaign_pos, c.start_date,
+           ROW_NUMBER() OVER (PARTITION BY s.row_pos ORDER BY c.start_date DESC, c.campaign_pos) AS campaign_rank
+    FROM clean_sales s
+    JOIN campaigns c ON c.product_id = s.product_id AND s.transaction_date BETWEEN c.start_date AND c.end_date
+)
+SELECT row_pos, transaction_id, campaign_pos
+FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY transaction_id ORDER BY start_date DESC, row_pos) AS transaction_rank
+    FROM matched
+    WHERE campaign_rank = 1
+)
+WHERE transaction_rank = 1
+"""
+
+# df_fact: attributed rows + transactions without any active campaign ('IS' - NULL safe, like pandas isin)
+FACT_SALES_SQL = """
+CREATE TABLE fact_sales AS
+SELECT {sales_columns}, s.total_sales, {campaign_columns}, 1 AS is_active_campaign
+FROM attributed a
+JOIN clean_sales s ON s.row_pos = a.row_pos
+JOIN campaigns c ON c.campaign_pos = a.campaign_pos
+UNION ALL
+SELECT {sales_columns}, s.total_sales, NULL, 'No Campaign', NULL, NULL, NULL, NULL
+FROM clean_sales s
+WHERE NOT EXISTS (SELECT 1 FROM attributed a WHERE a.transaction_id IS s.transaction_id)
+""".format(sales_columns=', '.join(f's.{col}' for col in SALES_COLUMNS),
+           campaign_columns=', '.join(f'c.{col}' for col in CAMPAIGN_COLUMNS))
+
+# rollup - NULL keys are skipped like in pandas groupby; dates are 'YYYY-MM-DD ...' text, month = first 7 chars
+SUMMARY_SQL = """
+SELECT region, campaign_name, substr(transaction_date, 1, 7) AS transaction_month,
+       SUM(total_sales) AS total_sales, COUNT(transaction_id) AS sales_count
+FROM fact_sales
+WHERE region IS NOT NULL AND campaign_name IS NOT NULL AND transaction_date IS NOT NULL
+GROUP BY region, campaign_name, transaction_month
+"""
+
+
+def connect(db_path=STAGING_DB):
+    """Staging database file - fresh for every run (old one removed)."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    # staging is rebuilt from CSVs anyway - no journal/fsync, bigger page cache
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    conn.execute('PRAGMA temp_store = FILE')
+    return conn
+
+
+def to_sql_frame(df, columns):
+    """Chunk prepared for sqlite: plain python values, dates as ISO text (compared as strings in SQL)."""
+    df = df[columns].astype({col: object for col in columns if col not in DATE_COLUMNS
+                             and not pd.api.types.is_numeric_dtype(df[col])})
+    for col in DATE_COLUMNS:
+        if col in df:
+            df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+
+def stage_inputs(conn, sales_csv=SALES_CSV, campaigns_csv=CAMPAIGNS_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    ETL Step 1 (sqlite backend): EXTRACT - bulk load CSVs into staging database.
+    Sales are parsed with declared schema chunk by chunk (only one chunk in memory),
+    sales_csv can be directory/glob of shards (etl.extract_sales_shards),
+    campaigns table is small - loaded at once. Returns number of staged sales rows.
+    """
+    conn.execute(f"CREATE TABLE sales ({', '.join(SALES_COLUMNS)})")
+    sales_rows = 0
+    for df_chunk in extract_sales_chunks(chunksize, sales_csv):
+        to_sql_frame(df_chunk, SALES_COLUMNS).to_sql('sales', conn, if_exists='append', index=False)
+        sales_rows += len(df_chunk)
+
+    # campaign_pos - order in campaigns file, tie-break of campaigns with equal start_date
+    df_campaigns = to_sql_frame(read_campaigns(campaigns_csv), ['product_id'] + CAMPAIGN_COLUMNS)
+    df_campaigns.insert(0, 'campaign_pos', range(len(df_campaigns)))
+    df_campaigns.to_sql('campaigns', conn, index=False)
+
+    # indexes after bulk load - one sort instead of index maintenance per inserted row
+    conn.execute('CREATE INDEX sales_product_date ON sales (product_id, transaction_date)')
+    conn.execute('CREATE INDEX campaigns_product_start ON campaigns (product_id, start_date, end_date)')
+    conn.execute('CREATE UNIQUE INDEX campaigns_pos ON campaigns (campaign_pos)')
+    conn.commit()
+
+    log.info(f"✅ Staged in database: {sales_rows} sales rows, {len(df_campaigns)} campaigns rows")
+    return sales_rows
+
+
+def sql_transform_fact_sales(conn, output_formats=DEFAULT_OUTPUT_FORMATS, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    ETL Step 2 (sqlite backend): TRANSFORM - same rules like transform_fact_sales, executed as SQL.
+    fact_sales table is built in database and written to sinks chunk by chunk.
+    Returns (number of df_fact rows, removed rows per filter).
+    """
+    log.info("🔧 Cleaning data (SQL)...")
+    removed = dict(zip(['negative_price', 'null_keys'], conn.execute(REMOVED_SQL).fetchone()))
+    for name, count in removed.items():
+        add_dropped(name, count)
+    log.info(f"   Removed {removed['negative_price']} rows with negative prices")
+    log.info(f"   Removed {removed['null_keys']} rows with NULL product/customer_id")
+
+    conn.execute(CLEAN_SALES_SQL)
+    conn.execute(ATTRIBUTED_SQL)
+    conn.execute('CREATE INDEX attributed_transaction ON attributed (transaction_id)')
+    conn.execute(FACT_SALES_SQL)
+    conn.commit()
+
+    fact_formats = appendable_formats(output_formats)
+    fact_rows = 0
+    for chunk_no, df_chunk in enumerate(read_fact_chunks(conn, chunksize)):
+        save_fact(df_chunk, fact_formats, append=chunk_no > 0)
+        fact_rows += len(df_chunk)
+    log.info(f"df_fact created: {fact_rows:,} rows")
+    return fact_rows, removed
+
+
+def read_fact_chunks(conn, chunksize=DEFAULT_CHUNKSIZE):
+    """fact_sales table in chunks with the same column types like pandas df_fact."""
+    for df_chunk in pd.read_sql_query('SELECT * FROM fact_sales', conn, chunksize=chunksize,
+                                      parse_dates=DATE_COLUMNS):
+        df_chunk['is_active_campaign'] = df_chunk['is_active_campaign'].astype('boolean')
+        yield df_chunk
+
+
+def sql_load_bi_summary(conn, output_formats=DEFAULT_OUTPUT_FORMATS):
+    """ETL Step 3 (sqlite backend): LOAD - GROUP BY region/campaign/month in database, only summary is read."""
+    df_summary = pd.read_sql_query(SUMMARY_SQL, conn).astype({key: object for key in SUMMARY_KEYS})
+    bi_sales_summary = merge_summaries([df_summary])
+    save_bi_summary(bi_sales_summary, output_formats)
+    return bi_sales_summary